@@ -0,0 +1,194 @@
+import os
+import json
+import sqlite3
+import tempfile
+from collections import namedtuple
+from functools import lru_cache
+
+import instrumentation
+
+ACTORS_ROOT = 'data/all_actors'
+DEFAULT_CACHE_PATH = 'data/processed/actors_index.sqlite'
+
+# Only the fields used by the extraction scripts are kept
+OrganeRecord = namedtuple('OrganeRecord', ['libelle', 'libelle_edition', 'libelle_abrege', 'couleur'])
+
+
+class ActorIndex:
+    """
+    In-memory index of data/all_actors/{acteur,organe}.
+
+    Built once per run by scanning the JSON files (or by reading a SQLite cache),
+    so looking up an actor or an organe never touches the file system.
+    """
+
+    def __init__(self, actors: dict, organes: dict):
+        self.actors = actors
+        self.organes = organes
+
+    def actor_name(self, acteur_id: str) -> str or None:
+        """Returns 'NOM Prenom' for an actor, or None if the actor is unknown."""
+        return self.actors.get(acteur_id)
+
+    def organe(self, organe_id: str) -> OrganeRecord or None:
+        """Returns the record of an organe, or None if the organe is unknown."""
+        return self.organes.get(organe_id)
+
+    @classmethod
+    def scan(cls, root: str = ACTORS_ROOT) -> 'ActorIndex':
+        """
+        Builds the index by reading every actor and organe JSON file.
+
+        Args:
+            root: The all_actors folder
+
+        Returns:
+            The ActorIndex
+        """
+        actors = {}
+        organes = {}
+        failed = 0
+
+        for acteur_id, data in _iter_json_folder(os.path.join(root, 'acteur')):
+            try:
+                ident = data['acteur']['etatCivil']['ident']
+                actors[acteur_id] = ident['nom'] + ' ' + ident['prenom']
+            except (KeyError, TypeError):
+                failed += 1
+
+        for organe_id, data in _iter_json_folder(os.path.join(root, 'organe')):
+            try:
+                organe = data['organe']
+                organes[organe_id] = OrganeRecord(
+                    organe.get('libelle'),
+                    organe.get('libelleEdition'),
+                    organe.get('libelleAbrege'),
+                    organe.get('couleurAssociee'),
+                )
+            except (KeyError, TypeError, AttributeError):
+                failed += 1
+
+        print(f"Indexed {len(actors)} actors and {len(organes)} organes from {root}"
+              + (f" ({failed} malformed files skipped)" if failed else ""))
+        return cls(actors, organes)
+
+    @classmethod
+    def load_cache(cls, cache_path: str, root: str = ACTORS_ROOT) -> 'ActorIndex' or None:
+        """
+        Reads the index from a SQLite cache file.
+
+        Args:
+            cache_path: The SQLite file written by save_cache
+            root: The all_actors folder the cache was built from
+
+        Returns:
+            The ActorIndex, or None if the cache is missing or older than the folders
+        """
+        if not os.path.exists(cache_path):
+            return None
+        try:
+            with sqlite3.connect(cache_path) as conn:
+                meta = dict(conn.execute("SELECT key, value FROM meta"))
+                if meta.get('signature') != _folder_signature(root):
+                    return None
+                actors = dict(conn.execute("SELECT uid, name FROM acteur"))
+                organes = {
+                    uid: OrganeRecord(*fields)
+                    for uid, *fields in conn.execute(
+                        "SELECT uid, libelle, libelle_edition, libelle_abrege, couleur FROM organe")
+                }
+        except sqlite3.DatabaseError as e:
+            print(f"Ignoring unreadable actor index cache {cache_path}: {e}")
+            return None
+        return cls(actors, organes)
+
+    def save_cache(self, cache_path: str, root: str = ACTORS_ROOT) -> None:
+        """
+        Writes the index to a single SQLite file, replaced atomically.
+
+        Args:
+            cache_path: Destination of the cache
+            root: The all_actors folder the index was built from
+        """
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        # A temporary file of its own, several processes may rebuild the cache at the same time
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir or '.', prefix=f".{os.path.basename(cache_path)}.",
+                                        suffix='.tmp')
+        os.close(fd)
+        try:
+            conn = sqlite3.connect(tmp_path)
+            try:
+                with conn:
+                    conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+                    conn.execute("CREATE TABLE acteur (uid TEXT PRIMARY KEY, name TEXT)")
+                    conn.execute("CREATE TABLE organe (uid TEXT PRIMARY KEY, libelle TEXT, libelle_edition TEXT, "
+                                 "libelle_abrege TEXT, couleur TEXT)")
+                    conn.execute("INSERT INTO meta VALUES ('signature', ?)", (_folder_signature(root),))
+                    conn.executemany("INSERT INTO acteur VALUES (?, ?)", self.actors.items())
+                    conn.executemany("INSERT INTO organe VALUES (?, ?, ?, ?, ?)",
+                                     ((uid, *record) for uid, record in self.organes.items()))
+            finally:
+                conn.close()
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _iter_json_folder(folder: str):
+    """Yields (file stem, parsed JSON) for every JSON file of a folder."""
+    if not os.path.isdir(folder):
+        print(f"Warning: actor folder not found at {folder}")
+        return
+    for entry in os.scandir(folder):
+        if not entry.is_file() or not entry.name.endswith('.json'):
+            continue
+        try:
+            with open(entry.path, 'r', encoding='utf-8') as f:
+                yield entry.name[:-len('.json')], json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            print(f"Could not read {entry.path}: {e}")
+
+
+def _folder_signature(root: str) -> str:
+    """Modification times of the acteur and organe folders, used to invalidate the cache."""
+    mtimes = []
+    for name in ('acteur', 'organe'):
+        folder = os.path.join(root, name)
+        mtimes.append(str(os.stat(folder).st_mtime_ns) if os.path.isdir(folder) else '-')
+    return ':'.join(mtimes)
+
+
+@lru_cache(maxsize=None)
+def load_actor_index(root: str = ACTORS_ROOT, cache_path: str = None) -> ActorIndex:
+    """
+    Returns the actor index of a folder, built once per process.
+
+    Args:
+        root: The all_actors folder
+        cache_path: Optional SQLite cache file. It is used when it is newer than
+                    the acteur/organe folders and (re)written otherwise.
+
+    Returns:
+        The ActorIndex
+    """
+    if cache_path:
+        index = ActorIndex.load_cache(cache_path, root)
+        if index is not None:
+            print(f"Loaded actor index from {cache_path}")
+            instrumentation.count('actor_index_cache_hits')
+            return index
+
+    index = ActorIndex.scan(root)
+    instrumentation.count('actor_index_scans')
+    if cache_path:
+        try:
+            index.save_cache(cache_path, root)
+        except (sqlite3.Error, OSError) as e:
+            # The index is built, only the next runs lose the cache
+            print(f"Could not write the actor index cache {cache_path}: {e}")
+    return index
@@ -0,0 +1,191 @@
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import dijkstra
+
+# Number of (source, edge) pairs tested at once by a high salience skeleton worker,
+# bounds the size of the distance arrays it gathers
+HSS_BATCH_CELLS = 2 ** 23
+
+
+def _node_codes(table: pd.DataFrame) -> tuple:
+    """
+    Interns the src and trg columns of an edge table to shared integer codes.
+
+    Returns:
+        A tuple (src, trg, n_nodes) of int64 code arrays and the number of distinct nodes
+    """
+    codes, nodes = pd.factorize(pd.concat([table["src"], table["trg"]], ignore_index=True))
+    codes = codes.astype(np.int64)
+    return codes[:len(table)], codes[len(table):], len(nodes)
+
+
+def undirected_edge_keys(src: np.ndarray, trg: np.ndarray, n_nodes: int) -> np.ndarray:
+    """
+    Canonical key of the undirected edge of each row: (min code, max code) packed in one int64,
+    so that src -> trg and trg -> src get the same key.
+
+    Args:
+        src: Node codes of the sources
+        trg: Node codes of the targets
+        n_nodes: Number of distinct node codes
+
+    Returns:
+        The int64 key of each edge
+    """
+    return np.minimum(src, trg) * n_nodes + np.maximum(src, trg)
+
+
+def disparity_filter(table: pd.DataFrame, undirected: bool = False, return_self_loops: bool = False) -> pd.DataFrame:
+    """
+    Disparity filter (Serrano et al.) of an edge table, vectorized.
+
+    Same results as the disparity_filter of graph_construction.ipynb, but nodes
+    are interned to integer codes: the strength and degree of each source are
+    group reductions over the codes, and undirected edges are canonicalized with
+    NumPy min/max instead of one "src-trg" string per row.
+
+    Args:
+        table: Edge table with src, trg and nij (weight) columns
+        undirected: If True, keep one row per undirected edge, with the max score
+                    and min variance of its two directions
+        return_self_loops: If True, keep the src == trg rows
+
+    Returns:
+        DataFrame with src, trg, nij, score and variance columns
+    """
+    sys.stderr.write("Calculating DF score...\n")
+    src, trg, n_nodes = _node_codes(table)
+    nij = table["nij"].to_numpy()
+
+    # Strength and number of out-edges of the source of each row
+    nij_sum = pd.Series(nij).groupby(src).transform("sum").to_numpy()
+    trg_count = np.bincount(src, minlength=n_nodes)[src]
+
+    score = 1.0 - ((1.0 - (nij / nij_sum)) ** (trg_count - 1))
+    variance = (trg_count ** 2) * (((20 + (4.0 * trg_count)) / ((trg_count + 1.0) * (trg_count + 2) * (trg_count + 3)))
+                                   - ((4.0) / ((trg_count + 1.0) ** 2)))
+
+    rows = np.arange(len(table))
+    if not return_self_loops:
+        rows = rows[src != trg]
+    # Rows are renumbered by each merge of the notebook version: keep the same index
+    index = rows
+
+    if undirected:
+        keys = pd.Series(undirected_edge_keys(src[rows], trg[rows], n_nodes))
+        by_edge = pd.DataFrame({"score": score[rows], "variance": variance[rows]}).groupby(keys.to_numpy())
+        score = by_edge["score"].transform("max").to_numpy()
+        variance = by_edge["variance"].transform("min").to_numpy()
+        first = np.flatnonzero(~keys.duplicated(keep="first").to_numpy())
+        rows, index, score, variance = rows[first], first, score[first], variance[first]
+    else:
+        score, variance = score[rows], variance[rows]
+
+    result = table[["src", "trg", "nij"]].iloc[rows].copy()
+    result.index = pd.Index(index, dtype=np.int64)
+    result["score"] = score
+    result["variance"] = variance
+    return result
+
+
+def _shortest_path_edge_counts(task: tuple) -> np.ndarray:
+    """
+    Worker: for each edge, number of sources whose shortest-path tree contains it.
+
+    An edge u -> v belongs to the shortest-path tree of s when dist(s, u) + l(u, v)
+    equals dist(s, v): this keeps every predecessor of v on a tied shortest path,
+    as the Dijkstra of the notebook does.
+    """
+    graph, edge_src, edge_trg, edge_length, sources = task
+    counts = np.zeros(len(edge_src))
+    batch_size = max(1, HSS_BATCH_CELLS // max(len(edge_src), 1))
+    for start in range(0, len(sources), batch_size):
+        dist = dijkstra(graph, directed=True, indices=sources[start:start + batch_size])
+        dist_trg = dist[:, edge_trg]
+        on_tree = (dist[:, edge_src] + edge_length == dist_trg) & np.isfinite(dist_trg)
+        counts += on_tree.sum(axis=0)
+    return counts
+
+
+def high_salience_skeleton(table: pd.DataFrame, undirected: bool = False, return_self_loops: bool = False,
+                           workers: int = 1) -> pd.DataFrame:
+    """
+    High salience skeleton (Grady et al.) of an edge table: the score of an edge
+    is the share of nodes whose shortest-path tree contains it, with 1 / nij as
+    the length of an edge.
+
+    Same results as the high_salience_skeleton of graph_construction.ipynb: the
+    edges are read as directed (list both directions for an undirected graph),
+    a duplicated src -> trg row takes the weight of the last one. The
+    shortest-path trees run over a CSR adjacency with the heap-based Dijkstra
+    of scipy.sparse.csgraph, batches of sources are spread over a process pool
+    and their per-edge counts are summed. Unlike the notebook version, nodes that
+    a source cannot reach add nothing to the counts.
+
+    Args:
+        table: Edge table with src, trg and nij (weight) columns
+        undirected: If True, keep one row per undirected edge, scored with the
+                    mean of the scores of its two directions
+        return_self_loops: If True, keep the src == trg rows
+        workers: Number of worker processes, 1 runs in the current process
+
+    Returns:
+        DataFrame with src, trg, nij and score columns
+    """
+    sys.stderr.write("Calculating HSS score...\n")
+    src, trg, n_nodes = _node_codes(table)
+    distance = 1.0 / table["nij"].to_numpy(dtype=np.float64)
+
+    # One graph edge per distinct src -> trg pair, with the distance of its last row
+    edge_of_row, pairs = pd.factorize(src * n_nodes + trg)
+    edge_length = pd.Series(distance).groupby(edge_of_row).last().to_numpy()
+    edge_src = (pairs // n_nodes).astype(np.int64)
+    edge_trg = (pairs % n_nodes).astype(np.int64)
+    graph = sparse.csr_matrix((edge_length, (edge_src, edge_trg)), shape=(n_nodes, n_nodes))
+
+    sources = np.arange(n_nodes)
+    n_tasks = max(1, min(workers * 4, n_nodes))
+    tasks = [(graph, edge_src, edge_trg, edge_length, chunk) for chunk in np.array_split(sources, n_tasks)]
+    if workers <= 1 or len(tasks) <= 1:
+        counts = sum(_shortest_path_edge_counts(task) for task in tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            counts = sum(executor.map(_shortest_path_edge_counts, tasks))
+    score = counts[edge_of_row] / n_nodes
+
+    rows = np.arange(len(table))
+    if not return_self_loops:
+        rows = rows[src != trg]
+
+    if undirected:
+        keys = pd.Series(undirected_edge_keys(src[rows], trg[rows], n_nodes))
+        summed = pd.Series(score[rows]).groupby(keys.to_numpy()).transform("sum").to_numpy()
+        first = np.flatnonzero(~keys.duplicated(keep="first").to_numpy())
+        rows, index, score = rows[first], pd.Index(first, dtype=np.int64), summed[first] / 2.0
+    else:
+        index, score = table.index[rows], score[rows]
+
+    result = table[["src", "trg", "nij"]].iloc[rows].copy()
+    result.index = index
+    result["score"] = score
+    return result
+
+
+def thresholding(table: pd.DataFrame, threshold: float) -> pd.DataFrame:
+    """
+    Keeps the edges of a scored edge table whose significance passes a threshold.
+
+    Args:
+        table: The edge table (output of disparity_filter)
+        threshold: The minimum significance to include the edge in the backbone
+
+    Returns:
+        The network backbone, with src, trg, nij and score columns
+    """
+    if "sdev_cij" in table:
+        return table[(table["score"] - (threshold * table["sdev_cij"])) > 0][["src", "trg", "nij", "score"]]
+    return table[table["score"] > threshold][["src", "trg", "nij", "score"]]
@@ -0,0 +1,329 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import contextlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:
+    # POSIX only: peak_rss_mb is None on Windows
+    resource = None
+
+import numpy as np
+import pandas as pd
+
+import extract_deputees
+import extract_vote
+from backbone import disparity_filter
+from covote import covote_matrix, load_votes
+from ctf_idf import TermMatrix
+from legislatures import LEGISLATURE_CONFIGS
+from nlp_tokens import deputy_token_counts
+from speech_corpus import corpus_path, load_speech_corpus
+from synthetic_data import generate_dataset
+
+BENCHMARK_VERSION = 1
+DEFAULT_BASELINE = 'data/processed/benchmark_baseline.json'
+
+# Throughput drop, relative to the baseline, reported as a regression
+REGRESSION_TOLERANCE = 0.2
+
+# Sizes of the synthetic legislatures (see synthetic_data.generate_dataset)
+SCALES = {
+    'small': {'n_deputies': 150, 'n_votes': 200, 'n_speeches': 2000},
+    'medium': {'n_deputies': 577, 'n_votes': 1000, 'n_speeches': 10000},
+    'large': {'n_deputies': 577, 'n_votes': 4000, 'n_speeches': 50000},
+}
+
+
+def _extract_votes(config: dict, counts: dict) -> tuple:
+    return lambda: extract_vote.process_legislature(config), counts['votes'], 'votes'
+
+
+def _extract_deputees(config: dict, counts: dict) -> tuple:
+    return lambda: extract_deputees.process_legislature(config), counts['votes'], 'votes'
+
+
+def _covote(config: dict, counts: dict) -> tuple:
+    votes = load_votes(config['vote_output'])
+    with open(config['deputees_output'], 'r', encoding='utf-8') as f:
+        deputies = json.load(f)
+    return lambda: covote_matrix(votes, deputy_ids=deputies.keys()), len(votes), 'votes'
+
+
+def _disparity_filter(config: dict, counts: dict) -> tuple:
+    with open(config['deputees_output'], 'r', encoding='utf-8') as f:
+        deputies = json.load(f)
+    deputy_index, weights = covote_matrix(load_votes(config['vote_output']), deputy_ids=deputies.keys())
+    weights = weights.tocoo()
+    # Both directions of every co-vote pair, weighted by their percentage
+    deputy_index = np.array(deputy_index, dtype=object)
+    table = pd.DataFrame({
+        'src': np.concatenate([deputy_index[weights.row], deputy_index[weights.col]]),
+        'trg': np.concatenate([deputy_index[weights.col], deputy_index[weights.row]]),
+        'nij': np.concatenate([weights.data, weights.data]),
+    })
+    return lambda: disparity_filter(table, undirected=True), len(table), 'edges'
+
+
+def _tfidf(config: dict, counts: dict) -> tuple:
+    with open(config['deputees_output'], 'r', encoding='utf-8') as f:
+        deputies = json.load(f)
+    corpus = load_speech_corpus(corpus_path(config['deputees_output']))
+    # The groups of the deputies stand for the communities
+    groups = {}
+    for deputy_id, deputy_info in deputies.items():
+        groups.setdefault((deputy_info.get('organ') or {}).get('id'), []).append(deputy_id)
+    communities = list(groups.values())
+
+    def run():
+        deputy_words = deputy_token_counts(corpus, list(deputies), tokenizer='fast', cache_path=None)
+        TermMatrix.from_counters(deputy_words).top_terms(communities, n=100, method='tf-idf')
+
+    return run, len(corpus), 'speeches'
+
+
+# Benchmarked stages, in the order they run: each one reads the outputs of the extraction stages.
+# A stage maps (config, generated counts) to (function to time, number of items, item unit).
+BENCHMARK_STAGES = {
+    'extract_votes': _extract_votes,
+    'extract_deputees': _extract_deputees,
+    'covote': _covote,
+    'disparity_filter': _disparity_filter,
+    'tfidf': _tfidf,
+}
+
+
+def _current_rss() -> int:
+    """Resident set size of the process in bytes, or 0 where /proc is not available."""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def _peak_rss() -> int or None:
+    """Peak resident set size of the process in bytes, or None where resource is not available."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _measure(task: tuple) -> dict:
+    """
+    Worker: runs one stage in a fresh process and measures it.
+
+    The inputs of the stage are loaded before the clock starts. With trace, the
+    peak of the Python allocations is recorded by tracemalloc, which slows the
+    stage down: traced runs are not used for the timings.
+    """
+    root, stage, legislature_num, counts, trace = task
+    os.chdir(root)
+    config = LEGISLATURE_CONFIGS[legislature_num]
+
+    # The stages report their progress on stdout and stderr
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        run, items, unit = BENCHMARK_STAGES[stage](config, counts)
+        rss_start = _current_rss()
+        if trace:
+            tracemalloc.start()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        run()
+        wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+        peak_traced = None
+        if trace:
+            peak_traced = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    peak_rss = _peak_rss()
+    return {
+        'items': items,
+        'unit': unit,
+        'seconds': wall,
+        'cpu_seconds': cpu,
+        'peak_traced_mb': peak_traced / 2 ** 20 if peak_traced is not None else None,
+        'peak_rss_mb': peak_rss / 2 ** 20 if peak_rss is not None else None,
+        'rss_growth_mb': max(peak_rss - rss_start, 0) / 2 ** 20 if rss_start and peak_rss is not None else None,
+    }
+
+
+def _run_isolated(task: tuple) -> dict:
+    """Runs _measure in a new interpreter, so that caches and peak RSS do not carry over between runs."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+        return executor.submit(_measure, task).result()
+
+
+def run_benchmarks(scales: list = None, stages: list = None, legislature_num: str = '17', repeat: int = 3,
+                   seed: int = 0, data_root: str = None) -> pd.DataFrame:
+    """
+    Times and memory-profiles the stages on synthetic legislatures of several sizes.
+
+    Each run of a stage happens in a new process. The time of a stage is the
+    best of repeat runs, its memory is measured by one more run under tracemalloc.
+
+    Args:
+        scales: SCALES keys (default: all)
+        stages: BENCHMARK_STAGES keys (default: all)
+        legislature_num: LEGISLATURE_CONFIGS key giving the format of the generated data
+        repeat: Number of timed runs of each stage
+        seed: Seed of the generated data
+        data_root: Folder where the data of each scale is generated and kept,
+                   None for temporary folders
+
+    Returns:
+        DataFrame with one row per scale and stage: items, unit, seconds, cpu_seconds,
+        throughput (items per second), peak_traced_mb, peak_rss_mb and rss_growth_mb
+    """
+    scales = list(SCALES) if scales is None else scales
+    stages = list(BENCHMARK_STAGES) if stages is None else stages
+    config = LEGISLATURE_CONFIGS[legislature_num]
+
+    records = []
+    for scale in scales:
+        root = tempfile.mkdtemp(prefix=f'benchmark_{scale}_') if data_root is None else os.path.join(data_root, scale)
+        try:
+            print(f"\nGenerating the {scale} dataset ({', '.join(f'{k} = {v}' for k, v in SCALES[scale].items())})...")
+            counts = generate_dataset(os.path.abspath(root), [legislature_num], seed=seed,
+                                      **SCALES[scale])[legislature_num]
+
+            for stage in BENCHMARK_STAGES:
+                if stage == 'tfidf' and not config['cr_path']:
+                    continue
+                task = (os.path.abspath(root), stage, legislature_num, counts, False)
+                if stage not in stages:
+                    if stage.startswith('extract_'):
+                        # Inputs of the stages that follow
+                        _run_isolated(task)
+                    continue
+
+                runs = [_run_isolated(task) for _ in range(repeat)]
+                traced = _run_isolated(task[:-1] + (True,))
+                best = min(runs, key=lambda run: run['seconds'])
+                record = {'scale': scale, 'stage': stage, **best,
+                          'throughput': best['items'] / best['seconds'] if best['seconds'] else float('inf'),
+                          'peak_traced_mb': traced['peak_traced_mb'],
+                          'peak_rss_mb': max((run['peak_rss_mb'] for run in runs if run['peak_rss_mb'] is not None),
+                                             default=None),
+                          'rss_growth_mb': max((run['rss_growth_mb'] or 0) for run in runs)}
+                print(f"{scale:>8} {stage:<18} {record['seconds']:8.3f}s {record['throughput']:12.1f} "
+                      f"{record['unit']}/s  peak {record['peak_traced_mb']:.1f} MB traced, "
+                      + (f"{record['peak_rss_mb']:.1f} MB RSS" if record['peak_rss_mb'] is not None else "RSS n/a"))
+                records.append(record)
+        finally:
+            if data_root is None:
+                shutil.rmtree(root, ignore_errors=True)
+
+    return pd.DataFrame(records, columns=['scale', 'stage', 'items', 'unit', 'seconds', 'cpu_seconds', 'throughput',
+                                          'peak_traced_mb', 'peak_rss_mb', 'rss_growth_mb'])
+
+
+def save_baseline(results: pd.DataFrame, baseline_path: str = DEFAULT_BASELINE) -> None:
+    """
+    Writes benchmark results as the baseline of the next runs.
+
+    Args:
+        results: Output of run_benchmarks
+        baseline_path: The baseline JSON file
+    """
+    baseline_dir = os.path.dirname(baseline_path)
+    if baseline_dir:
+        os.makedirs(baseline_dir, exist_ok=True)
+    with open(baseline_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': BENCHMARK_VERSION,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                        'cpus': os.cpu_count()},
+            'scales': {scale: SCALES[scale] for scale in results['scale'].unique()},
+            'results': results.to_dict(orient='records'),
+        }, f, indent=1)
+    print(f"✅ Saved the baseline to {baseline_path}")
+
+
+def compare_to_baseline(results: pd.DataFrame, baseline_path: str = DEFAULT_BASELINE,
+                        tolerance: float = REGRESSION_TOLERANCE) -> pd.DataFrame:
+    """
+    Compares benchmark results with a stored baseline.
+
+    Only the stages measured at the same scale sizes are compared.
+
+    Args:
+        results: Output of run_benchmarks
+        baseline_path: The baseline JSON file
+        tolerance: Relative throughput drop reported as a regression
+
+    Returns:
+        The results with baseline_throughput, ratio (throughput / baseline
+        throughput) and regression columns
+    """
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('version') != BENCHMARK_VERSION:
+        print(f"⚠️ Ignoring baseline {baseline_path} written by another version")
+        baseline = {'scales': {}, 'results': []}
+
+    same_scales = {scale for scale, sizes in baseline['scales'].items() if SCALES.get(scale) == sizes}
+    reference = {(record['scale'], record['stage']): record['throughput'] for record in baseline['results']
+                 if record['scale'] in same_scales}
+
+    compared = results.copy()
+    compared['baseline_throughput'] = [reference.get((scale, stage), np.nan)
+                                       for scale, stage in zip(results['scale'], results['stage'])]
+    compared['ratio'] = compared['throughput'] / compared['baseline_throughput']
+    compared['regression'] = compared['ratio'] < 1 - tolerance
+    return compared
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the extraction, co-vote, backbone and TF-IDF stages "
+                                                 "on synthetic legislatures.")
+    parser.add_argument('--scales', nargs='+', default=list(SCALES), choices=list(SCALES),
+                        help="dataset sizes (default: all)")
+    parser.add_argument('--stages', nargs='+', default=list(BENCHMARK_STAGES), choices=list(BENCHMARK_STAGES),
+                        help="stages to benchmark (default: all)")
+    parser.add_argument('--legislature', default='17', choices=list(LEGISLATURE_CONFIGS),
+                        help="format of the generated legislature (default: 17)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs of each stage (default: 3)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the generated data (default: 0)")
+    parser.add_argument('--data-root', help="keep the generated data in this folder (default: temporary folders)")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help=f"baseline to compare with (default: {DEFAULT_BASELINE})")
+    parser.add_argument('--save-baseline', action='store_true', help="store these results as the baseline")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE,
+                        help=f"throughput drop reported as a regression (default: {REGRESSION_TOLERANCE})")
+    parser.add_argument('--output', help="CSV file for the results")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.scales, args.stages, args.legislature, args.repeat, args.seed, args.data_root)
+
+    regressions = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        results = compare_to_baseline(results, args.baseline, args.tolerance)
+        regressions = int(results['regression'].sum())
+
+    print(f"\n{'='*60}")
+    print(results.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    print(f"{'='*60}")
+
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"✅ Results saved to {args.output}")
+    if args.save_baseline:
+        save_baseline(results, args.baseline)
+    if regressions:
+        print(f"⚠️ {regressions} stages are more than {args.tolerance:.0%} slower than the baseline")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
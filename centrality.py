@@ -0,0 +1,289 @@
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+
+from graph_cache import DEFAULT_GRAPH_CACHE, GraphResultCache, graph_fingerprint, result_key
+
+# Default error bound of approximate_betweenness_centrality: every normalized
+# value is within EPSILON of the exact one with probability 1 - DELTA
+EPSILON = 0.05
+DELTA = 0.1
+
+# Graph of the worker processes, sent once per worker by the pool initializer
+_worker_graph = None
+
+
+def _init_worker(G) -> None:
+    global _worker_graph
+    _worker_graph = G
+
+
+def _closeness_chunk(G, sources: list, distance: str = None, wf_improved: bool = True) -> dict:
+    """Closeness of some nodes, computed as nx.closeness_centrality does for each of them."""
+    H = G.reverse(copy=False) if G.is_directed() else G
+    closeness = {}
+    for u in sources:
+        if distance is None:
+            sp = nx.single_source_shortest_path_length(H, u)
+        else:
+            sp = nx.single_source_dijkstra_path_length(H, u, weight=distance)
+        totsp = sum(sp.values())
+        closeness[u] = 0.0
+        if totsp > 0.0 and len(G) > 1:
+            closeness[u] = (len(sp) - 1.0) / totsp
+            if wf_improved:
+                closeness[u] *= (len(sp) - 1.0) / (len(G) - 1)
+    return closeness
+
+
+def _source_chunk(G, task: tuple) -> dict:
+    """
+    Partial result of a measure over a chunk of source nodes.
+
+    Betweenness values are the raw sums of the pair dependencies of the sources,
+    not rescaled (see _rescale).
+    """
+    measure, sources, weight = task
+    if measure == 'closeness':
+        return _closeness_chunk(G, sources, distance=weight)
+
+    # The subset functions of networkx halve their unnormalized sums on undirected graphs
+    halved = not G.is_directed() and len(G) - (measure == 'betweenness') >= 2
+    if measure == 'betweenness':
+        partial = nx.betweenness_centrality_subset(G, sources, list(G), normalized=False, weight=weight)
+    else:
+        partial = nx.edge_betweenness_centrality_subset(G, sources, list(G), normalized=False, weight=weight)
+    if halved:
+        partial = {key: value * 2 for key, value in partial.items()}
+    return partial
+
+
+def _worker_source_chunk(task: tuple) -> dict:
+    return _source_chunk(_worker_graph, task)
+
+
+def _map_sources(G, measure: str, sources: list, weight: str = None, workers: int = 1) -> dict:
+    """
+    Runs a measure over chunks of source nodes, serially or over a process pool,
+    and sums the partial results.
+    """
+    n_chunks = max(1, min(workers * 4, len(sources))) if workers > 1 else 1
+    tasks = [(measure, sources[i::n_chunks], weight) for i in range(n_chunks)]
+    if workers <= 1 or len(tasks) <= 1:
+        partials = [_source_chunk(G, task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(G,)) as executor:
+            partials = list(executor.map(_worker_source_chunk, tasks))
+
+    result = {}
+    for partial in partials:
+        for key, value in partial.items():
+            result[key] = result.get(key, 0.0) + value
+    return result
+
+
+def _rescale(values: dict, n: int, normalized: bool, directed: bool, endpoints: bool,
+             pivots: list = None) -> dict:
+    """
+    Rescales raw betweenness sums as networkx does: by the number of (s, t)
+    pairs when normalized, halved for undirected graphs otherwise, and
+    extrapolated from the pivots when sampled (a pivot cannot count its own
+    paths, so its value is extrapolated from the other pivots).
+    """
+    N = n if endpoints else n - 1
+    if N < 2:
+        return values
+
+    k = N if pivots is None else len(pivots)
+    correction = 1 if directed else 2
+    if pivots is None or endpoints:
+        scale = 1 / (k * (N - 1)) if normalized else N / (k * correction)
+        return {key: value * scale for key, value in values.items()}
+
+    if normalized:
+        scale_pivot = 1 / ((k - 1) * (N - 1)) if k > 1 else math.nan
+        scale_other = 1 / (k * (N - 1))
+    else:
+        scale_pivot = N / ((k - 1) * correction) if k > 1 else math.nan
+        scale_other = N / (k * correction)
+    pivots = set(pivots)
+    return {key: value * (scale_pivot if key in pivots else scale_other) for key, value in values.items()}
+
+
+def _cached(G, measure: str, params: dict, compute, cache_path: str, weight: str = None, edges: bool = False):
+    """
+    Returns the result of compute(), read from the graph cache when the same
+    measure was already computed on the same graph with the same parameters.
+    """
+    if not cache_path:
+        return compute()
+
+    cache = GraphResultCache(cache_path)
+    key = result_key(graph_fingerprint(G, weight), measure, params)
+    cached = cache.get(key)
+    if cached is None:
+        result = compute()
+        cache.put(key, [[list(item) if edges else item, value] for item, value in result.items()])
+    else:
+        print(f"{measure} loaded from cache")
+        if edges:
+            values = {tuple(item): value for item, value in cached}
+            # Same orientation of the edges as G.edges()
+            result = {(u, v): values[(u, v)] if (u, v) in values else values[(v, u)] for u, v in G.edges()}
+        else:
+            values = {item: value for item, value in cached}
+            result = {node: values[node] for node in G}
+    cache.close()
+    return result
+
+
+def betweenness_pivots(n: int, epsilon: float = EPSILON, delta: float = DELTA) -> int:
+    """
+    Number of pivots after which every normalized betweenness estimate is
+    within epsilon of its exact value with probability 1 - delta (Hoeffding
+    bound on each of the n nodes, with a union bound).
+
+    Args:
+        n: Number of nodes
+        epsilon: Maximum absolute error on a normalized betweenness
+        delta: Probability that some node exceeds the error
+
+    Returns:
+        The number of pivots, at most n
+    """
+    if n <= 0:
+        return 0
+    return min(n, math.ceil(math.log(2 * n / delta) / (2 * epsilon ** 2)))
+
+
+def betweenness_centrality(G, normalized: bool = True, weight: str = None, workers: int = 1,
+                           cache_path: str = DEFAULT_GRAPH_CACHE) -> dict:
+    """
+    Exact betweenness centrality, same values as nx.betweenness_centrality.
+
+    The single-source shortest paths of chunks of sources run over a process
+    pool and their dependencies are summed.
+
+    Args:
+        G: A networkx graph
+        normalized: If True, divide by the number of node pairs
+        weight: Edge attribute used as distance, None for hop counts
+        workers: Number of worker processes, 1 runs in the current process
+        cache_path: SQLite graph cache, None disables the cache
+
+    Returns:
+        Dictionary with nodes as keys and betweenness as values
+    """
+    def compute():
+        raw = _map_sources(G, 'betweenness', list(G), weight, workers)
+        return _rescale(raw, len(G), normalized, G.is_directed(), endpoints=False)
+
+    params = {'normalized': normalized, 'weight': weight}
+    return _cached(G, 'betweenness', params, compute, cache_path, weight)
+
+
+def approximate_betweenness_centrality(G, epsilon: float = EPSILON, delta: float = DELTA, seed: int = 0,
+                                       normalized: bool = True, weight: str = None, workers: int = 1,
+                                       cache_path: str = DEFAULT_GRAPH_CACHE) -> dict:
+    """
+    Betweenness centrality estimated from the shortest paths of a random sample
+    of pivot nodes (Brandes & Pich), sized by betweenness_pivots so that with
+    probability 1 - delta every normalized value is within epsilon of the exact one.
+
+    With the same pivots, the values are those of nx.betweenness_centrality(G, k, seed=seed).
+    When the bound needs every node as a pivot, the exact betweenness is returned.
+
+    Args:
+        G: A networkx graph
+        epsilon: Maximum absolute error on a normalized betweenness
+        delta: Probability that some node exceeds the error
+        seed: Seed of the pivot sample
+        normalized: If True, divide by the number of node pairs
+        weight: Edge attribute used as distance, None for hop counts
+        workers: Number of worker processes, 1 runs in the current process
+        cache_path: SQLite graph cache, None disables the cache
+
+    Returns:
+        Dictionary with nodes as keys and estimated betweenness as values
+    """
+    k = betweenness_pivots(len(G), epsilon, delta)
+    if k >= len(G):
+        return betweenness_centrality(G, normalized, weight, workers, cache_path)
+
+    def compute():
+        print(f"Sampling {k} pivots out of {len(G)} nodes")
+        pivots = random.Random(seed).sample(list(G.nodes()), k)
+        raw = _map_sources(G, 'betweenness', pivots, weight, workers)
+        return _rescale(raw, len(G), normalized, G.is_directed(), endpoints=False, pivots=pivots)
+
+    params = {'normalized': normalized, 'weight': weight, 'epsilon': epsilon, 'delta': delta, 'seed': seed}
+    return _cached(G, 'approximate_betweenness', params, compute, cache_path, weight)
+
+
+def edge_betweenness_centrality(G, normalized: bool = True, weight: str = None, workers: int = 1,
+                                cache_path: str = DEFAULT_GRAPH_CACHE) -> dict:
+    """
+    Exact edge betweenness centrality, same values as nx.edge_betweenness_centrality,
+    computed over chunks of sources in parallel.
+
+    Args:
+        G: A networkx graph
+        normalized: If True, divide by the number of node pairs
+        weight: Edge attribute used as distance, None for hop counts
+        workers: Number of worker processes, 1 runs in the current process
+        cache_path: SQLite graph cache, None disables the cache
+
+    Returns:
+        Dictionary with the edges of G.edges() as keys and betweenness as values
+    """
+    def compute():
+        raw = _map_sources(G, 'edge_betweenness', list(G), weight, workers)
+        return _rescale(raw, len(G), normalized, G.is_directed(), endpoints=True)
+
+    params = {'normalized': normalized, 'weight': weight}
+    return _cached(G, 'edge_betweenness', params, compute, cache_path, weight, edges=True)
+
+
+def closeness_centrality(G, distance: str = None, workers: int = 1, cache_path: str = DEFAULT_GRAPH_CACHE) -> dict:
+    """
+    Closeness centrality, same values as nx.closeness_centrality (with the
+    Wasserman and Faust correction), the nodes being spread over a process pool.
+
+    Args:
+        G: A networkx graph
+        distance: Edge attribute used as distance, None for hop counts
+        workers: Number of worker processes, 1 runs in the current process
+        cache_path: SQLite graph cache, None disables the cache
+
+    Returns:
+        Dictionary with nodes as keys and closeness as values
+    """
+    def compute():
+        closeness = _map_sources(G, 'closeness', list(G), distance, workers)
+        return {node: closeness[node] for node in G}
+
+    return _cached(G, 'closeness', {'distance': distance}, compute, cache_path, distance)
+
+
+def eigenvector_centrality(G, max_iter: int = 1000, tol: float = 1e-06, weight: str = None,
+                           cache_path: str = DEFAULT_GRAPH_CACHE) -> dict:
+    """
+    Eigenvector centrality of nx.eigenvector_centrality, cached.
+
+    Args:
+        G: A networkx graph
+        max_iter: Maximum number of power iterations
+        tol: Error tolerance of the power iterations
+        weight: Edge attribute used as weight, None for an unweighted graph
+        cache_path: SQLite graph cache, None disables the cache
+
+    Returns:
+        Dictionary with nodes as keys and eigenvector centrality as values
+    """
+    def compute():
+        return nx.eigenvector_centrality(G, max_iter=max_iter, tol=tol, weight=weight)
+
+    params = {'max_iter': max_iter, 'tol': tol, 'weight': weight}
+    return _cached(G, 'eigenvector', params, compute, cache_path, weight)
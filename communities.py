@@ -0,0 +1,368 @@
+import os
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import networkx as nx
+import scipy.sparse as sp
+
+import instrumentation
+from covote import load_covote_graph
+from graph_cache import DEFAULT_GRAPH_CACHE, GraphResultCache, graph_fingerprint, result_key
+
+# Default sweep: Louvain seeds per resolution and resolutions tried
+N_SEEDS = 20
+RESOLUTIONS = (0.5, 0.75, 1.0, 1.25, 1.5)
+
+# Pairs of nodes grouped together in at least this fraction of the runs are linked in the consensus graph
+CONSENSUS_THRESHOLD = 0.5
+CONSENSUS_MAX_ITER = 10
+
+# Graph of the worker processes, sent once per worker by the pool initializer
+_worker_graph = None
+
+
+def _init_worker(G) -> None:
+    global _worker_graph
+    _worker_graph = G
+
+
+def _louvain(G, resolution: float, seed: int, weight: str = 'weight') -> list:
+    """Louvain communities as sorted lists of nodes, largest community first."""
+    communities = nx.community.louvain_communities(G, weight=weight, resolution=resolution, seed=seed)
+    return sorted((sorted(community) for community in communities), key=len, reverse=True)
+
+
+def _worker_louvain(task: tuple) -> list:
+    resolution, seed = task
+    return _louvain(_worker_graph, resolution, seed)
+
+
+def stability_path(communities_output: str) -> str:
+    """
+    Returns the stability report matching a communautes_XX.json path.
+
+    Args:
+        communities_output: The path of the communautes_XX.json file
+
+    Returns:
+        The path of the report (e.g. data/processed/communautes_17_stability.json)
+    """
+    return os.path.splitext(communities_output)[0] + '_stability.json'
+
+
+def louvain_runs(G, resolutions, seeds, workers: int = 1, cache_path: str = DEFAULT_GRAPH_CACHE) -> dict:
+    """
+    Louvain communities of the weighted graph for every resolution and seed.
+
+    Runs already in the graph cache for the same graph are read from it, the
+    others are spread over a process pool and added to the cache.
+
+    Args:
+        G: A networkx graph with a 'weight' edge attribute
+        resolutions: Louvain resolutions
+        seeds: Louvain seeds, run for each resolution
+        workers: Number of worker processes, 1 runs in the current process
+        cache_path: SQLite graph cache, None disables the cache
+
+    Returns:
+        Dictionary with (resolution, seed) tuples as keys and lists of communities
+        (sorted lists of nodes, largest first) as values
+    """
+    tasks = [(float(resolution), int(seed)) for resolution in resolutions for seed in seeds]
+    runs = {}
+    cache = GraphResultCache(cache_path) if cache_path else None
+    fingerprint = graph_fingerprint(G, 'weight') if cache else None
+
+    def key(task):
+        return result_key(fingerprint, 'louvain', {'resolution': task[0], 'seed': task[1]})
+
+    if cache:
+        for task in tasks:
+            cached = cache.get(key(task))
+            if cached is not None:
+                runs[task] = cached
+        instrumentation.count('louvain_cache_hits', len(runs))
+
+    missing = [task for task in tasks if task not in runs]
+    if missing:
+        print(f"Running Louvain for {len(missing)} (resolution, seed) pairs ({len(runs)} cached)")
+        if workers <= 1 or len(missing) <= 1:
+            results = [_louvain(G, resolution, seed) for resolution, seed in missing]
+        else:
+            with ProcessPoolExecutor(max_workers=min(workers, len(missing)), initializer=_init_worker,
+                                     initargs=(G,)) as executor:
+                results = list(executor.map(_worker_louvain, missing))
+        instrumentation.count('louvain_runs', len(missing))
+        for task, communities in zip(missing, results):
+            runs[task] = communities
+            if cache:
+                cache.put(key(task), communities)
+
+    if cache:
+        cache.close()
+    return {task: runs[task] for task in tasks}
+
+
+def partition_labels(communities: list, node_index: dict) -> np.ndarray:
+    """
+    Community of every node as an integer array.
+
+    Args:
+        communities: Lists of nodes
+        node_index: Dictionary with nodes as keys and positions as values
+
+    Returns:
+        Array of the community number of each node, -1 for nodes in no community
+    """
+    labels = np.full(len(node_index), -1, dtype=np.int64)
+    for c, community in enumerate(communities):
+        labels[[node_index[node] for node in community]] = c
+    return labels
+
+
+def coassociation_matrix(partitions: list, node_index: dict) -> np.ndarray:
+    """
+    Fraction of the partitions in which each pair of nodes is in the same community.
+
+    Each partition is a sparse node × community membership matrix M, the
+    co-association is the mean of the M @ M.T.
+
+    Args:
+        partitions: Lists of communities
+        node_index: Dictionary with nodes as keys and positions as values
+
+    Returns:
+        Dense symmetric node × node matrix, 1 on the diagonal for the nodes in a community
+    """
+    n = len(node_index)
+    counts = np.zeros((n, n))
+    for communities in partitions:
+        labels = partition_labels(communities, node_index)
+        assigned = np.flatnonzero(labels >= 0)
+        membership = sp.csr_matrix((np.ones(len(assigned)), (assigned, labels[assigned])),
+                                   shape=(n, max(len(communities), 1)))
+        counts += (membership @ membership.T).toarray()
+    return counts / max(len(partitions), 1)
+
+
+def adjusted_rand_index(labels_a: np.ndarray, labels_b: np.ndarray) -> float:
+    """
+    Adjusted Rand index of two partitions of the same nodes: 1 for identical
+    partitions, around 0 for independent ones.
+
+    Args:
+        labels_a, labels_b: Community number of each node
+
+    Returns:
+        The index
+    """
+    n = len(labels_a)
+    if n < 2:
+        return 1.0
+    _, a = np.unique(labels_a, return_inverse=True)
+    _, b = np.unique(labels_b, return_inverse=True)
+    contingency = sp.coo_matrix((np.ones(n), (a, b))).tocsr()
+
+    def pairs(values):
+        values = np.asarray(values, dtype=np.float64)
+        return float((values * (values - 1) / 2).sum())
+
+    index = pairs(contingency.data)
+    rows = pairs(contingency.sum(axis=1))
+    cols = pairs(contingency.sum(axis=0))
+    expected = rows * cols / (n * (n - 1) / 2)
+    maximum = (rows + cols) / 2
+    if maximum == expected:
+        return 1.0
+    return (index - expected) / (maximum - expected)
+
+
+def consensus_partition(G, partitions: list, threshold: float = CONSENSUS_THRESHOLD,
+                        max_iter: int = CONSENSUS_MAX_ITER, seed: int = 0) -> tuple:
+    """
+    Consensus of several partitions (Lancichinetti & Fortunato): the nodes
+    are linked with the fraction of the partitions that group them, pairs
+    below the threshold being dropped, and Louvain runs on this graph with as
+    many seeds as there are partitions. This is repeated on the new
+    partitions until they all agree.
+
+    Args:
+        G: The graph the partitions were computed on
+        partitions: Lists of communities
+        threshold: Minimum co-association of a linked pair
+        max_iter: Maximum number of consensus rounds
+        seed: First seed of the consensus runs
+
+    Returns:
+        A tuple (communities, coassociation): the consensus communities (sorted
+        lists of nodes, largest first) and the co-association matrix of the
+        input partitions, nodes in the order of G
+    """
+    nodes = list(G)
+    node_index = {node: i for i, node in enumerate(nodes)}
+    coassociation = coassociation_matrix(partitions, node_index)
+
+    current = coassociation
+    runs = partitions
+    for _ in range(max_iter):
+        rows, cols = np.nonzero(np.triu(current >= threshold, k=1))
+        H = nx.Graph()
+        H.add_nodes_from(nodes)
+        H.add_weighted_edges_from((nodes[i], nodes[j], float(current[i, j]))
+                                  for i, j in zip(rows.tolist(), cols.tolist()))
+        runs = [_louvain(H, 1.0, seed + i) for i in range(len(partitions))]
+        current = coassociation_matrix(runs, node_index)
+        if np.all((current == 0) | (current == 1)):
+            break
+    else:
+        print(f"⚠️ Consensus runs still disagree after {max_iter} rounds, keeping the first one")
+
+    return runs[0], coassociation
+
+
+def community_stability(G, resolutions=RESOLUTIONS, n_seeds: int = N_SEEDS, seed: int = 0,
+                        resolution: float = 1.0, threshold: float = CONSENSUS_THRESHOLD, workers: int = 1,
+                        cache_path: str = DEFAULT_GRAPH_CACHE) -> tuple:
+    """
+    Multi-seed Louvain over a sweep of resolutions, and the consensus partition
+    of the runs at one resolution. Nodes without edges are left out.
+
+    Args:
+        G: A networkx graph with a 'weight' edge attribute
+        resolutions: Louvain resolutions of the sweep
+        n_seeds: Number of Louvain seeds per resolution (seed, seed + 1, ...)
+        seed: First Louvain seed
+        resolution: Resolution of the consensus partition, added to the sweep if needed
+        threshold: Minimum co-association of a pair linked in the consensus graph
+        workers: Number of worker processes of the Louvain runs
+        cache_path: SQLite graph cache, None disables the cache
+
+    Returns:
+        A tuple (communities, report): the consensus communities (sorted lists
+        of nodes, largest first) and a JSON-serializable stability report
+    """
+    G = G.copy()
+    isolated = list(nx.isolates(G))
+    G.remove_nodes_from(isolated)
+    resolutions = sorted(set(float(r) for r in resolutions) | {float(resolution)})
+    seeds = list(range(seed, seed + n_seeds))
+
+    report = {'resolution': float(resolution), 'seeds': seeds, 'threshold': threshold, 'isolated': len(isolated)}
+    if G.number_of_edges() == 0:
+        print("⚠️ The graph has no edges, no communities")
+        report.update({'modularity': None, 'consensus_ari_mean': None, 'sweep': [], 'communities': [],
+                       'nodes': {}})
+        return [], report
+
+    runs = louvain_runs(G, resolutions, seeds, workers, cache_path)
+    node_index = {node: i for i, node in enumerate(G)}
+
+    sweep = []
+    for r in resolutions:
+        partitions = [runs[(r, s)] for s in seeds]
+        labels = [partition_labels(communities, node_index) for communities in partitions]
+        agreements = [adjusted_rand_index(labels[i], labels[j])
+                      for i in range(len(labels)) for j in range(i + 1, len(labels))]
+        modularities = [nx.community.modularity(G, communities, weight='weight', resolution=r)
+                        for communities in partitions]
+        sizes = [len(communities) for communities in partitions]
+        sweep.append({
+            'resolution': r,
+            'communities_mean': float(np.mean(sizes)),
+            'communities_std': float(np.std(sizes)),
+            'modularity_mean': float(np.mean(modularities)),
+            'modularity_std': float(np.std(modularities)),
+            # Agreement of every pair of seeds, 1.0 with a single seed
+            'ari_mean': float(np.mean(agreements)) if agreements else 1.0,
+            'ari_min': float(np.min(agreements)) if agreements else 1.0,
+        })
+
+    partitions = [runs[(float(resolution), s)] for s in seeds]
+    communities, coassociation = consensus_partition(G, partitions, threshold, seed=seed)
+    consensus_labels = partition_labels(communities, node_index)
+
+    # Stability of a node: mean fraction of the runs grouping it with the other members of its community
+    node_stability = {}
+    community_scores = []
+    for community in communities:
+        members = np.array([node_index[node] for node in community])
+        block = coassociation[np.ix_(members, members)]
+        scores = (block.sum(axis=1) - 1) / (len(members) - 1) if len(members) > 1 else np.full(1, np.nan)
+        for node, score in zip(community, scores.tolist()):
+            node_stability[node] = None if np.isnan(score) else score
+        community_scores.append({'size': len(community),
+                                 'stability': None if np.isnan(scores).all() else float(np.nanmean(scores))})
+
+    report.update({
+        'modularity': nx.community.modularity(G, communities, weight='weight', resolution=resolution),
+        'consensus_ari_mean': float(np.mean([adjusted_rand_index(partition_labels(partition, node_index),
+                                                                 consensus_labels)
+                                             for partition in partitions])),
+        'sweep': sweep,
+        'communities': community_scores,
+        'nodes': node_stability,
+    })
+    return communities, report
+
+
+def detect_communities(graph_path: str, communities_output: str, resolutions=RESOLUTIONS, n_seeds: int = N_SEEDS,
+                       seed: int = 0, resolution: float = 1.0, threshold: float = CONSENSUS_THRESHOLD,
+                       workers: int = 1, cache_path: str = DEFAULT_GRAPH_CACHE) -> list:
+    """
+    Consensus communities of a co-vote graph, written to communautes_XX.json
+    (lists of deputy ids, largest first) with their stability report next to it.
+
+    Args:
+        graph_path: The graph_XX.json file written by covote.save_covote_graph
+        communities_output: The communautes_XX.json file
+        resolutions, n_seeds, seed, resolution, threshold, workers, cache_path: See community_stability
+
+    Returns:
+        The consensus communities
+    """
+    G = load_covote_graph(graph_path)
+    communities, report = community_stability(G, resolutions, n_seeds, seed, resolution, threshold, workers,
+                                              cache_path)
+
+    output_dir = os.path.dirname(communities_output)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(communities_output, 'w', encoding='utf-8') as f:
+        json.dump(communities, f)
+    with open(stability_path(communities_output), 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=1)
+
+    print(f"✅ Saved {len(communities)} consensus communities of {n_seeds} seeds at resolution {resolution} "
+          f"to {communities_output} ({report['isolated']} deputees without edges left out)")
+    if report['modularity'] is not None:
+        print(f"   modularity {report['modularity']:.3f}, mean agreement of the runs with the consensus "
+              f"{report['consensus_ari_mean']:.3f}, report in {stability_path(communities_output)}")
+    return communities
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consensus Louvain communities of a co-vote graph over many seeds "
+                                                 "and a sweep of resolutions.")
+    parser.add_argument('graph', help="graph_XX.json written by the pipeline graph stage")
+    parser.add_argument('output', help="communautes_XX.json")
+    parser.add_argument('--resolutions', nargs='+', type=float, default=list(RESOLUTIONS), metavar='R',
+                        help=f"resolutions of the sweep (default: {' '.join(map(str, RESOLUTIONS))})")
+    parser.add_argument('--resolution', type=float, default=1.0,
+                        help="resolution of the consensus partition (default: 1.0)")
+    parser.add_argument('--seeds', type=int, default=N_SEEDS, help=f"seeds per resolution (default: {N_SEEDS})")
+    parser.add_argument('--seed', type=int, default=0, help="first seed (default: 0)")
+    parser.add_argument('--threshold', type=float, default=CONSENSUS_THRESHOLD,
+                        help=f"minimum co-association in the consensus graph (default: {CONSENSUS_THRESHOLD})")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--cache', default=DEFAULT_GRAPH_CACHE,
+                        help=f"SQLite graph cache, '' to disable it (default: {DEFAULT_GRAPH_CACHE})")
+    args = parser.parse_args()
+
+    detect_communities(args.graph, args.output, args.resolutions, args.seeds, args.seed, args.resolution,
+                       args.threshold, args.workers, args.cache or None)
+
+
+if __name__ == '__main__':
+    main()
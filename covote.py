@@ -0,0 +1,308 @@
+import os
+import json
+
+import numpy as np
+import networkx as nx
+import scipy.sparse as sp
+
+from vote_store import VoteStore, load_vote_store
+
+# Weight added to a pair of deputies each time they vote POUR together
+# (same convention as the original pairwise loop of graph_construction.ipynb)
+POUR_WEIGHT = 0.5
+
+
+def load_votes(vote_path: str):
+    """
+    Loads processed votes (output of extract_vote.py).
+
+    Args:
+        vote_path: Path to a vote_XX.json file, or to a columnar store folder
+
+    Returns:
+        Dictionary with vote_id as keys and vote data as values, or a VoteStore
+        for a columnar store
+    """
+    if os.path.isdir(vote_path):
+        return load_vote_store(vote_path)
+    with open(vote_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def build_incidence(votes: dict, deputy_ids=None) -> tuple:
+    """
+    Builds the deputy x vote sparse incidence matrices of a legislature.
+
+    Deputies are interned to integer indices: row i of both matrices is the
+    deputy deputy_index[i]. participation is binary, while pour keeps the
+    number of times a deputy is listed as POUR so that shared counts match
+    the pairwise loop of the notebook.
+
+    Args:
+        votes: Dictionary of votes as produced by extract_vote.py
+        deputy_ids: Optional iterable of deputy ids to keep (e.g. the keys of
+                    deputees_XX.json). If None, every voter is kept, in order
+                    of first appearance.
+
+    Returns:
+        A tuple (deputy_index, vote_ids, pour, participation) where pour and
+        participation are CSR matrices of shape (n_deputies, n_votes).
+        participation covers the POUR, CONTRE and ABSTENTION positions.
+    """
+    restricted = deputy_ids is not None
+    deputy_index = list(deputy_ids) if restricted else []
+    index_of = {deputy: i for i, deputy in enumerate(deputy_index)}
+
+    vote_ids = list(votes.keys())
+    pour_rows, pour_cols = [], []
+    part_rows, part_cols = [], []
+
+    for col, vote_id in enumerate(vote_ids):
+        vote_data = votes[vote_id]
+        for position in ('votes_for', 'votes_against', 'votes_abs'):
+            for deputy in vote_data.get(position, []):
+                row = index_of.get(deputy)
+                if row is None:
+                    if restricted:
+                        continue
+                    row = index_of[deputy] = len(deputy_index)
+                    deputy_index.append(deputy)
+                part_rows.append(row)
+                part_cols.append(col)
+                if position == 'votes_for':
+                    pour_rows.append(row)
+                    pour_cols.append(col)
+
+    shape = (len(deputy_index), len(vote_ids))
+    pour = _count_csr(pour_rows, pour_cols, shape)
+    participation = _count_csr(part_rows, part_cols, shape)
+    participation.data[:] = 1
+    return deputy_index, vote_ids, pour, participation
+
+
+def build_incidence_from_store(store: VoteStore, deputy_ids=None) -> tuple:
+    """
+    Builds the same incidence matrices as build_incidence directly from the
+    offset/voter arrays of a columnar vote store, without Python loops.
+
+    Args:
+        store: A VoteStore
+        deputy_ids: Optional iterable of deputy ids to keep
+
+    Returns:
+        A tuple (deputy_index, vote_ids, pour, participation), see build_incidence
+    """
+    n_votes = len(store)
+    store_deputies = store.deputies.tolist()
+
+    if deputy_ids is None:
+        # The store interns deputies in order of first appearance, like build_incidence
+        deputy_index = store_deputies
+        code_map = np.arange(len(store_deputies), dtype=np.int64)
+    else:
+        deputy_index = list(deputy_ids)
+        index_of = {deputy: i for i, deputy in enumerate(deputy_index)}
+        code_map = np.asarray([index_of.get(deputy, -1) for deputy in store_deputies], dtype=np.int64)
+
+    def coordinates(prefix):
+        offsets = np.asarray(store.offsets[prefix])
+        rows = code_map[np.asarray(store.voters[prefix])] if len(code_map) else np.zeros(0, dtype=np.int64)
+        cols = np.repeat(np.arange(n_votes, dtype=np.int64), np.diff(offsets))
+        keep = rows >= 0
+        return rows[keep], cols[keep]
+
+    shape = (len(deputy_index), n_votes)
+    pour_rows, pour_cols = coordinates('for')
+    pour = _count_csr(pour_rows, pour_cols, shape)
+
+    part = [coordinates(prefix) for prefix in ('for', 'against', 'abs')]
+    participation = _count_csr(np.concatenate([rows for rows, _ in part]),
+                               np.concatenate([cols for _, cols in part]), shape)
+    participation.data[:] = 1
+    return deputy_index, store.vote_ids.tolist(), pour, participation
+
+
+def _count_csr(rows: list, cols: list, shape: tuple) -> sp.csr_matrix:
+    """Builds a CSR matrix counting how many times each coordinate appears."""
+    data = np.ones(len(rows), dtype=np.int32)
+    matrix = sp.csr_matrix((data, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64))), shape=shape)
+    matrix.sum_duplicates()
+    return matrix
+
+
+def covote_counts(pour: sp.csr_matrix, participation: sp.csr_matrix) -> tuple:
+    """
+    Computes the pairwise shared-POUR and common-participation counts.
+
+    Args:
+        pour: Deputy x vote POUR incidence matrix
+        participation: Deputy x vote participation incidence matrix
+
+    Returns:
+        A tuple (shared, common) of COO matrices restricted to the strict upper
+        triangle and to the pairs that voted POUR together at least once.
+        common holds the number of votes both deputies took part in.
+    """
+    shared = sp.triu(pour @ pour.T, k=1).tocoo()
+    shared.eliminate_zeros()
+
+    if shared.nnz == 0:
+        # No pair voted POUR together: fancy indexing would return an object array
+        return shared, sp.coo_matrix(shared.shape, dtype=np.int64)
+
+    common_full = (participation @ participation.T).tocsr()
+    common_values = np.asarray(common_full[shared.row, shared.col], dtype=np.int64).ravel()
+    common = sp.coo_matrix((common_values, (shared.row, shared.col)), shape=shared.shape)
+    return shared, common
+
+
+def covote_matrix(votes: dict, deputy_ids=None) -> tuple:
+    """
+    Computes the weighted co-vote matrix of a legislature.
+
+    The weight of a pair is POUR_WEIGHT * (number of shared POUR votes) divided
+    by the number of votes both deputies participated in, which is the
+    'percentage' of the original notebook.
+
+    Args:
+        votes: Dictionary of votes as produced by extract_vote.py, or a VoteStore
+        deputy_ids: Optional iterable of deputy ids to keep
+
+    Returns:
+        A tuple (deputy_index, weights) where weights is a CSR matrix holding
+        the strict upper triangle of the co-vote percentages.
+    """
+    if isinstance(votes, VoteStore):
+        deputy_index, _, pour, participation = build_incidence_from_store(votes, deputy_ids)
+    else:
+        deputy_index, _, pour, participation = build_incidence(votes, deputy_ids)
+    shared, common = covote_counts(pour, participation)
+
+    percentages = POUR_WEIGHT * shared.data / common.data
+    weights = sp.csr_matrix((percentages, (shared.row, shared.col)), shape=shared.shape)
+    return deputy_index, weights
+
+
+def covote_edges(deputy_index: list, weights: sp.spmatrix, k: float) -> list:
+    """
+    Lists the co-vote edges whose percentage reaches the threshold k.
+
+    Args:
+        deputy_index: Deputy ids, as returned by covote_matrix
+        weights: Upper triangular co-vote matrix, as returned by covote_matrix
+        k: Threshold (percentage between 0 and 1)
+
+    Returns:
+        A list of (deputy1, deputy2, percentage) tuples with deputy1 < deputy2
+    """
+    weights = weights.tocoo()
+    keep = weights.data >= k
+
+    edges = []
+    for row, col, percentage in zip(weights.row[keep], weights.col[keep], weights.data[keep]):
+        deputy1, deputy2 = sorted((deputy_index[row], deputy_index[col]))
+        edges.append((deputy1, deputy2, float(percentage)))
+    return edges
+
+
+def pairwise_covote_edges(votes: dict, k: float, deputy_ids=None) -> list:
+    """
+    Reference co-vote edges, computed with the pairwise loop of the original
+    notebook. Quadratic in the number of POUR voters of a vote, only meant to
+    check covote_matrix on small inputs.
+
+    Args:
+        votes: Dictionary of votes as produced by extract_vote.py
+        k: Threshold (percentage between 0 and 1)
+        deputy_ids: Optional iterable of deputy ids to keep
+
+    Returns:
+        A sorted list of (deputy1, deputy2, percentage) tuples with deputy1 < deputy2
+    """
+    kept = set(deputy_ids) if deputy_ids is not None else None
+    co_votes = {}
+    deputy_votes = {}
+
+    for vote_id, vote_data in votes.items():
+        pour_voters = vote_data.get('votes_for', [])
+        all_voters = set(pour_voters + vote_data.get('votes_against', []) + vote_data.get('votes_abs', []))
+        for deputy in all_voters:
+            deputy_votes.setdefault(deputy, set()).add(vote_id)
+
+        for i in range(len(pour_voters)):
+            for j in range(i + 1, len(pour_voters)):
+                deputy1, deputy2 = pour_voters[i], pour_voters[j]
+                if deputy1 == deputy2 or (kept is not None and (deputy1 not in kept or deputy2 not in kept)):
+                    continue
+                pair = tuple(sorted([deputy1, deputy2]))
+                co_votes[pair] = co_votes.get(pair, 0) + POUR_WEIGHT
+
+    edges = []
+    for (deputy1, deputy2), pour_count in co_votes.items():
+        total_common = len(deputy_votes[deputy1] & deputy_votes[deputy2])
+        if total_common > 0 and pour_count / total_common >= k:
+            edges.append((deputy1, deputy2, pour_count / total_common))
+    return sorted(edges)
+
+
+def verify_covote(votes: dict, k: float, deputy_ids=None) -> bool:
+    """
+    Checks the sparse co-vote edges against pairwise_covote_edges.
+
+    Args:
+        votes: Dictionary of votes as produced by extract_vote.py
+        k: Threshold (percentage between 0 and 1)
+        deputy_ids: Optional iterable of deputy ids to keep
+
+    Returns:
+        True if both edge lists hold the same pairs with the same percentages
+    """
+    if deputy_ids is not None:
+        deputy_ids = list(deputy_ids)
+    deputy_index, weights = covote_matrix(votes, deputy_ids)
+    sparse = sorted(covote_edges(deputy_index, weights, k))
+    reference = pairwise_covote_edges(votes, k, deputy_ids)
+
+    same = ([edge[:2] for edge in sparse] == [edge[:2] for edge in reference]
+            and np.allclose([edge[2] for edge in sparse], [edge[2] for edge in reference]))
+    if same:
+        print(f"✅ {len(sparse)} co-vote edges identical to the pairwise loop")
+    else:
+        print(f"❌ Co-vote edges differ from the pairwise loop ({len(sparse)} sparse, {len(reference)} pairwise)")
+    return same
+
+
+def save_covote_graph(output_path: str, deputy_index: list, edges: list, k: float) -> None:
+    """
+    Writes a thresholded co-vote graph to a JSON file.
+
+    Args:
+        output_path: The graph_XX.json file
+        deputy_index: Deputy ids, every one of them is a node
+        edges: (deputy1, deputy2, percentage) tuples, as returned by covote_edges
+        k: The threshold the edges were selected with
+    """
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({'k': k, 'nodes': list(deputy_index), 'edges': [list(edge) for edge in edges]}, f)
+
+
+def load_covote_graph(graph_path: str, weight: str = 'weight') -> nx.Graph:
+    """
+    Reads a co-vote graph written by save_covote_graph.
+
+    Args:
+        graph_path: The graph_XX.json file
+        weight: Name of the edge attribute holding the percentage
+
+    Returns:
+        The networkx Graph, nodes and edges in the order of the file
+    """
+    with open(graph_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    G = nx.Graph()
+    G.add_nodes_from(data['nodes'])
+    G.add_weighted_edges_from(data['edges'], weight=weight)
+    return G
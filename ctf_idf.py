@@ -0,0 +1,204 @@
+import numpy as np
+from scipy import sparse
+
+# Augmented term frequency K + (1 - K) * (count / max_count) ** U of nlp_processing.ipynb
+TF_K = 0.25
+TF_U = {
+    'tf-idf': 1.0,
+    'ctf-idf': 0.5,
+}
+
+
+class TermMatrix:
+    """
+    Sparse deputy × term count matrix, built once from the token Counters of the
+    deputies and shared by every community assignment.
+
+    Rows are keyed by deputy id, or by any hashable key such as
+    (legislature, deputy id) to hold several legislatures at once.
+
+    Attributes:
+        row_keys: Key of each row
+        terms: Term of each column, sorted
+        counts: CSR matrix of token counts (rows × terms)
+    """
+
+    def __init__(self, row_keys: list, terms: list, counts: sparse.csr_matrix):
+        self.row_keys = row_keys
+        self.terms = terms
+        self.counts = counts
+        self.row_index = {key: i for i, key in enumerate(row_keys)}
+
+    @classmethod
+    def from_counters(cls, counters: dict) -> 'TermMatrix':
+        """
+        Builds the matrix from token Counters.
+
+        Args:
+            counters: Dictionary with row keys (deputy ids) as keys and Counters as values
+
+        Returns:
+            The TermMatrix
+        """
+        terms = sorted({term for counter in counters.values() for term in counter})
+        term_index = {term: j for j, term in enumerate(terms)}
+
+        indptr = [0]
+        indices = []
+        data = []
+        for counter in counters.values():
+            indices.extend(term_index[term] for term in counter)
+            data.extend(counter.values())
+            indptr.append(len(indices))
+
+        counts = sparse.csr_matrix((np.asarray(data, dtype=np.int64), np.asarray(indices, dtype=np.int64),
+                                    np.asarray(indptr, dtype=np.int64)), shape=(len(counters), len(terms)))
+        counts.sort_indices()
+        return cls(list(counters), terms, counts)
+
+    def indicator(self, communities: list) -> sparse.csr_matrix:
+        """
+        Community × row indicator matrix.
+
+        Args:
+            communities: List of communities, each a list of row keys. Keys without
+                         a row (deputies who never spoke) are ignored.
+
+        Returns:
+            CSR matrix where entry (c, r) is the number of times row r appears in community c
+        """
+        rows = []
+        cols = []
+        for c, community in enumerate(communities):
+            for key in community:
+                r = self.row_index.get(key)
+                if r is not None:
+                    rows.append(c)
+                    cols.append(r)
+        return sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)),
+                                 shape=(len(communities), len(self.row_keys)))
+
+    def scores(self, communities: list, method: str = 'ctf-idf', groups: list = None) -> sparse.csr_matrix:
+        """
+        Scores every term used by each community, as nlp_processing.ipynb does:
+        - TF: augmented frequency K + (1 - K) * (count / max_count) ** U of the
+          community counts (U = 1 for 'tf-idf', 0.5 for 'ctf-idf');
+        - IDF: log(N / (df + 1)), df being the number of communities of the same
+          group using the term and N the number of communities of the group;
+        - CTF ('ctf-idf' only): share of the deputies of the community using the term.
+        Terms a community never uses score 0 and are not stored.
+
+        Args:
+            communities: List of communities, each a list of row keys
+            method: 'tf-idf' (TF × IDF) or 'ctf-idf' (TF × IDF × CTF)
+            groups: Group of each community (e.g. its legislature), the IDF is
+                    computed within each group. By default all communities form one group.
+
+        Returns:
+            CSR matrix of scores (communities × terms)
+        """
+        if method not in TF_U:
+            raise ValueError(f"Unknown method {method!r}, expected one of {list(TF_U)}")
+
+        indicator = self.indicator(communities)
+        community_counts = (indicator @ self.counts).tocsr()
+        community_counts.eliminate_zeros()
+        community_counts.sort_indices()
+        row_of_entry = np.repeat(np.arange(len(communities)), np.diff(community_counts.indptr))
+        columns = community_counts.indices
+
+        # Augmented TF, on the stored (non zero) counts only
+        max_counts = community_counts.max(axis=1).toarray().ravel()
+        tf = TF_K + (1 - TF_K) * (community_counts.data / max_counts[row_of_entry]) ** TF_U[method]
+
+        # IDF within each group of communities
+        if groups is None:
+            groups = [0] * len(communities)
+        group_index = {}
+        group_of_community = np.array([group_index.setdefault(group, len(group_index)) for group in groups],
+                                      dtype=np.int64)
+        group_indicator = sparse.csr_matrix(
+            (np.ones(len(communities)), (group_of_community, np.arange(len(communities)))),
+            shape=(len(group_index), len(communities)))
+        used = community_counts.copy()
+        used.data = np.ones_like(used.data, dtype=np.float64)
+        doc_freq = (group_indicator @ used).toarray()
+        n_communities = np.bincount(group_of_community, minlength=len(group_index))
+        entry_group = group_of_community[row_of_entry]
+        idf = np.log(n_communities[entry_group] / (doc_freq[entry_group, columns] + 1))
+
+        data = tf * idf
+        if method == 'ctf-idf':
+            presence = self.counts.copy()
+            presence.data = np.ones_like(presence.data)
+            users = (indicator @ presence).tocsr()
+            users.eliminate_zeros()
+            users.sort_indices()
+            # A community uses a term iff one of its deputies does: same sparsity as community_counts
+            sizes = np.array([len(community) for community in communities], dtype=np.float64)
+            data = data * users.data / sizes[row_of_entry]
+
+        return sparse.csr_matrix((data, columns.copy(), community_counts.indptr.copy()),
+                                 shape=community_counts.shape)
+
+    def top_terms(self, communities: list, n: int = 100, method: str = 'ctf-idf', groups: list = None) -> list:
+        """
+        The n best scored terms of each community.
+
+        Args:
+            communities: List of communities, each a list of row keys
+            n: Number of terms kept per community
+            method: 'tf-idf' or 'ctf-idf' (see scores)
+            groups: Group of each community for the IDF (see scores)
+
+        Returns:
+            One {term: score} dictionary per community, by decreasing score
+            (ties in alphabetical order)
+        """
+        scores = self.scores(communities, method, groups)
+        top = []
+        for c in range(scores.shape[0]):
+            start, end = scores.indptr[c], scores.indptr[c + 1]
+            columns = scores.indices[start:end]
+            values = scores.data[start:end]
+            # Columns are sorted terms, so a stable sort keeps ties alphabetical
+            order = np.argsort(-values, kind='stable')[:n]
+            top.append({self.terms[columns[i]]: float(values[i]) for i in order})
+        return top
+
+
+def legislature_top_terms(legislature_counters: dict, legislature_communities: dict, n: int = 100,
+                          method: str = 'ctf-idf') -> dict:
+    """
+    Top terms of the communities of several legislatures, scored in one pass.
+
+    The IDF of a term is computed among the communities of its legislature, so
+    the result is the same as scoring each legislature on its own.
+
+    Args:
+        legislature_counters: {legislature: {deputy id: token Counter}}
+        legislature_communities: {legislature: list of communities (lists of deputy ids)}
+        n: Number of terms kept per community
+        method: 'tf-idf' or 'ctf-idf'
+
+    Returns:
+        {legislature: one {term: score} dictionary per community}
+    """
+    matrix = TermMatrix.from_counters({
+        (legislature, deputy_id): counter
+        for legislature, counters in legislature_counters.items()
+        for deputy_id, counter in counters.items()
+    })
+
+    communities = []
+    groups = []
+    for legislature, legislature_comms in legislature_communities.items():
+        for community in legislature_comms:
+            communities.append([(legislature, deputy_id) for deputy_id in community])
+            groups.append(legislature)
+
+    top = matrix.top_terms(communities, n, method, groups)
+    result = {legislature: [] for legislature in legislature_communities}
+    for legislature, terms in zip(groups, top):
+        result[legislature].append(terms)
+    return result
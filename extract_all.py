@@ -0,0 +1,455 @@
+import os
+import json
+import shutil
+import hashlib
+import filecmp
+import argparse
+from functools import partial
+
+import extract_deputees
+from extract_deputees import (apply_compte_rendu_speeches, apply_vote_groups, extract_vote_groups,
+                              list_compte_rendu_files, parse_compte_rendu_file, save_deputees, strip_organ_dates)
+from extract_vote import process_single_vote_json, save_legislature_votes
+from actor_index import DEFAULT_CACHE_PATH
+from legislatures import LEGISLATURE_CONFIGS
+from manifest import FileManifest
+from scrutin_reader import iter_scrutins, list_vote_files, map_files, vote_sort_key
+from speech_corpus import CORPUS_FILES, SpeechCorpusWriter, corpus_path, load_speech_corpus
+
+
+def consume_scrutin(scrutin_data: dict) -> tuple:
+    """
+    Runs both consumers on one parsed scrutin.
+
+    Args:
+        scrutin_data: A per-vote file ({'scrutin': ...}) or a bare scrutin
+
+    Returns:
+        A tuple (vote_id, vote_data, extracted) where vote_data is the output of
+        extract_vote.process_single_vote_json (None if the vote has no uid) and
+        extracted the voters found by extract_deputees.extract_vote_groups
+    """
+    scrutin = scrutin_data.get("scrutin", scrutin_data)
+    vote_data = process_single_vote_json(scrutin)
+    return scrutin.get("uid"), vote_data, extract_vote_groups(scrutin_data)
+
+
+def parse_vote_file(complete_path: str) -> tuple or None:
+    """
+    Parses one per-vote JSON file once and feeds it to both consumers.
+    Top-level so it can be sent to worker processes.
+
+    Args:
+        complete_path: The path to the JSON file
+
+    Returns:
+        A tuple (sort_uid, vote_id, vote_data, extracted), or None if the file could not be read
+    """
+    file_name = os.path.basename(complete_path)
+    print(f"--- Processing file: {file_name} ---")
+
+    try:
+        with open(complete_path, 'r', encoding='utf-8') as f:
+            json_data = json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError) as e:
+        print(f"Could not process file {complete_path}: {e}")
+        return None
+
+    vote_id, vote_data, extracted = consume_scrutin(json_data)
+    return vote_id or os.path.splitext(file_name)[0], vote_id, vote_data, extracted
+
+
+def map_cached(paths: list, func, workers: int = 1, manifest: FileManifest = None, section: str = None) -> list:
+    """
+    Applies func to every file, reusing the manifest results of unchanged files.
+
+    Args:
+        paths: Paths of the source files
+        func: Top-level function taking a path, with a JSON-serializable result
+        workers: Number of worker processes for the files to parse
+        manifest: Optional FileManifest, None parses every file
+        section: Manifest section of these files
+
+    Returns:
+        The results of func, in the order of paths
+    """
+    if manifest is None:
+        return map_files(paths, func, workers)
+
+    results = {}
+    to_parse = []
+    for path in paths:
+        found, result = manifest.lookup(section, path)
+        if found:
+            results[path] = result
+        else:
+            to_parse.append(path)
+
+    removed = manifest.prune(section, paths)
+    print(f"{section}: {len(to_parse)} new or changed, {len(paths) - len(to_parse)} unchanged, {removed} removed")
+
+    for path, result in zip(to_parse, map_files(to_parse, func, workers)):
+        manifest.update(section, path, result)
+        results[path] = result
+
+    return [results[path] for path in paths]
+
+
+def process_folder_format(folder: str, deputees: dict, workers: int = 1, manifest: FileManifest = None) -> dict:
+    """
+    Processes a folder of per-vote JSON files (legislatures 15, 16, 17) in a single pass.
+
+    Args:
+        folder: The path to the folder containing the JSON files
+        deputees: Dictionary of deputees, updated in place
+        workers: Number of worker processes parsing the files (1 = serial)
+        manifest: Optional FileManifest, only new or changed files are parsed
+
+    Returns:
+        Dictionary with vote_id as keys and vote data as values, sorted by vote_id
+    """
+    legislature_vote = {}
+
+    if not os.path.exists(folder):
+        print(f"Warning: Vote directory not found at {folder}")
+        return legislature_vote
+
+    vote_files = list_vote_files(folder)
+    results = map_cached(vote_files, parse_vote_file, workers, manifest, 'vote_files')
+
+    # Merge in vote order, exactly like the two separate scripts do
+    parsed = [result for result in results if result]
+    for _, vote_id, vote_data, extracted in sorted(parsed, key=lambda result: vote_sort_key(result[0])):
+        if vote_data:
+            legislature_vote[vote_id] = vote_data
+        apply_vote_groups(extracted, deputees)
+
+    print(f"\nProcessed {len(vote_files)} vote files from folder")
+    return legislature_vote
+
+
+def read_single_file(file_path: str, streaming: bool = False) -> list or None:
+    """
+    Parses the single JSON file containing all votes (legislature 14) and feeds every
+    scrutin to both consumers.
+
+    Args:
+        file_path: The path to the JSON file
+        streaming: If True, read the scrutins one at a time instead of loading the whole file
+
+    Returns:
+        A list of (vote_id, vote_data, extracted) tuples, or None if the file could not be read
+    """
+    print(f"--- Processing single file: {file_path} ({'streaming' if streaming else 'eager'} reader) ---")
+
+    try:
+        return [consume_scrutin(scrutin) for scrutin in iter_scrutins(file_path, streaming)]
+    except (json.JSONDecodeError, FileNotFoundError) as e:
+        print(f"Could not process file {file_path}: {e}")
+        return None
+
+
+def process_single_file_format(file_path: str, deputees: dict, streaming: bool = False,
+                               manifest: FileManifest = None) -> dict:
+    """
+    Processes the single JSON file containing all votes (legislature 14) in a single pass.
+
+    Args:
+        file_path: The path to the JSON file
+        deputees: Dictionary of deputees, updated in place
+        streaming: If True, read the scrutins one at a time instead of loading the whole file
+        manifest: Optional FileManifest, the file is only parsed if it changed
+
+    Returns:
+        Dictionary with vote_id as keys and vote data as values
+    """
+    legislature_vote = {}
+
+    if manifest is None:
+        # Apply each scrutin as soon as it is read so streaming keeps memory bounded
+        try:
+            for scrutin in iter_scrutins(file_path, streaming):
+                vote_id, vote_data, extracted = consume_scrutin(scrutin)
+                if vote_data:
+                    legislature_vote[vote_id] = vote_data
+                apply_vote_groups(extracted, deputees)
+        except (json.JSONDecodeError, FileNotFoundError) as e:
+            print(f"Could not process file {file_path}: {e}")
+            # Do not keep a partial legislature from a truncated or invalid dump
+            deputees.clear()
+            return {}
+        return legislature_vote
+
+    if not os.path.exists(file_path):
+        print(f"File not found: {file_path}")
+        return legislature_vote
+
+    results, = map_cached([file_path], partial(read_single_file, streaming=streaming), 1, manifest, 'single_file')
+    for vote_id, vote_data, extracted in results or []:
+        if vote_data:
+            legislature_vote[vote_id] = vote_data
+        apply_vote_groups(extracted, deputees)
+
+    return legislature_vote
+
+
+def deputees_digest(deputees: dict) -> str:
+    """SHA-256 of the deputee ids, which decide the speeches kept in the corpus."""
+    return hashlib.sha256('\n'.join(sorted(deputees)).encode('utf-8')).hexdigest()
+
+
+def reusable_corpus(corpus_store: str, manifest: FileManifest, deputees: dict) -> bool:
+    """
+    Checks that the corpus on disk is the one the manifest describes, written for the same deputees.
+
+    Args:
+        corpus_store: Folder of the speech corpus
+        manifest: The FileManifest of the previous run
+        deputees: Dictionary of deputees of this run
+
+    Returns:
+        True if the row ranges recorded for the compte_rendu files point into this corpus
+    """
+    recorded = manifest.get_value('speech_corpus')
+    meta_path = os.path.join(corpus_store, 'meta.json')
+    if not recorded or recorded['deputees'] != deputees_digest(deputees) or not os.path.exists(meta_path):
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return meta['n_speeches'] == recorded['n_speeches'] and meta['n_bytes'] == recorded['n_bytes']
+
+
+def process_compte_rendu_folder(deputees: dict, cr_path: str, corpus_store: str, workers: int = 1,
+                                manifest: FileManifest = None) -> int:
+    """
+    Writes the deputy speeches of the compte_rendu XML files to a speech corpus, in file name order.
+
+    With a manifest, each compte_rendu file records the rows [start, end) of its
+    speeches in the corpus, and only new or changed files are parsed. When they all
+    come after the unchanged files, their speeches are appended to the existing
+    corpus; otherwise the corpus is rewritten, copying the speeches of the unchanged
+    files from the previous one. A change of the deputees rebuilds the corpus.
+
+    Args:
+        deputees: Dictionary of deputees, speeches of other speakers are skipped
+        cr_path: The compte_rendu folder
+        corpus_store: Folder of the speech corpus
+        workers: Number of worker processes parsing the files
+        manifest: Optional FileManifest, only new or changed files are parsed
+
+    Returns:
+        The number of speeches in the corpus
+    """
+    if os.path.exists(cr_path):
+        cr_files = list_compte_rendu_files(cr_path)
+    else:
+        print(f"Skipping compte_rendu processing (path: {cr_path})")
+        cr_files = []
+
+    if manifest is None:
+        with SpeechCorpusWriter(corpus_store) as corpus:
+            skipped = 0
+            for cr_file_path, speeches in zip(cr_files, map_files(cr_files, parse_compte_rendu_file, workers)):
+                skipped += apply_compte_rendu_speeches(deputees, speeches, cr_file_path, corpus)
+        print(f"Processed {len(cr_files)} compte_rendu files ({skipped} speeches by non-deputees skipped)")
+        return corpus.n_speeches
+
+    # Row ranges of the unchanged files in the previous corpus
+    reused = {}
+    if reusable_corpus(corpus_store, manifest, deputees):
+        for path in cr_files:
+            found, result = manifest.lookup('cr_files', path)
+            if found:
+                reused[path] = result
+    to_parse = [path for path in cr_files if path not in reused]
+    removed = manifest.prune('cr_files', cr_files)
+    print(f"cr_files: {len(to_parse)} new or changed, {len(reused)} unchanged, {removed} removed")
+    parsed = dict(zip(to_parse, map_files(to_parse, parse_compte_rendu_file, workers)))
+
+    # New files can be appended if the unchanged ones fill the beginning of the corpus, in order
+    ranges = [reused[path]['rows'] for path in cr_files[:len(reused)] if path in reused]
+    append = (bool(reused) and len(ranges) == len(reused)
+              and all(previous[1] == current[0] for previous, current in zip([[0, 0]] + ranges, ranges))
+              and ranges[-1][1] == manifest.get_value('speech_corpus')['n_speeches'])
+    print(f"{'Appending to' if append else 'Rewriting'} the speech corpus {corpus_store}")
+
+    skipped = 0
+    with SpeechCorpusWriter(corpus_store, append=append) as corpus:
+        previous_corpus = load_speech_corpus(corpus_store) if reused and not append else None
+        for cr_file_path in cr_files:
+            start = corpus.n_speeches
+            if cr_file_path in parsed:
+                file_skipped = apply_compte_rendu_speeches(deputees, parsed[cr_file_path], cr_file_path, corpus)
+                rows = [start, corpus.n_speeches]
+            else:
+                file_skipped = reused[cr_file_path]['skipped']
+                rows = reused[cr_file_path]['rows']
+                if not append:
+                    # Copy the speeches of the unchanged file from the previous corpus
+                    actor_codes, seance_codes = previous_corpus.index['actor'], previous_corpus.index['seance']
+                    for i in range(*rows):
+                        corpus.append(previous_corpus.actors[actor_codes[i]], previous_corpus.seances[seance_codes[i]],
+                                      previous_corpus.speech(i))
+                    rows = [start, corpus.n_speeches]
+            skipped += file_skipped
+
+            result = {'rows': rows, 'skipped': file_skipped}
+            if cr_file_path in parsed:
+                manifest.update('cr_files', cr_file_path, result)
+            else:
+                manifest.set_result('cr_files', cr_file_path, result)
+        # Release the memory-mapped files of the previous corpus before it is replaced
+        del previous_corpus
+
+    manifest.set_value('speech_corpus', {'deputees': deputees_digest(deputees),
+                                         'n_speeches': corpus.n_speeches, 'n_bytes': corpus.n_bytes})
+    print(f"Processed {len(cr_files)} compte_rendu files ({skipped} speeches by non-deputees skipped)")
+    return corpus.n_speeches
+
+
+def build_legislature(config: dict, corpus_store: str, streaming: bool = False, workers: int = 1,
+                      manifest: FileManifest = None) -> tuple:
+    """
+    Computes the votes and the deputees of a legislature, parsing each scrutin once.
+
+    Args:
+        config: A LEGISLATURE_CONFIGS entry
+        corpus_store: Folder of the speech corpus, written when the legislature has comptes rendus
+        streaming: If True, use the streaming reader for single-file legislatures
+        workers: Number of worker processes for folder legislatures
+        manifest: Optional FileManifest. Unchanged source files then contribute
+                  their recorded results instead of being parsed again.
+
+    Returns:
+        A tuple (legislature_vote, deputees), deputees still holding the organ dates
+    """
+    vote_path = config['vote_path']
+    cr_path = config['cr_path']
+
+    deputees = {}
+
+    if config['is_single_file']:
+        legislature_vote = process_single_file_format(vote_path, deputees, streaming, manifest)
+    else:
+        legislature_vote = process_folder_format(vote_path, deputees, workers, manifest)
+
+    if cr_path:
+        print("\nProcessing compte_rendu files...")
+        n_speeches = process_compte_rendu_folder(deputees, cr_path, corpus_store, workers, manifest)
+        print(f"Saved {n_speeches} speeches to {corpus_store}")
+
+    return legislature_vote, deputees
+
+
+def verify_incremental(config: dict, legislature_vote: dict, deputees: dict, streaming: bool = False,
+                       workers: int = 1) -> bool:
+    """
+    Checks an incremental result against a full rebuild of the legislature.
+
+    Args:
+        config: A LEGISLATURE_CONFIGS entry
+        legislature_vote: Votes computed incrementally
+        deputees: Deputees computed incrementally (organ dates already stripped)
+        streaming: Reader used for the rebuild of single-file legislatures
+        workers: Number of worker processes for the rebuild
+
+    Returns:
+        True if both results serialize to the same files
+    """
+    print("\nVerifying against a full rebuild...")
+    corpus_store = corpus_path(config['deputees_output'])
+    full_vote, full_deputees = build_legislature(config, corpus_store + '.verify', streaming, workers)
+    strip_organ_dates(full_deputees)
+
+    same_votes = json.dumps(full_vote, indent=4) == json.dumps(legislature_vote, indent=4)
+    same_deputees = (json.dumps(full_deputees, indent=1, ensure_ascii=False)
+                     == json.dumps(deputees, indent=1, ensure_ascii=False))
+    same_speeches = True
+    if config['cr_path']:
+        _, mismatch, errors = filecmp.cmpfiles(corpus_store, corpus_store + '.verify', CORPUS_FILES, shallow=False)
+        same_speeches = not mismatch and not errors
+        shutil.rmtree(corpus_store + '.verify')
+
+    if same_votes and same_deputees and same_speeches:
+        print("✅ Incremental outputs are identical to a full rebuild")
+    else:
+        print(f"❌ Incremental outputs differ from a full rebuild (votes identical: {same_votes}, "
+              f"deputees identical: {same_deputees}, speeches identical: {same_speeches})")
+    return same_votes and same_deputees and same_speeches
+
+
+def process_legislature(config: dict, streaming: bool = False, workers: int = 1,
+                        incremental: bool = False, verify: bool = False, output_format: str = 'json') -> None:
+    """
+    Writes vote_XX.json, deputees_XX.json and the speech corpus of a legislature, parsing each scrutin once.
+
+    Args:
+        config: A LEGISLATURE_CONFIGS entry
+        streaming: If True, use the streaming reader for single-file legislatures
+        workers: Number of worker processes for folder legislatures
+        incremental: If True, only parse the vote/compte_rendu files that are new or
+                     changed since the last incremental run (see config['manifest'])
+        verify: With incremental, also check the result against a full rebuild
+        output_format: Format of the votes, 'json', 'columnar' or 'both'
+    """
+    vote_path = config['vote_path']
+
+    print(f"\n{'='*60}")
+    print(f"Processing: {vote_path}{' (incremental)' if incremental else ''}")
+    print(f"Output: {config['vote_output']}, {config['deputees_output']}")
+    print(f"{'='*60}\n")
+
+    manifest = FileManifest(config['manifest']) if incremental else None
+
+    legislature_vote, deputees = build_legislature(config, corpus_path(config['deputees_output']), streaming,
+                                                   workers, manifest)
+
+    save_legislature_votes(legislature_vote, config['vote_output'], vote_path, output_format)
+    save_deputees(deputees, config['deputees_output'], vote_path)
+
+    if manifest is not None:
+        manifest.save()
+        if verify:
+            verify_incremental(config, legislature_vote, deputees, streaming, workers)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract the votes and the deputees of each legislature in one pass.")
+    parser.add_argument('--streaming', action='store_true',
+                        help="read single-file dumps (legislature 14) one scrutin at a time")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes parsing per-vote and compte_rendu files (default: 1, serial)")
+    parser.add_argument('--actor-cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"persist the actor/organe index to a SQLite file (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--format', choices=['json', 'columnar', 'both'], default='json',
+                        help="vote_XX.json, a memory-mappable columnar store, or both (default: json)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only parse vote/compte_rendu files that changed since the last incremental run")
+    parser.add_argument('--verify', action='store_true',
+                        help="with --incremental, check the outputs against a full rebuild")
+    parser.add_argument('--legislatures', nargs='+', default=list(LEGISLATURE_CONFIGS), metavar='NUM',
+                        help="legislatures to process (default: all)")
+    args = parser.parse_args()
+    extract_deputees.actor_index_cache = args.actor_cache
+
+    for legislature_num in args.legislatures:
+        print(f"\n\n{'#'*60}")
+        print(f"# LEGISLATURE {legislature_num}")
+        print(f"{'#'*60}")
+
+        try:
+            process_legislature(LEGISLATURE_CONFIGS[legislature_num], streaming=args.streaming, workers=args.workers,
+                                incremental=args.incremental, verify=args.verify,
+                                output_format=args.format)
+        except Exception as e:
+            print(f"❌ Error processing legislature {legislature_num}: {e}")
+            import traceback
+            traceback.print_exc()
+
+    print(f"\n\n{'='*60}")
+    print("ALL LEGISLATURES PROCESSED")
+    print(f"{'='*60}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,138 +1,423 @@
+import os
 import json
+import argparse
+import tempfile
+import threading
 import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from requests.adapters import HTTPAdapter
 import time
 from typing import Set
 
-def collect_seance_refs(vote_folder: str) -> Set[str]:
+import instrumentation
+from manifest import FileManifest
+
+BASE_URL = "https://www.assemblee-nationale.fr/dyn/opendata"
+
+# HTTP statuses worth retrying (rate limited or server side errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Caches of download_all_compte_rendus, stored in the output folder
+CACHE_FILE = ".download_cache.json"
+SEANCE_INDEX_FILE = ".seance_index.json"
+CACHE_SAVE_EVERY = 50
+
+# Seances without compte rendu (404 or no compteRenduRef) are retried after a day
+NEGATIVE_TTL = 24 * 3600
+# Comptes rendus may be revised during the month after their publication,
+# recent ones are revalidated at most once a day
+REVISION_WINDOW = 30 * 24 * 3600
+RECHECK_INTERVAL = 24 * 3600
+
+# Returned by get_compte_rendu_ref when the seance could not be fetched (retries
+# exhausted, connection error...), as opposed to None for a seance without CR
+UNRESOLVED = object()
+
+
+def read_seance_ref(vote_file: Path) -> str:
+    """
+    Read the seanceRef of one vote file.
+    
+    Args:
+        vote_file: Path to a VTANR5K...json file
+        
+    Returns:
+        The seanceRef value, or None if missing or unreadable
+    """
+    try:
+        data = json.loads(vote_file.read_text(encoding="utf-8"))
+        scrutin = data.get("scrutin", {})
+        return scrutin.get("seanceRef")
+    except Exception as e:
+        print(f"Error processing {vote_file.name}: {e}")
+        instrumentation.skip('unreadable_vote_file')
+        return None
+
+
+def collect_seance_refs(vote_folder: str, index_path: str = None) -> Set[str]:
     """
     Collect all unique seanceRef values from vote files.
     
     Args:
         vote_folder: Path to the vote folder
+        index_path: Optional seance index (a FileManifest). Vote files whose size
+                    and mtime are unchanged since the last run are not parsed again.
         
     Returns:
         Set of unique seanceRef values (excluding None/null)
     """
     print(f"Collecting seanceRef from vote files in {vote_folder}...")
-    vote_folder_path = Path(vote_folder)
+    vote_files = sorted(Path(vote_folder).glob("*.json"))
+    index = FileManifest(index_path) if index_path else None
     seance_refs = set()
+    parsed = 0
     
-    for vote_file in vote_folder_path.glob("*.json"):
-        try:
-            data = json.loads(vote_file.read_text(encoding="utf-8"))
-            scrutin = data.get("scrutin", {})
-            seance_ref = scrutin.get("seanceRef")
+    for vote_file in vote_files:
+        found, seance_ref = index.lookup("seance_refs", vote_file) if index else (False, None)
+        if not found:
+            seance_ref = read_seance_ref(vote_file)
+            parsed += 1
+            if index:
+                index.update("seance_refs", vote_file, seance_ref)
+        else:
+            instrumentation.count('seance_index_hits')
 
-            if seance_ref:  # Only add non-null values
-                seance_refs.add(seance_ref)
-                
-        except Exception as e:
-            print(f"Error processing {vote_file.name}: {e}")
-            continue
+        if seance_ref:  # Only add non-null values
+            seance_refs.add(seance_ref)
     
-    print(f"Found {len(seance_refs)} unique Seance references")
+    if index:
+        index.prune("seance_refs", vote_files)
+        index.save()
+    
+    print(f"Found {len(seance_refs)} unique Seance references ({parsed} vote files parsed)")
+    instrumentation.count('files_parsed', parsed)
     return seance_refs
 
 
-def get_compte_rendu_ref(seance_id: str) -> str:
+class HttpClient:
+    """
+    Pooled HTTP client shared by the download threads.
+
+    Keeps connections alive through a requests.Session, spaces requests by at
+    least `delay` seconds across all threads, and retries connection errors,
+    429 and 5xx responses with exponential backoff.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, workers: int = 8, delay: float = 0.0,
+                 retries: int = 4, backoff: float = 1.0, timeout: float = 30):
+        self.base_url = base_url.rstrip('/')
+        self.delay = delay
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def _wait_turn(self) -> None:
+        """Blocks until this thread may send its request according to the rate limit."""
+        if self.delay <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.delay
+        if slot > now:
+            time.sleep(slot - now)
+
+    def get(self, resource: str, headers: dict = None) -> requests.Response:
+        """
+        GET {base_url}/{resource}, retrying transient failures.
+
+        Args:
+            resource: Resource name, e.g. 'CRSANR5L17S2024O1N001.xml'
+            headers: Optional request headers (e.g. If-None-Match)
+
+        Returns:
+            The successful response (possibly 304 Not Modified for conditional requests)
+
+        Raises:
+            requests.RequestException: if the request still fails after all retries,
+            or immediately for non-transient HTTP errors (e.g. 404)
+        """
+        url = f"{self.base_url}/{resource}"
+        for attempt in range(self.retries + 1):
+            self._wait_turn()
+            if attempt:
+                instrumentation.count('http_retries')
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, headers=headers, timeout=self.timeout)
+                instrumentation.observe('http_latency_seconds', time.perf_counter() - start)
+                instrumentation.count(f"http_status_{response.status_code}")
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} for url: {url}", response=response)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                instrumentation.count('http_connection_errors')
+                error = e
+
+            if attempt < self.retries:
+                time.sleep(self.backoff * 2 ** attempt)
+        raise error
+
+
+def atomic_write(path: Path, content: bytes) -> None:
+    """
+    Writes a file through a temporary file renamed into place, so an interrupted
+    download never leaves a truncated file behind.
+
+    Args:
+        path: Destination file
+        content: Bytes to write
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_name, path)
+    except BaseException:
+        if os.path.exists(tmp_name):
+            os.remove(tmp_name)
+        raise
+
+
+def get_compte_rendu_ref(seance_id: str, client: HttpClient = None) -> str:
     """
     Download seance data and extract compteRenduRef.
     
     Args:
         seance_id: The Seance ID
+        client: HttpClient to use (a default one is created if None)
         
     Returns:
-        The compteRenduRef value, or None if not found
+        The compteRenduRef value, None if the seance does not exist (404) or has no
+        compteRenduRef, or UNRESOLVED if the request failed for any other reason
     """
-    url = f"https://www.assemblee-nationale.fr/dyn/opendata/{seance_id}.json"
+    client = client or HttpClient()
     
     try:
-        response = requests.get(url, timeout=30)
-        response.raise_for_status()
+        response = client.get(f"{seance_id}.json")
         data = response.json()
         
         compte_rendu_ref = data.get("compteRenduRef")
         
         return compte_rendu_ref
         
+    except requests.HTTPError as e:
+        if e.response is not None and e.response.status_code == 404:
+            print(f"  ✗ Seance {seance_id} not found")
+            instrumentation.skip('unresolved_seance')
+            return None
+        print(f"  ✗ Error getting compteRenduRef for {seance_id}: {e}")
+        instrumentation.skip('seance_request_failed')
+        return UNRESOLVED
     except Exception as e:
         print(f"  ✗ Error getting compteRenduRef for {seance_id}: {e}")
-        return None
+        instrumentation.skip('seance_request_failed')
+        return UNRESOLVED
 
 
-def download_compte_rendu(cr_id: str, output_folder: Path) -> bool:
+class DownloadCache:
     """
-    Download a Compte Rendu in both XML formats.
+    Persistent state of the Compte Rendu downloads, stored as JSON in the output folder.
+
+    - seances: seance id -> compteRenduRef. Positive resolutions never expire
+      (the mapping of a past sitting does not change); seances answered with a
+      404 or without compteRenduRef are retried once they are older than
+      negative_ttl seconds. Failed requests are never recorded.
+    - crs: cr id -> ETag / Last-Modified and fetch times of the downloaded XML,
+      used to revalidate recent files with conditional requests.
+
+    Entries are updated from several download threads, hence the lock.
+    """
+
+    def __init__(self, path: Path, negative_ttl: float = NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.seances = {}
+        self.crs = {}
+        self._lock = threading.Lock()
+
+        if path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+                self.seances = data.get("seances", {})
+                self.crs = data.get("crs", {})
+            except json.JSONDecodeError as e:
+                print(f"Ignoring unreadable download cache {path}: {e}")
+
+    def needs_resolution(self, seance_id: str, now: float) -> bool:
+        """True if the seance was never resolved, or if its negative result expired."""
+        entry = self.seances.get(seance_id)
+        if entry is None:
+            return True
+        if entry["cr_ref"]:
+            return False
+        return now - entry["resolved_at"] > self.negative_ttl
+
+    def record_resolution(self, seance_id: str, cr_ref: str, now: float) -> None:
+        with self._lock:
+            self.seances[seance_id] = {"cr_ref": cr_ref, "resolved_at": now}
+
+    def cr_ref(self, seance_id: str) -> str:
+        entry = self.seances.get(seance_id)
+        return entry["cr_ref"] if entry else None
+
+    def needs_revalidation(self, cr_id: str, now: float, revision_window: float, recheck_interval: float) -> bool:
+        """
+        True if a downloaded CR is recent enough to still be revised (first fetched
+        less than revision_window seconds ago) and was not checked in the last
+        recheck_interval seconds.
+        """
+        entry = self.crs.get(cr_id)
+        if entry is None:
+            return False
+        return (now - entry["fetched_at"] < revision_window
+                and now - entry["checked_at"] >= recheck_interval)
+
+    def record_download(self, cr_id: str, response: requests.Response, now: float) -> None:
+        with self._lock:
+            entry = self.crs.setdefault(cr_id, {"fetched_at": now})
+            entry["checked_at"] = now
+            if response.status_code != 304:
+                entry["etag"] = response.headers.get("ETag")
+                entry["last_modified"] = response.headers.get("Last-Modified")
+
+    def conditional_headers(self, cr_id: str) -> dict:
+        entry = self.crs.get(cr_id, {})
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def save(self) -> None:
+        """Writes the cache atomically."""
+        with self._lock:
+            content = json.dumps({"seances": self.seances, "crs": self.crs}, indent=1, sort_keys=True)
+        atomic_write(self.path, content.encode("utf-8"))
+
+
+def download_compte_rendu(cr_id: str, output_folder: Path, client: HttpClient = None, cache: DownloadCache = None,
+                          revalidate: bool = False) -> bool:
+    """
+    Download a Compte Rendu in XML format.
     
     Args:
         cr_id: The Compte Rendu ID
         output_folder: Folder to save the downloaded files
+        client: HttpClient to use (a default one is created if None)
+        cache: Optional DownloadCache recording the ETag / Last-Modified of the file
+        revalidate: If True and the file exists, re-fetch it with a conditional request
         
     Returns:
         True if successful, False otherwise
     """
     xml_file = output_folder / f"{cr_id}.xml"
     
-    # Skip if file already exist
-    if xml_file.exists():
+    # Skip if file already exist (files are written atomically, so they are complete)
+    if xml_file.exists() and not revalidate:
         print(f"  ✓ {cr_id} already exists (XML), skipping")
+        instrumentation.count('cr_already_downloaded')
         return True
     
-    success = True
-    
-    # Download XML
-    if not xml_file.exists():
-        try:
-            xml_url = f"https://www.assemblee-nationale.fr/dyn/opendata/{cr_id}.xml"
-            response = requests.get(xml_url, timeout=30)
-            response.raise_for_status()
-            
-            with open(xml_file, "w", encoding="utf-8") as f:
-                f.write(response.text)
-            
-            print(f"  ✓ Downloaded {cr_id}.xml")
-            
-        except Exception as e:
-            print(f"  ✗ {cr_id}.xml error: {e}")
-            success = False
+    client = client or HttpClient()
+    existed = xml_file.exists()
+    headers = cache.conditional_headers(cr_id) if cache and existed else None
     
-    return success
+    try:
+        response = client.get(f"{cr_id}.xml", headers=headers)
+        if response.status_code == 304:
+            print(f"  ✓ {cr_id}.xml not modified")
+            instrumentation.count('cr_not_modified')
+        else:
+            atomic_write(xml_file, response.content)
+            print(f"  ✓ {'Updated' if existed else 'Downloaded'} {cr_id}.xml")
+            instrumentation.count('cr_updated' if existed else 'cr_downloaded')
+        if cache:
+            cache.record_download(cr_id, response, time.time())
+        return True
+        
+    except Exception as e:
+        print(f"  ✗ {cr_id}.xml error: {e}")
+        instrumentation.skip('download_failed')
+        return False
 
 
-def download_all_compte_rendus(vote_folder: str, output_folder: str, delay: float = 0.5):
+def download_all_compte_rendus(vote_folder: str, output_folder: str, delay: float = 0.5, workers: int = 8,
+                               retries: int = 4, backoff: float = 1.0, base_url: str = BASE_URL,
+                               negative_ttl: float = NEGATIVE_TTL, revision_window: float = REVISION_WINDOW,
+                               recheck_interval: float = RECHECK_INTERVAL):
     """
     Download all Compte Rendu files from vote folder seanceRef values.
     
+    Seances are resolved and files downloaded by a pool of threads sharing one
+    HttpClient. Resolutions, the seance index of the vote folder and the ETag /
+    Last-Modified of the downloaded files are cached in the output folder, so a
+    re-run where nothing changed makes no network call, and an interrupted run
+    resumes where it stopped.
+    
     Args:
         vote_folder: Path to the vote folder
         output_folder: Path to save downloaded Compte Rendu files
-        delay: Delay between requests in seconds
+        delay: Minimum delay between two requests in seconds, across all workers (rate limit)
+        workers: Maximum number of concurrent requests
+        retries: Number of retries of a failed request
+        backoff: Initial backoff between retries in seconds (doubled after each retry)
+        base_url: Base URL of the open data endpoint
+        negative_ttl: Seconds before a seance that could not be resolved is tried again
+        revision_window: Seconds after its first download during which a CR may still be revised
+        recheck_interval: Minimum seconds between two conditional requests for the same CR
     """
     output_path = Path(output_folder)
     output_path.mkdir(parents=True, exist_ok=True)
     
     # Collect all seance references
-    seance_refs = collect_seance_refs(vote_folder)
+    with instrumentation.stage('collect_seances'):
+        seance_refs = collect_seance_refs(vote_folder, index_path=str(output_path / SEANCE_INDEX_FILE))
     
     if not seance_refs:
         print("No Seance references found!")
         return
     
+    client = HttpClient(base_url, workers=workers, delay=delay, retries=retries, backoff=backoff)
+    cache = DownloadCache(output_path / CACHE_FILE, negative_ttl)
+    now = time.time()
+    
     # Get compte rendu references from seance data
-    print(f"\nFetching Compte Rendu references from {len(seance_refs)} seances...")
-    cr_refs = set()
+    to_resolve = [seance_id for seance_id in sorted(seance_refs) if cache.needs_resolution(seance_id, now)]
+    print(f"\nFetching Compte Rendu references from {len(to_resolve)} seances "
+          f"({len(seance_refs) - len(to_resolve)} cached)...")
     
-    for i, seance_id in enumerate(sorted(seance_refs), 1):
-        print(f"[{i}/{len(seance_refs)}] {seance_id}")
-        cr_ref = get_compte_rendu_ref(seance_id)
-        
-        if cr_ref and cr_ref.startswith("CRSAN"):
-            cr_refs.add(cr_ref)
-            print(f"  → {cr_ref}")
-        
-        if i < len(seance_refs):
-            time.sleep(delay)
+    with instrumentation.stage('resolve_seances', workers=workers):
+        instrumentation.count('resolution_cache_hits', len(seance_refs) - len(to_resolve))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(get_compte_rendu_ref, seance_id, client): seance_id
+                       for seance_id in to_resolve}
+            for i, future in enumerate(as_completed(futures), 1):
+                seance_id = futures[future]
+                cr_ref = future.result()
+                if cr_ref is UNRESOLVED:
+                    # Not cached, so the seance is tried again on the next run
+                    print(f"[{i}/{len(to_resolve)}] {seance_id}  (failed, will retry)")
+                else:
+                    print(f"[{i}/{len(to_resolve)}] {seance_id}" + (f"  → {cr_ref}" if cr_ref else ""))
+                    cache.record_resolution(seance_id, cr_ref, time.time())
+                if i % CACHE_SAVE_EVERY == 0:
+                    cache.save()
+        cache.save()
+    
+    cr_refs = {cache.cr_ref(seance_id) for seance_id in seance_refs}
+    cr_refs = {cr_ref for cr_ref in cr_refs if cr_ref and cr_ref.startswith("CRSAN")}
     
     print(f"\nFound {len(cr_refs)} unique Compte Rendu references")
     
@@ -140,31 +425,48 @@ def download_all_compte_rendus(vote_folder: str, output_folder: str, delay: floa
         print("No Compte Rendu references found!")
         return
     
-    # Download each Compte Rendu
-    print(f"\nDownloading {len(cr_refs)} Compte Rendu files...")
+    # Download missing Compte Rendus, and revalidate the recent ones that may have been revised
+    missing = sorted(cr_id for cr_id in cr_refs if not (output_path / f"{cr_id}.xml").exists())
+    revisable = sorted(cr_id for cr_id in cr_refs if cr_id not in missing
+                       and cache.needs_revalidation(cr_id, now, revision_window, recheck_interval))
+    
+    print(f"\nDownloading {len(missing)} Compte Rendu files, revalidating {len(revisable)} "
+          f"({len(cr_refs) - len(missing) - len(revisable)} up to date)...")
     print(f"Output folder: {output_path.absolute()}\n")
     
     successful = 0
     failed = 0
     
-    for i, cr_id in enumerate(sorted(cr_refs), 1):
-        print(f"[{i}/{len(cr_refs)}] {cr_id}")
-        
-        if download_compte_rendu(cr_id, output_path):
-            successful += 1
-        else:
-            failed += 1
-        
-        if i < len(cr_refs):
-            time.sleep(delay)
+    with instrumentation.stage('download_comptes_rendus', workers=workers):
+        instrumentation.count('cr_up_to_date', len(cr_refs) - len(missing) - len(revisable))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(download_compte_rendu, cr_id, output_path, client, cache, cr_id in revisable)
+                       for cr_id in missing + revisable]
+            for future in as_completed(futures):
+                if future.result():
+                    successful += 1
+                else:
+                    failed += 1
+        cache.save()
     
     print(f"\n=== Download Complete ===")
     print(f"Successful: {successful}")
     print(f"Failed: {failed}")
+    print(f"Up to date: {len(cr_refs) - len(missing) - len(revisable)}")
     print(f"Total: {len(cr_refs)}")
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Download the comptes rendus of the seances referenced by the votes.")
+    parser.add_argument('--workers', type=int, default=8, help="maximum number of concurrent requests (default: 8)")
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help="minimum delay between two requests in seconds, across workers (default: 0)")
+    parser.add_argument('--retries', type=int, default=4, help="retries of a failed request (default: 4)")
+    parser.add_argument('--base-url', default=BASE_URL, help=f"open data endpoint (default: {BASE_URL})")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure_from_args(args)
+
     vote_folder_15 = "data/vote/15"
     compte_rendu_folder_15 = "data/cr/15"
 
@@ -174,6 +476,9 @@ if __name__ == '__main__':
     vote_folder_17 = "data/vote/17"
     compte_rendu_folder_17 = "data/cr/17"
 
-    download_all_compte_rendus(vote_folder_15, compte_rendu_folder_15, delay=0)
-    download_all_compte_rendus(vote_folder_16, compte_rendu_folder_16, delay=0)
-    download_all_compte_rendus(vote_folder_17, compte_rendu_folder_17, delay=0)
+    options = dict(delay=args.delay, workers=args.workers, retries=args.retries, base_url=args.base_url)
+    for vote_folder, compte_rendu_folder in ((vote_folder_15, compte_rendu_folder_15),
+                                             (vote_folder_16, compte_rendu_folder_16),
+                                             (vote_folder_17, compte_rendu_folder_17)):
+        with instrumentation.stage('extract_cr', vote_folder=vote_folder):
+            download_all_compte_rendus(vote_folder, compte_rendu_folder, **options)
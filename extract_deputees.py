@@ -1,61 +1,43 @@
 import os,json
+import argparse
 import xml.etree.ElementTree as ET
 from datetime import datetime
 
-# Legislature configurations
-LEGISLATURE_CONFIGS = {
-    '14': {
-        'vote_path': 'data/vote/14/Scrutins_XIV.json',
-        'cr_path': None,  # No compte rendu for 14
-        'output': 'data/processed/deputees_14.json',
-        'is_single_file': True
-    },
-    '15': {
-        'vote_path': 'data/vote/15',
-        'cr_path': 'data/cr/15',
-        'output': 'data/processed/deputees_15.json',
-        'is_single_file': False
-    },
-    '16': {
-        'vote_path': 'data/vote/16',
-        'cr_path': 'data/cr/16',
-        'output': 'data/processed/deputees_16.json',
-        'is_single_file': False
-    },
-    '17': {
-        'vote_path': 'data/vote/17',
-        'cr_path': 'data/cr/',
-        'output': 'data/processed/deputees_17.json',
-        'is_single_file': False
-    }
-}
+import instrumentation
+from actor_index import ACTORS_ROOT, DEFAULT_CACHE_PATH, load_actor_index
+from legislatures import LEGISLATURE_CONFIGS
+from scrutin_reader import iter_scrutins, list_vote_files, map_files, vote_sort_key
+from speech_corpus import SpeechCorpusWriter, corpus_path
+
+# SQLite file persisting the actor/organe index between runs (None = scan the folders every run)
+actor_index_cache = None
+
+def get_actor_index():
+    """Actor/organe index of data/all_actors, built once per run."""
+    return load_actor_index(ACTORS_ROOT, actor_index_cache)
 
 def create_deputee_base(id):
-    path_file = 'data/all_actors/acteur/' + id +'.json'
-    with open(path_file,'r') as f :
-        data = json.load(f)
-    name = data['acteur']['etatCivil']['ident']['nom'] + ' ' + data['acteur']['etatCivil']['ident']['prenom']
+    """Return a new deputee record, or None if the actor is not in data/all_actors."""
+    name = get_actor_index().actor_name(id)
+    if name is None:
+        return None
     return {
         'name' : name,
         'chair_numbers': [],
-        'organ' : {},
-        'speeches': []
+        'organ' : {}
     }
 
 def get_organ_name(id) :
-    path_file = 'data/all_actors/organe/' + id + '.json'
-    if os.path.exists(path_file):
-        with open(path_file,'r') as f :
-            data = json.load(f)
-        return {
-            'id': id,
-            'name' : data['organe']['libelle'],
-            'name_from' : data['organe']['libelleEdition'],
-            'name_short' : data['organe']['libelleAbrege'],
-            'color': data['organe']['couleurAssociee'] if data['organe']['couleurAssociee'] else '#cccccc'
-        }
-    else :
+    organe = get_actor_index().organe(id)
+    if organe is None:
         return {}
+    return {
+        'id': id,
+        'name' : organe.libelle,
+        'name_from' : organe.libelle_edition,
+        'name_short' : organe.libelle_abrege,
+        'color': organe.couleur if organe.couleur else '#cccccc'
+    }
 
 
 from datetime import datetime
@@ -73,76 +55,131 @@ def compare_date(date1_str, date2_str):
   
 
 
-def process_compte_rendu_files(deputees, cr_path):
-    """Process all compte_rendu XML files to track deputy speeches."""
-    
-    if not cr_path or not os.path.exists(cr_path):
-        print(f"Skipping compte_rendu processing (path: {cr_path})")
-        return
+def list_compte_rendu_files(cr_path):
+    """List the compte_rendu XML files of a folder, sorted by name."""
+    return [os.path.join(cr_path, cr_filename) for cr_filename in sorted(os.listdir(cr_path)) if cr_filename.endswith('.xml')]
+
+def local_name(tag):
+    """Tag of an element without its namespace."""
+    return tag.rsplit('}', 1)[-1]
+
+def iter_compte_rendu_speeches(cr_file_path):
+    """
+    Yield the (acteur_id, text) speeches of a compte_rendu XML file, in document order.
+
+    The file is read with iterparse: each paragraphe is handled when its end tag
+    is reached, then cleared and detached from its parent together with every
+    other finished element, so memory does not grow with the size of the sitting.
+    """
+    path = []            # Elements being parsed, from the root
+    in_paragraphe = 0    # Number of paragraphe elements in path
     
-    file_count = 0
-    for cr_filename in os.listdir(cr_path):
-        if not cr_filename.endswith('.xml'):
+    for event, elem in ET.iterparse(cr_file_path, events=('start', 'end')):
+        if event == 'start':
+            path.append(elem)
+            if local_name(elem.tag) == 'paragraphe':
+                in_paragraphe += 1
             continue
-            
-        file_count += 1
-        print(f"Processing compte_rendu: {cr_filename}", end='\r')
         
-        cr_file_path = os.path.join(cr_path, cr_filename)
-        try:
-            tree = ET.parse(cr_file_path)
-            root = tree.getroot()
-            
-            # Define namespace if present
-            ns = {'ns': 'http://schemas.assemblee-nationale.fr/referentiel'} if root.tag.startswith('{') else {}
+        path.pop()
+        if local_name(elem.tag) == 'paragraphe':
+            in_paragraphe -= 1
+            # Get the actor ID from the paragraph's id_acteur attribute
+            acteur_id = elem.get('id_acteur')
             
-            # Find all paragraphs
-            paragraphes = root.findall('.//{*}paragraphe') if ns else root.findall('.//paragraphe')
-            
-            for paragraphe in paragraphes:
-                # Get the actor ID from the paragraph's id_acteur attribute
-                acteur_id = paragraphe.get('id_acteur')
+            if acteur_id and acteur_id.startswith('PA'):
                 
-                if acteur_id and acteur_id.startswith('PA'):
-                    
-                    # Extract text from texte element
-                    texte_elem = paragraphe.find('{*}texte') if ns else paragraphe.find('texte')
-                    if texte_elem is not None and texte_elem.text:
-                        text = texte_elem.text.strip()
-                        if text:  # Only add non-empty speeches
-                            deputees[acteur_id]['speeches'].append(text)
+                # Extract text from texte element
+                texte_elem = next((child for child in elem if local_name(child.tag) == 'texte'), None)
+                if texte_elem is not None and texte_elem.text:
+                    text = texte_elem.text.strip()
+                    if text:  # Only add non-empty speeches
+                        yield acteur_id, text
         
-        except (ET.ParseError, KeyError, FileNotFoundError) as e:
-            print(f"\nCould not process file {cr_file_path}: {e}")
+        # Children of a paragraphe are kept until the paragraphe itself is done
+        if not in_paragraphe and path:
+            elem.clear()
+            path[-1].remove(elem)
+
+def parse_compte_rendu_file(cr_file_path):
+    """Extract the (acteur_id, text) speeches of a compte_rendu XML file, in document order."""
+    try:
+        return list(iter_compte_rendu_speeches(cr_file_path))
+    except (ET.ParseError, FileNotFoundError) as e:
+        # A malformed file contributes no speech at all
+        print(f"\nCould not process file {cr_file_path}: {e}")
+        instrumentation.skip('invalid_xml')
+        return []
+
+def apply_compte_rendu_speeches(deputees, speeches, cr_file_path, corpus):
+    """
+    Append the speeches of one compte_rendu file to the speech corpus.
+
+    Speakers who are not deputees of the legislature (they never voted, e.g.
+    ministers) are skipped without losing the rest of the file.
+
+    Returns:
+        The number of skipped speeches
+    """
+    seance_id = os.path.splitext(os.path.basename(cr_file_path))[0]
+    skipped = 0
+    for acteur_id, text in speeches:
+        if acteur_id in deputees:
+            corpus.append(acteur_id, seance_id, text)
+        else:
+            skipped += 1
+    instrumentation.count('speeches', len(speeches) - skipped)
+    instrumentation.skip('speech_by_non_deputee', skipped)
+    return skipped
+
+def process_compte_rendu_files(deputees, cr_path, corpus, workers=1):
+    """Process all compte_rendu XML files, writing the deputy speeches to a SpeechCorpusWriter."""
+    
+    if not cr_path or not os.path.exists(cr_path):
+        print(f"Skipping compte_rendu processing (path: {cr_path})")
+        return
     
-    print(f"\nProcessed {file_count} compte_rendu files")
+    cr_files = list_compte_rendu_files(cr_path)
+    results = map_files(cr_files, parse_compte_rendu_file, workers)
+    instrumentation.count('files_parsed', len(cr_files))
+    skipped = 0
+    for cr_file_path, speeches in zip(cr_files, results):
+        print(f"Processing compte_rendu: {os.path.basename(cr_file_path)}", end='\r')
+        skipped += apply_compte_rendu_speeches(deputees, speeches, cr_file_path, corpus)
+    
+    print(f"\nProcessed {len(cr_files)} compte_rendu files ({skipped} speeches by non-deputees skipped)")
 
-def process_single_vote_file(vote_data, deputees):
-    """Process a single vote data structure (for both formats)."""
+def extract_vote_groups(vote_data):
+    """Extract the voters of a single vote data structure (for both formats).
+
+    Only reads the vote itself (no actor/organe lookups) so it can run in a worker process.
+    Returns a dict {'date': ..., 'groups': [(organ_id, [(acteur_ref, chair_number), ...]), ...]}.
+    """
+    extracted = {'date': '1900-01-01', 'groups': []}
     try:
         # Check if this is a scrutin wrapper or direct scrutin
         scrutin = vote_data.get('scrutin', vote_data)
         
         if 'ventilationVotes' not in scrutin:
-            return
+            return extracted
         
         ventilation = scrutin['ventilationVotes']
         if not isinstance(ventilation, dict):
-            return
+            return extracted
             
         organe = ventilation.get('organe', {})
         if not isinstance(organe, dict):
-            return
+            return extracted
             
         groupes = organe.get('groupes', {})
         if not isinstance(groupes, dict):
-            return
+            return extracted
             
         organs_list = groupes.get('groupe', [])
         if isinstance(organs_list, dict):
             organs_list = [organs_list]
         
-        date = scrutin.get('dateScrutin', '1900-01-01')
+        extracted['date'] = scrutin.get('dateScrutin', '1900-01-01')
 
         for organ in organs_list:
             if not isinstance(organ, dict):
@@ -152,10 +189,6 @@ def process_single_vote_file(vote_data, deputees):
             if not organ_id:
                 continue
                 
-            organ_data = get_organ_name(organ_id)
-            if not organ_data:
-                continue
-                
             vote_data_nested = organ.get('vote', {})
             if not isinstance(vote_data_nested, dict):
                 continue
@@ -164,6 +197,9 @@ def process_single_vote_file(vote_data, deputees):
             if not isinstance(votes_by_position, dict):
                 continue
             
+            votants_refs = []
+            extracted['groups'].append((organ_id, votants_refs))
+
             # Iterate through vote positions
             for position in votes_by_position.values():
                 if not isinstance(position, dict):
@@ -186,84 +222,141 @@ def process_single_vote_file(vote_data, deputees):
                         if not acteur_ref:
                             continue
                         
-                        # Get the deputy from our main dict, or create a new one
-                        deputee = deputees.get(acteur_ref)
-                        if not deputee:
-                            try:
-                                deputee = create_deputee_base(acteur_ref)
-                            except:
-                                continue
-                        
-                        if chair_number and chair_number not in deputee['chair_numbers']:
-                            deputee['chair_numbers'].append(chair_number)
-                        
-                        if organ_id != deputee['organ'].get('id', False) and compare_date(date, deputee['organ'].get('date', '1900-01-01')):
-                            deputee['organ'] = organ_data
-                            deputee['organ']['date'] = date
-                        
-                        deputees[acteur_ref] = deputee
+                        votants_refs.append((acteur_ref, chair_number))
     except Exception as e:
         print(f"Error processing vote: {e}")
+        instrumentation.skip('malformed_vote')
+    return extracted
+
+def apply_vote_groups(extracted, deputees):
+    """Update the deputees with the voters extracted by extract_vote_groups."""
+    try:
+        date = extracted['date']
+
+        for organ_id, votants_refs in extracted['groups']:
+            organ_data = get_organ_name(organ_id)
+            if not organ_data:
+                instrumentation.skip('unknown_organe')
+                continue
+
+            for acteur_ref, chair_number in votants_refs:
+                # Get the deputy from our main dict, or create a new one
+                deputee = deputees.get(acteur_ref)
+                if not deputee:
+                    deputee = create_deputee_base(acteur_ref)
+                    if deputee is None:
+                        instrumentation.skip('unknown_actor')
+                        continue
+                
+                if chair_number and chair_number not in deputee['chair_numbers']:
+                    deputee['chair_numbers'].append(chair_number)
+                
+                if organ_id != deputee['organ'].get('id', False) and compare_date(date, deputee['organ'].get('date', '1900-01-01')):
+                    deputee['organ'] = organ_data
+                    deputee['organ']['date'] = date
+                
+                deputees[acteur_ref] = deputee
+        instrumentation.count('scrutins_parsed')
+    except Exception as e:
+        print(f"Error processing vote: {e}")
+        instrumentation.skip('malformed_vote')
+
+def process_single_vote_file(vote_data, deputees):
+    """Process a single vote data structure (for both formats)."""
+    apply_vote_groups(extract_vote_groups(vote_data), deputees)
 
-def process_folder_format(vote_path, deputees):
-    """Process votes from a folder of JSON files."""
+def parse_vote_file(path_file):
+    """Parse one per-vote JSON file and extract its voters (runs in worker processes).
+
+    Returns a tuple (vote_uid, extracted), or None if the file could not be read.
+    """
+    try:
+        with open(path_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (json.JSONDecodeError, FileNotFoundError) as e:
+        print(f"Could not process file {path_file}: {e}")
+        instrumentation.skip('invalid_json')
+        return None
+    instrumentation.count('files_parsed')
+
+    scrutin = data.get('scrutin', data) if isinstance(data, dict) else None
+    uid = scrutin.get('uid') if isinstance(scrutin, dict) else None
+    return uid or os.path.splitext(os.path.basename(path_file))[0], extract_vote_groups(data)
+
+def process_folder_format(vote_path, deputees, workers=1):
+    """Process votes from a folder of JSON files, with `workers` processes parsing them.
+
+    Votes are applied in vote uid order so serial and parallel runs give the same output.
+    """
     if not os.path.exists(vote_path):
         print(f"Warning: Vote directory not found at {vote_path}")
         return
     
-    file_count = 0
-    for votes_filename in os.listdir(vote_path):
-        if not votes_filename.endswith('.json'):
-            continue
-            
-        file_count += 1
-        print(f"Processing vote file: {votes_filename}", end='\r')
-        
-        path_file = os.path.join(vote_path, votes_filename)
-        try:
-            with open(path_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            
-            process_single_vote_file(data, deputees)
-        except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
-            print(f"Could not process file {path_file}: {e}")
+    vote_files = list_vote_files(vote_path)
+    print(f"Processing {len(vote_files)} vote files with {workers} worker(s)")
+    results = map_files(vote_files, parse_vote_file, workers)
     
-    print(f"\nProcessed {file_count} vote files from folder")
+    parsed = [result for result in results if result]
+    for uid, extracted in sorted(parsed, key=lambda result: vote_sort_key(result[0])):
+        apply_vote_groups(extracted, deputees)
+    
+    print(f"\nProcessed {len(vote_files)} vote files from folder")
+
+def process_single_file_format(vote_path, deputees, streaming=False):
+    """Process votes from a single consolidated JSON file (legislature 14).
 
-def process_single_file_format(vote_path, deputees):
-    """Process votes from a single consolidated JSON file (legislature 14)."""
+    With streaming=True the scrutins are read one at a time instead of loading the whole file.
+    """
     if not os.path.exists(vote_path):
         print(f"Warning: Vote file not found at {vote_path}")
         return
     
-    print(f"Processing single vote file: {vote_path}")
+    print(f"Processing single vote file: {vote_path} ({'streaming' if streaming else 'eager'} reader)")
     
     try:
-        with open(vote_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        scrutins_list = data.get("scrutins", {}).get("scrutin", [])
-        
-        if not isinstance(scrutins_list, list):
-            print(f"Warning: 'scrutin' is not a list in {vote_path}")
-            return
-        
-        print(f"Found {len(scrutins_list)} votes in file")
-        
-        for idx, scrutin in enumerate(scrutins_list):
+        vote_count = 0
+        for idx, scrutin in enumerate(iter_scrutins(vote_path, streaming)):
             if idx % 100 == 0:
-                print(f"Processing vote {idx}/{len(scrutins_list)}", end='\r')
+                print(f"Processing vote {idx}", end='\r')
             process_single_vote_file(scrutin, deputees)
+            vote_count += 1
         
-        print(f"\nProcessed {len(scrutins_list)} votes from single file")
+        print(f"\nProcessed {vote_count} votes from single file")
+        instrumentation.count('files_parsed')
     except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
         print(f"Could not process file {vote_path}: {e}")
+        instrumentation.skip('invalid_json')
+        # Do not keep a partial legislature from a truncated or invalid dump
+        deputees.clear()
+
+def strip_organ_dates(deputees):
+    """Clean up the temporary date fields used to keep the latest organ."""
+    for deputee_data in deputees.values():
+        if 'organ' in deputee_data and 'date' in deputee_data['organ']:
+            del deputee_data['organ']['date']
 
-def process_legislature(config):
+def save_deputees(deputees, output_path, vote_path):
+    """Clean up the temporary organ dates and write deputees_XX.json."""
+    strip_organ_dates(deputees)
+    
+    # Save results
+    if deputees:
+        output_dir = os.path.dirname(output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(deputees, f, indent=1, ensure_ascii=False)
+        
+        print(f"\n✅ Successfully saved {len(deputees)} deputees to {output_path}")
+    else:
+        print(f"\n⚠️ No deputees found for {vote_path}")
+
+def process_legislature(config, streaming=False, workers=1):
     """Process a single legislature based on its configuration."""
     vote_path = config['vote_path']
     cr_path = config['cr_path']
-    output_path = config['output']
+    output_path = config['deputees_output']
     is_single_file = config['is_single_file']
     
     print(f"\n{'='*60}")
@@ -274,35 +367,39 @@ def process_legislature(config):
     deputees = {}
     
     # Process votes
-    if is_single_file:
-        process_single_file_format(vote_path, deputees)
-    else:
-        process_folder_format(vote_path, deputees)
+    with instrumentation.stage('parse_vote_groups', workers=workers):
+        if is_single_file:
+            process_single_file_format(vote_path, deputees, streaming)
+        else:
+            process_folder_format(vote_path, deputees, workers)
+        instrumentation.count('deputees', len(deputees))
     
-    # Process compte rendu (only for legislature 17)
+    # Process compte rendu, the speeches go to their own corpus next to deputees_XX.json
     if cr_path:
         print("\nProcessing compte_rendu files...")
-        process_compte_rendu_files(deputees, cr_path)
+        with instrumentation.stage('parse_comptes_rendus', workers=workers):
+            with SpeechCorpusWriter(corpus_path(output_path)) as corpus:
+                process_compte_rendu_files(deputees, cr_path, corpus, workers)
+        print(f"Saved {corpus.n_speeches} speeches to {corpus_path(output_path)}")
     
-    # Clean up temporary date fields
-    for deputee_data in deputees.values():
-        if 'organ' in deputee_data and 'date' in deputee_data['organ']:
-            del deputee_data['organ']['date']
-    
-    # Save results
-    if deputees:
-        output_dir = os.path.dirname(output_path)
-        if output_dir:
-            os.makedirs(output_dir, exist_ok=True)
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(deputees, f, indent=1, ensure_ascii=False)
-        
-        print(f"\n✅ Successfully saved {len(deputees)} deputees to {output_path}")
-    else:
-        print(f"\n⚠️ No deputees found for {vote_path}")
+    with instrumentation.stage('save_deputees'):
+        save_deputees(deputees, output_path, vote_path)
 
 def main():
+    global actor_index_cache
+
+    parser = argparse.ArgumentParser(description="Extract the deputees of each legislature.")
+    parser.add_argument('--streaming', action='store_true',
+                        help="read single-file dumps (legislature 14) one scrutin at a time")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes parsing per-vote and compte_rendu files (default: 1, serial)")
+    parser.add_argument('--actor-cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"persist the actor/organe index to a SQLite file (default: {DEFAULT_CACHE_PATH})")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    actor_index_cache = args.actor_cache
+    instrumentation.configure_from_args(args)
+
     # Process all legislatures
     for legislature_num, config in LEGISLATURE_CONFIGS.items():
         print(f"\n\n{'#'*60}")
@@ -310,7 +407,8 @@ def main():
         print(f"{'#'*60}")
         
         try:
-            process_legislature(config)
+            with instrumentation.stage('extract_deputees', legislature=legislature_num):
+                process_legislature(config, streaming=args.streaming, workers=args.workers)
         except Exception as e:
             print(f"❌ Error processing legislature {legislature_num}: {e}")
             import traceback
@@ -1,29 +1,11 @@
 import os
 import json
+import argparse
 
-# Define constants for file paths - now supporting multiple legislatures
-LEGISLATURE_CONFIGS = {
-    '14': {
-        'path': './data/vote/14/Scrutins_XIV.json',
-        'output': './data/processed/vote_14.json',
-        'is_single_file': True
-    },
-    '15': {
-        'path': './data/vote/15',
-        'output': './data/processed/vote_15.json',
-        'is_single_file': False
-    },
-    '16': {
-        'path': './data/vote/16',
-        'output': './data/processed/vote_16.json',
-        'is_single_file': False
-    },
-    '17': {
-        'path': './data/vote/17',
-        'output': './data/processed/vote_17.json',
-        'is_single_file': False
-    }
-}
+import instrumentation
+from legislatures import LEGISLATURE_CONFIGS
+from scrutin_reader import iter_scrutins, list_vote_files, map_files, vote_sort_key
+from vote_store import columnar_path, write_vote_store
 
 
 def get_voters_list(voters_data: dict or None) -> list:
@@ -86,7 +68,9 @@ def process_single_vote_json(scrutin: dict) -> dict or None:
     
     if not vote_id:
         print(f"Missing vote ID in scrutin, skipping.")
+        instrumentation.skip('missing_uid')
         return None
+    instrumentation.count('scrutins_parsed')
 
     # Initialize lists to hold actor references
     votes_for = []
@@ -98,6 +82,7 @@ def process_single_vote_json(scrutin: dict) -> dict or None:
     ventilation = scrutin.get("ventilationVotes", {})
     if not isinstance(ventilation, dict):
         # If ventilationVotes is not a dict (e.g., empty string), skip vote processing
+        instrumentation.count('scrutins_without_voters')
         return {
             "date": date_scrutin,
             "type": code_type_vote,
@@ -108,6 +93,7 @@ def process_single_vote_json(scrutin: dict) -> dict or None:
     
     organe = ventilation.get("organe", {})
     if not isinstance(organe, dict):
+        instrumentation.count('scrutins_without_voters')
         return {
             "date": date_scrutin,
             "type": code_type_vote,
@@ -118,6 +104,7 @@ def process_single_vote_json(scrutin: dict) -> dict or None:
     
     groupes_data = organe.get("groupes", {})
     if not isinstance(groupes_data, dict):
+        instrumentation.count('scrutins_without_voters')
         return {
             "date": date_scrutin,
             "type": code_type_vote,
@@ -164,93 +151,132 @@ def process_single_vote_json(scrutin: dict) -> dict or None:
     }
 
 
-def process_folder_format(folder: str) -> dict:
+def parse_vote_file(complete_path: str) -> tuple or None:
+    """
+    Parses one per-vote JSON file and processes its scrutin.
+    Top-level so it can be sent to worker processes.
+    
+    Args:
+        complete_path: The path to the JSON file
+    
+    Returns:
+        A tuple (vote_id, vote_data), or None if the file could not be used
+    """
+    file_name = os.path.basename(complete_path)
+
+    try:
+        with open(complete_path, 'r', encoding='utf-8') as f:
+            json_data = json.load(f)
+    except json.JSONDecodeError as e:
+        print(f"JSON decoding error in {file_name}: {e}")
+        instrumentation.skip('invalid_json')
+        return None
+    instrumentation.count('files_parsed')
+
+    scrutin = json_data.get("scrutin", {})
+    vote_data = process_single_vote_json(scrutin)
+    
+    if not vote_data:
+        return None
+    return scrutin.get("uid"), vote_data
+
+
+def process_folder_format(folder: str, workers: int = 1) -> dict:
     """
     Processes vote JSON files from a folder (legislatures 15, 16, 17).
     
     Args:
         folder: The path to the folder containing the JSON files.
+        workers: Number of worker processes parsing the files (1 = serial)
     
     Returns:
-        Dictionary with vote_id as keys and vote data as values
+        Dictionary with vote_id as keys and vote data as values, sorted by vote_id
     """
     legislature_vote = {}
     
-    for entry in os.scandir(folder):
-        if entry.is_file() and entry.name.endswith('.json'):
-            file_name = entry.name
-            complete_path = entry.path
-            print(f"--- Processing file: {file_name} ---")
-
-            try:
-                with open(complete_path, 'r', encoding='utf-8') as f:
-                    json_data = json.load(f)
-            except json.JSONDecodeError as e:
-                print(f"JSON decoding error in {file_name}: {e}")
-                continue
-
-            scrutin = json_data.get("scrutin", {})
-            vote_data = process_single_vote_json(scrutin)
-            
-            if vote_data:
-                vote_id = scrutin.get("uid")
-                legislature_vote[vote_id] = vote_data
+    results = map_files(list_vote_files(folder), parse_vote_file, workers)
+    
+    # Merge in vote order so that serial and parallel runs write the same file
+    parsed = [result for result in results if result]
+    for vote_id, vote_data in sorted(parsed, key=lambda result: vote_sort_key(result[0])):
+        legislature_vote[vote_id] = vote_data
 
     return legislature_vote
 
 
-def process_single_file_format(file_path: str) -> dict:
+def process_single_file_format(file_path: str, streaming: bool = False) -> dict:
     """
     Processes a single JSON file containing all votes (legislature 14).
     
     Args:
         file_path: The path to the JSON file
+        streaming: If True, read the scrutins one at a time instead of loading the whole file
     
     Returns:
         Dictionary with vote_id as keys and vote data as values
     """
     legislature_vote = {}
     
-    print(f"--- Processing single file: {file_path} ---")
+    print(f"--- Processing single file: {file_path} ({'streaming' if streaming else 'eager'} reader) ---")
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            json_data = json.load(f)
+        for scrutin in iter_scrutins(file_path, streaming):
+            vote_data = process_single_vote_json(scrutin)
+            
+            if vote_data:
+                vote_id = scrutin.get("uid")
+                legislature_vote[vote_id] = vote_data
     except json.JSONDecodeError as e:
         print(f"JSON decoding error in {file_path}: {e}")
-        return legislature_vote
+        instrumentation.skip('invalid_json')
+        return {}
     except FileNotFoundError:
         print(f"File not found: {file_path}")
-        return legislature_vote
-    
-    # Extract the list of scrutins
-    scrutins_list = json_data.get("scrutins", {}).get("scrutin", [])
-    
-    if not isinstance(scrutins_list, list):
-        print(f"Warning: 'scrutin' is not a list in {file_path}")
-        return legislature_vote
-    
-    print(f"Found {len(scrutins_list)} votes in file")
-    
-    for scrutin in scrutins_list:
-        vote_data = process_single_vote_json(scrutin)
-        
-        if vote_data:
-            vote_id = scrutin.get("uid")
-            legislature_vote[vote_id] = vote_data
+        instrumentation.skip('missing_file')
+        return {}
+    instrumentation.count('files_parsed')
     
     return legislature_vote
 
 
-def process_legislature(config: dict) -> None:
+def save_legislature_votes(legislature_vote: dict, output_file: str, path: str, output_format: str = 'json') -> None:
+    """
+    Writes the processed votes of a legislature.
+    
+    Args:
+        legislature_vote: Dictionary with vote_id as keys and vote data as values
+        output_file: The path of the vote_XX.json file
+        path: The source of the votes, used in messages
+        output_format: 'json' (vote_XX.json), 'columnar' (see vote_store.py) or 'both'
+    """
+    if legislature_vote:
+        if output_format in ('json', 'both'):
+            print(f"\n✅ Writing final output file: {output_file}")
+            # Ensure output directory exists
+            os.makedirs(os.path.dirname(output_file), exist_ok=True)
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(legislature_vote, f, indent=4)
+        if output_format in ('columnar', 'both'):
+            store_path = columnar_path(output_file)
+            print(f"\n✅ Writing columnar store: {store_path}")
+            write_vote_store(legislature_vote, store_path)
+        print(f"✅ Successfully processed {len(legislature_vote)} votes")
+    else:
+        print(f"\n⚠️ No votes processed for {path}. Output file was not created.")
+
+
+def process_legislature(config: dict, streaming: bool = False, workers: int = 1, output_format: str = 'json') -> None:
     """
     Processes a legislature based on its configuration.
     
     Args:
-        config: Dictionary with 'path', 'output', and 'is_single_file' keys
+        config: Dictionary with 'vote_path', 'vote_output', and 'is_single_file' keys
+        streaming: If True, use the streaming reader for single-file legislatures
+        workers: Number of worker processes for folder legislatures
+        output_format: 'json', 'columnar' or 'both'
     """
-    path = config['path']
-    output_file = config['output']
+    path = config['vote_path']
+    output_file = config['vote_output']
     is_single_file = config['is_single_file']
     
     print(f"\n{'='*60}")
@@ -258,23 +284,29 @@ def process_legislature(config: dict) -> None:
     print(f"Output: {output_file}")
     print(f"{'='*60}\n")
     
-    if is_single_file:
-        legislature_vote = process_single_file_format(path)
-    else:
-        legislature_vote = process_folder_format(path)
+    with instrumentation.stage('parse_votes', workers=workers):
+        if is_single_file:
+            legislature_vote = process_single_file_format(path, streaming)
+        else:
+            legislature_vote = process_folder_format(path, workers)
+        instrumentation.count('votes', len(legislature_vote))
     
-    if legislature_vote:
-        print(f"\n✅ Writing final output file: {output_file}")
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_file), exist_ok=True)
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(legislature_vote, f, indent=4)
-        print(f"✅ Successfully processed {len(legislature_vote)} votes")
-    else:
-        print(f"\n⚠️ No votes processed for {path}. Output file was not created.")
+    with instrumentation.stage('save_votes', format=output_format):
+        save_legislature_votes(legislature_vote, output_file, path, output_format)
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract the votes of each legislature.")
+    parser.add_argument('--streaming', action='store_true',
+                        help="read single-file dumps (legislature 14) one scrutin at a time")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of processes parsing per-vote files (default: 1, serial)")
+    parser.add_argument('--format', choices=['json', 'columnar', 'both'], default='json',
+                        help="vote_XX.json, a memory-mappable columnar store, or both (default: json)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure_from_args(args)
+
     # Process all legislatures
     for legislature_num, config in LEGISLATURE_CONFIGS.items():
         print(f"\n\n{'#'*60}")
@@ -282,7 +314,8 @@ if __name__ == "__main__":
         print(f"{'#'*60}")
         
         try:
-            process_legislature(config)
+            with instrumentation.stage('extract_vote', legislature=legislature_num):
+                process_legislature(config, streaming=args.streaming, workers=args.workers, output_format=args.format)
         except Exception as e:
             print(f"❌ Error processing legislature {legislature_num}: {e}")
             import traceback
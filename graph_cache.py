@@ -0,0 +1,67 @@
+import os
+import json
+import hashlib
+import sqlite3
+
+DEFAULT_GRAPH_CACHE = 'data/processed/graph_cache.sqlite'
+
+
+def graph_fingerprint(G, weight: str = None) -> str:
+    """
+    Hash identifying the structure of a graph, independent of the order its
+    nodes and edges were added in.
+
+    Args:
+        G: A networkx graph
+        weight: Edge attribute that the results depend on, if any
+
+    Returns:
+        The hexadecimal SHA-256 of the directedness, the nodes and the edges (with their weight)
+    """
+    def edge_record(u, v, data):
+        if not G.is_directed():
+            u, v = sorted((u, v), key=repr)
+        return [repr(u), repr(v), float(data.get(weight, 1)) if weight else None]
+
+    nodes = sorted(repr(node) for node in G.nodes())
+    edges = sorted(edge_record(u, v, data) for u, v, data in G.edges(data=True))
+    digest = hashlib.sha256(f"directed={G.is_directed()}".encode('utf-8') + b'\0')
+    digest.update(json.dumps(nodes).encode('utf-8'))
+    digest.update(json.dumps(edges).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def result_key(fingerprint: str, measure: str, params: dict) -> str:
+    """Cache key of a measure computed with some parameters on a graph."""
+    return hashlib.sha256(json.dumps([fingerprint, measure, params], sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class GraphResultCache:
+    """
+    SQLite file mapping a result_key to a JSON result, shared by the notebooks
+    and the threshold sweeps: a measure is only computed again when the graph
+    or the parameters change.
+    """
+
+    def __init__(self, cache_path: str = DEFAULT_GRAPH_CACHE):
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.path = cache_path
+        self.conn = sqlite3.connect(cache_path)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, result TEXT)")
+
+    def get(self, key: str):
+        """Returns the cached result, or None."""
+        row = self.conn.execute("SELECT result FROM results WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, result) -> None:
+        """Stores a JSON-serializable result."""
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO results VALUES (?, ?)",
+                              (key, json.dumps(result, ensure_ascii=False)))
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,355 @@
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from functools import partial
+
+try:
+    import resource
+except ImportError:
+    # POSIX only: on Windows the rusage figures of the records are None
+    resource = None
+
+DEFAULT_METRICS_PATH = 'data/processed/metrics.jsonl'
+PROFILE_FOLDER = 'data/processed/profiles'
+
+# Upper bounds in seconds of the latency histogram buckets, the last bucket is unbounded
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Number of functions (cProfile) and allocation sites (tracemalloc) kept in a stage record
+TOP_ENTRIES = 15
+
+# Set by configure(): where records go and which stages are profiled
+_settings = {'metrics_path': None, 'profile': frozenset(), 'trace': frozenset()}
+
+# Stages being measured in this process, innermost last
+_stack = []
+_write_lock = threading.Lock()
+_profiling = False
+
+
+class Histogram:
+    """Counts of observed values per bucket, with their count, sum, min and max."""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        i = next((i for i, bound in enumerate(self.buckets) if value <= bound), len(self.buckets))
+        self.counts[i] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, data: dict) -> None:
+        """Adds the values of a histogram serialized by to_dict."""
+        if not data['count']:
+            return
+        self.counts = [a + b for a, b in zip(self.counts, data['counts'])]
+        self.count += data['count']
+        self.total += data['sum']
+        self.min = data['min'] if self.min is None else min(self.min, data['min'])
+        self.max = data['max'] if self.max is None else max(self.max, data['max'])
+
+    def to_dict(self) -> dict:
+        return {'buckets': list(self.buckets), 'counts': self.counts, 'count': self.count, 'sum': self.total,
+                'min': self.min, 'max': self.max}
+
+
+class StageMetrics:
+    """
+    Events recorded during a stage: counters (files parsed, cache hits...),
+    skipped records by reason and histograms of observed values.
+
+    Methods are thread-safe, so download threads can share the stage.
+    """
+
+    def __init__(self, name: str, labels: dict = None):
+        self.name = name
+        self.labels = labels or {}
+        self.counters = Counter()
+        self.skipped = Counter()
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] += n
+
+    def skip(self, reason: str, n: int = 1) -> None:
+        with self._lock:
+            self.skipped[reason] += n
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).observe(value)
+
+    def events(self) -> dict:
+        """The recorded events, JSON-serializable and mergeable with merge()."""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'skipped': dict(self.skipped),
+                'histograms': {name: histogram.to_dict() for name, histogram in self.histograms.items()},
+            }
+
+    def merge(self, events: dict) -> None:
+        """Adds the events recorded elsewhere, e.g. in a worker process."""
+        with self._lock:
+            self.counters.update(events['counters'])
+            self.skipped.update(events['skipped'])
+            for name, data in events['histograms'].items():
+                self.histograms.setdefault(name, Histogram(data['buckets'])).merge(data)
+
+
+def configure(metrics_path: str = DEFAULT_METRICS_PATH, profile=(), trace=()) -> None:
+    """
+    Sets where stage records are written and which stages are profiled.
+
+    Args:
+        metrics_path: JSON lines file the stage records are appended to, '-' for
+                      stdout, None to not write them
+        profile: Names of the stages run under cProfile ('all' for every stage)
+        trace: Names of the stages run under tracemalloc ('all' for every stage)
+    """
+    _settings['metrics_path'] = metrics_path
+    _settings['profile'] = frozenset(profile or ())
+    _settings['trace'] = frozenset(trace or ())
+
+
+def add_arguments(parser) -> None:
+    """Adds the --metrics, --profile and --tracemalloc options to an argparse parser."""
+    parser.add_argument('--metrics', default=DEFAULT_METRICS_PATH, metavar='PATH',
+                        help=f"JSON lines file receiving one record per stage, '-' for stdout "
+                             f"(default: {DEFAULT_METRICS_PATH})")
+    parser.add_argument('--profile', nargs='+', default=[], metavar='STAGE',
+                        help=f"run these stages (or 'all') under cProfile, profiles go to {PROFILE_FOLDER}")
+    parser.add_argument('--tracemalloc', nargs='+', default=[], metavar='STAGE',
+                        help="run these stages (or 'all') under tracemalloc")
+
+
+def configure_from_args(args) -> None:
+    """configure() with the options added by add_arguments."""
+    configure(args.metrics or None, args.profile, args.tracemalloc)
+
+
+def current() -> StageMetrics or None:
+    """The innermost stage being measured, or None."""
+    return _stack[-1] if _stack else None
+
+
+def count(name: str, n: int = 1) -> None:
+    """Adds n to a counter of the current stage (no-op outside of a stage)."""
+    if _stack:
+        _stack[-1].count(name, n)
+
+
+def skip(reason: str, n: int = 1) -> None:
+    """Records n records skipped for a reason in the current stage (no-op outside of a stage)."""
+    if _stack:
+        _stack[-1].skip(reason, n)
+
+
+def observe(name: str, value: float) -> None:
+    """Adds a value to a histogram of the current stage (no-op outside of a stage)."""
+    if _stack:
+        _stack[-1].observe(name, value)
+
+
+def _enabled(name: str, stages: frozenset) -> bool:
+    return name in stages or 'all' in stages
+
+
+def _peak_rss_mb(children: bool = False) -> float or None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    return (peak if sys.platform == 'darwin' else peak * 1024) / 2 ** 20
+
+
+def _children_cpu() -> float or None:
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _profile_summary(profiler: cProfile.Profile, name: str, labels: dict) -> dict:
+    """Writes the profile of a stage and returns its most expensive functions."""
+    os.makedirs(PROFILE_FOLDER, exist_ok=True)
+    suffix = '_'.join(re.sub(r'[^\w.-]+', '-', str(value)).strip('-') for value in labels.values())
+    path = os.path.join(PROFILE_FOLDER, f"{name}{'_' + suffix if suffix else ''}_{int(time.time())}.prof")
+    profiler.dump_stats(path)
+
+    stats = pstats.Stats(profiler).stats
+    top = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_ENTRIES]
+    return {
+        'path': path,
+        'top_cumulative': [{'function': f"{filename}:{line}({function})", 'calls': calls,
+                            'tottime': tottime, 'cumtime': cumtime}
+                           for (filename, line, function), (_, calls, tottime, cumtime, _) in top],
+    }
+
+
+def _trace_summary(peak: int) -> dict:
+    """Peak traced memory and the allocation sites still holding the most memory."""
+    top = tracemalloc.take_snapshot().statistics('lineno')[:TOP_ENTRIES]
+    return {
+        'peak_mb': peak / 2 ** 20,
+        'top_allocations': [{'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                             'size_mb': stat.size / 2 ** 20, 'count': stat.count} for stat in top],
+    }
+
+
+def emit(record: dict) -> None:
+    """Writes a stage record as one JSON line to the configured destination."""
+    metrics_path = _settings['metrics_path']
+    if not metrics_path:
+        return
+    line = json.dumps(record, ensure_ascii=False, default=str)
+    with _write_lock:
+        if metrics_path == '-':
+            print(line, flush=True)
+            return
+        metrics_dir = os.path.dirname(metrics_path)
+        if metrics_dir:
+            os.makedirs(metrics_dir, exist_ok=True)
+        with open(metrics_path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+
+
+@contextmanager
+def stage(name: str, **labels):
+    """
+    Measures a stage: wall time, CPU time of the process and of its finished
+    children (worker pools), peak RSS, and the events recorded with count(),
+    skip() and observe() while it runs. The record is emitted when the stage
+    ends, also when it fails.
+
+    Stages nest: events go to the innermost stage, which inherits the labels
+    of the enclosing one. The stages named in configure() also run under
+    cProfile and/or tracemalloc.
+
+    Args:
+        name: Name of the stage, as given to --profile and --tracemalloc
+        **labels: Values identifying the run, e.g. legislature='17'
+
+    Yields:
+        The StageMetrics of the stage
+    """
+    global _profiling
+
+    if _stack:
+        labels = {**_stack[-1].labels, **labels}
+    metrics = StageMetrics(name, labels)
+
+    profiler = None
+    if _enabled(name, _settings['profile']) and not _profiling:
+        # A single profiler can be active at a time
+        profiler = cProfile.Profile()
+        _profiling = True
+    trace = _enabled(name, _settings['trace']) and not tracemalloc.is_tracing()
+
+    _stack.append(metrics)
+    started = time.time()
+    wall_start, cpu_start, children_start = time.perf_counter(), time.process_time(), _children_cpu()
+    if trace:
+        tracemalloc.start()
+    if profiler:
+        profiler.enable()
+
+    status, error = 'ok', None
+    try:
+        yield metrics
+    except BaseException as e:
+        status, error = 'error', f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if profiler:
+            profiler.disable()
+            _profiling = False
+        traced = None
+        if trace:
+            traced = _trace_summary(tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        _stack.pop()
+
+        record = {
+            'stage': name,
+            **labels,
+            'status': status,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(started)),
+            'wall_seconds': time.perf_counter() - wall_start,
+            'cpu_seconds': time.process_time() - cpu_start,
+            'children_cpu_seconds': _children_cpu() - children_start if children_start is not None else None,
+            'peak_rss_mb': _peak_rss_mb(),
+            'children_peak_rss_mb': _peak_rss_mb(children=True),
+            **metrics.events(),
+        }
+        if error:
+            record['error'] = error
+        if profiler:
+            record['profile'] = _profile_summary(profiler, name, labels)
+        if traced:
+            record['tracemalloc'] = traced
+        emit(record)
+
+
+def call_recorded(func, arg):
+    """
+    Worker: calls func(arg) while recording its events, so that a worker
+    process can send them back with its result.
+
+    Returns:
+        A tuple (result, events)
+    """
+    metrics = StageMetrics('worker')
+    _stack.append(metrics)
+    try:
+        result = func(arg)
+    finally:
+        _stack.pop()
+    return result, metrics.events()
+
+
+def recorded(func):
+    """
+    Wraps a top-level function for a process pool when a stage is being
+    measured: the results of the wrapped function are (result, events) tuples,
+    to be passed to merge_results.
+    """
+    return partial(call_recorded, func) if _stack else func
+
+
+def merge_results(results, recorded_func) -> list:
+    """
+    Adds the events sent back by recorded() workers to the current stage.
+
+    Args:
+        results: Results of the pool
+        recorded_func: The function returned by recorded()
+
+    Returns:
+        The results of the wrapped function
+    """
+    if not isinstance(recorded_func, partial) or recorded_func.func is not call_recorded:
+        return list(results)
+    values = []
+    for result, events in results:
+        if _stack:
+            _stack[-1].merge(events)
+        values.append(result)
+    return values
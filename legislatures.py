@@ -0,0 +1,51 @@
+# Legislature configurations shared by the extraction scripts and pipeline.py
+LEGISLATURE_CONFIGS = {
+    '14': {
+        'vote_path': 'data/vote/14/Scrutins_XIV.json',
+        'cr_path': None,  # No compte rendu for 14
+        'vote_output': 'data/processed/vote_14.json',
+        'deputees_output': 'data/processed/deputees_14.json',
+        'manifest': 'data/processed/manifest_14.json',  # Used by extract_all.py --incremental
+        'graph_output': 'data/processed/graph_14.json',
+        'communities_output': 'data/processed/communautes_14.json',
+        'terms_output': None,  # No speeches for 14
+        'pipeline_state': 'data/processed/pipeline_14.json',  # Used by pipeline.py
+        'is_single_file': True
+    },
+    '15': {
+        'vote_path': 'data/vote/15',
+        'cr_path': 'data/cr/15',
+        'vote_output': 'data/processed/vote_15.json',
+        'deputees_output': 'data/processed/deputees_15.json',
+        'manifest': 'data/processed/manifest_15.json',
+        'graph_output': 'data/processed/graph_15.json',
+        'communities_output': 'data/processed/communautes_15.json',
+        'terms_output': 'data/processed/ctf_idf_15.json',
+        'pipeline_state': 'data/processed/pipeline_15.json',
+        'is_single_file': False
+    },
+    '16': {
+        'vote_path': 'data/vote/16',
+        'cr_path': 'data/cr/16',
+        'vote_output': 'data/processed/vote_16.json',
+        'deputees_output': 'data/processed/deputees_16.json',
+        'manifest': 'data/processed/manifest_16.json',
+        'graph_output': 'data/processed/graph_16.json',
+        'communities_output': 'data/processed/communautes_16.json',
+        'terms_output': 'data/processed/ctf_idf_16.json',
+        'pipeline_state': 'data/processed/pipeline_16.json',
+        'is_single_file': False
+    },
+    '17': {
+        'vote_path': 'data/vote/17',
+        'cr_path': 'data/cr/',
+        'vote_output': 'data/processed/vote_17.json',
+        'deputees_output': 'data/processed/deputees_17.json',
+        'manifest': 'data/processed/manifest_17.json',
+        'graph_output': 'data/processed/graph_17.json',
+        'communities_output': 'data/processed/communautes_17.json',
+        'terms_output': 'data/processed/ctf_idf_17.json',
+        'pipeline_state': 'data/processed/pipeline_17.json',
+        'is_single_file': False
+    }
+}
@@ -0,0 +1,153 @@
+import os
+import json
+import hashlib
+
+MANIFEST_VERSION = 2
+
+
+def file_digest(path: str) -> str:
+    """
+    Computes the SHA-256 of a file.
+
+    Args:
+        path: The path to the file
+
+    Returns:
+        The hexadecimal digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FileManifest:
+    """
+    Records the size, mtime and hash of source files together with the result
+    they produced, so that unchanged files do not have to be parsed again.
+
+    Entries are grouped in sections (e.g. 'vote_files', 'cr_files') and keyed by
+    file name. A few values that describe the outputs as a whole (not one source
+    file) can be stored next to them. The manifest is a single JSON file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.sections = {}
+        self.values = {}
+        self.changed = False
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.sections = data.get('sections', {})
+                    self.values = data.get('values', {})
+                else:
+                    print(f"Ignoring manifest {path} written by another version")
+            except json.JSONDecodeError as e:
+                print(f"Ignoring unreadable manifest {path}: {e}")
+
+    def lookup(self, section: str, file_path: str) -> tuple:
+        """
+        Looks up the cached result of a file.
+
+        The hash is only recomputed when the size or the mtime changed, and a
+        file whose content is unchanged keeps its cached result.
+
+        Args:
+            section: The manifest section
+            file_path: The path to the source file
+
+        Returns:
+            A tuple (found, result)
+        """
+        entry = self.sections.get(section, {}).get(os.path.basename(file_path))
+        if entry is None:
+            return False, None
+
+        stat = os.stat(file_path)
+        if entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+            return True, entry['result']
+
+        if entry['size'] == stat.st_size and entry['sha256'] == file_digest(file_path):
+            # Touched but not modified
+            entry['mtime_ns'] = stat.st_mtime_ns
+            self.changed = True
+            return True, entry['result']
+
+        return False, None
+
+    def update(self, section: str, file_path: str, result) -> None:
+        """
+        Records the result produced by a file.
+
+        Args:
+            section: The manifest section
+            file_path: The path to the source file
+            result: JSON-serializable result of the file
+        """
+        stat = os.stat(file_path)
+        self.sections.setdefault(section, {})[os.path.basename(file_path)] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_digest(file_path),
+            'result': result,
+        }
+        self.changed = True
+
+    def set_result(self, section: str, file_path: str, result) -> None:
+        """
+        Replaces the result of a file already recorded, without hashing it again.
+
+        Args:
+            section: The manifest section
+            file_path: The path to the source file, found by lookup
+            result: JSON-serializable result of the file
+        """
+        entry = self.sections[section][os.path.basename(file_path)]
+        if entry['result'] != result:
+            entry['result'] = result
+            self.changed = True
+
+    def get_value(self, key: str, default=None):
+        """Returns a value stored with set_value."""
+        return self.values.get(key, default)
+
+    def set_value(self, key: str, value) -> None:
+        """Stores a JSON-serializable value that is not tied to one source file."""
+        if self.values.get(key) != value:
+            self.values[key] = value
+            self.changed = True
+
+    def prune(self, section: str, file_paths: list) -> int:
+        """
+        Forgets the files of a section that are not in file_paths (deleted sources).
+
+        Returns:
+            The number of entries removed
+        """
+        entries = self.sections.get(section, {})
+        keep = {os.path.basename(file_path) for file_path in file_paths}
+        removed = [name for name in entries if name not in keep]
+        for name in removed:
+            del entries[name]
+        if removed:
+            self.changed = True
+        return len(removed)
+
+    def save(self) -> None:
+        """Writes the manifest if it changed, replacing the previous file atomically."""
+        if not self.changed:
+            return
+        manifest_dir = os.path.dirname(self.path)
+        if manifest_dir:
+            os.makedirs(manifest_dir, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': MANIFEST_VERSION, 'sections': self.sections, 'values': self.values}, f,
+                      ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.changed = False
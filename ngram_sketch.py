@@ -0,0 +1,431 @@
+import os
+import json
+import zlib
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ctf_idf import TermMatrix
+from legislatures import LEGISLATURE_CONFIGS
+from nlp_tokens import BATCH_SIZE, tokenize_each
+from speech_corpus import corpus_path, load_speech_corpus
+
+# Count-min sketch size: estimates exceed the true count by at most
+# e / SKETCH_WIDTH × (n-grams seen) with probability 1 - exp(-SKETCH_DEPTH)
+SKETCH_WIDTH = 2 ** 17
+SKETCH_DEPTH = 4
+SKETCH_SEED = 0
+
+# Number of heavy hitters tracked per group
+TOP_K = 1000
+
+# Distinct n-grams counted exactly by a shard before being flushed to its sketches
+FLUSH_ITEMS = 100000
+
+# Group of the sketch holding every speech of a legislature, communities are numbered from 0
+LEGISLATURE_GROUP = 'legislature'
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer: spreads the bits of uint64 values."""
+    x = x ^ (x >> np.uint64(30))
+    x = x * np.uint64(0xbf58476d1ce4e5b9)
+    x = x ^ (x >> np.uint64(27))
+    x = x * np.uint64(0x94d049bb133111eb)
+    return x ^ (x >> np.uint64(31))
+
+
+class CountMinSketch:
+    """
+    Count-min sketch of item frequencies with a fixed memory footprint.
+
+    Items are hashed to a 64-bit fingerprint (CRC-32 and Adler-32 of their
+    UTF-8 bytes), mixed with a different key per row. The hashes do not depend
+    on the process, so sketches built with the same width, depth and seed can be
+    merged by adding their tables and shards of a corpus can be counted separately.
+
+    Attributes:
+        width: Number of counters per row
+        depth: Number of rows (independent hash functions)
+        seed: Key of the hash functions
+        table: depth × width int64 counters
+        total: Sum of the counts added
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH, seed: int = SKETCH_SEED):
+        self.width = width
+        self.depth = depth
+        self.seed = seed
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self._row_keys = _mix64(np.arange(1, depth + 1, dtype=np.uint64) * np.uint64(0x9e3779b97f4a7c15)
+                                + np.uint64(seed))
+
+    def columns(self, items: list) -> np.ndarray:
+        """Counter of each item in each row, as an items × depth array."""
+        encoded = [item.encode('utf-8') for item in items]
+        fingerprints = np.fromiter(((zlib.crc32(data) << 32) | zlib.adler32(data) for data in encoded),
+                                   dtype=np.uint64, count=len(encoded))
+        hashes = _mix64(fingerprints[:, None] ^ self._row_keys[None, :])
+        return (hashes % np.uint64(self.width)).astype(np.int64)
+
+    def add_columns(self, columns: np.ndarray, values: np.ndarray) -> None:
+        """Adds counts to items already hashed by columns."""
+        for row in range(self.depth):
+            self.table[row] += np.bincount(columns[:, row], weights=values, minlength=self.width).astype(np.int64)
+        self.total += int(values.sum())
+
+    def estimate_columns(self, columns: np.ndarray) -> np.ndarray:
+        """Estimated counts of items already hashed by columns."""
+        return self.table[np.arange(self.depth), columns].min(axis=1)
+
+    def add_many(self, counts: dict) -> None:
+        """
+        Adds item counts.
+
+        Args:
+            counts: Dictionary (or Counter) with items as keys and counts as values
+        """
+        if counts:
+            self.add_columns(self.columns(list(counts)),
+                             np.fromiter(counts.values(), dtype=np.int64, count=len(counts)))
+
+    def query_many(self, items: list) -> np.ndarray:
+        """Estimated counts of some items, never below their true counts."""
+        if not items:
+            return np.zeros(0, dtype=np.int64)
+        return self.estimate_columns(self.columns(items))
+
+    def query(self, item: str) -> int:
+        """Estimated count of one item."""
+        return int(self.query_many([item])[0])
+
+    def error_bound(self) -> float:
+        """Overestimate of query that is not exceeded with probability 1 - exp(-depth)."""
+        return np.e / self.width * self.total
+
+    def merge(self, other: 'CountMinSketch') -> None:
+        """Adds the counts of a sketch built with the same parameters."""
+        if (self.width, self.depth, self.seed) != (other.width, other.depth, other.seed):
+            raise ValueError("Cannot merge count-min sketches with different width, depth or seed")
+        self.table += other.table
+        self.total += other.total
+
+
+class HeavyHitters:
+    """
+    Top-k most frequent items of a stream: a count-min sketch, and the k items
+    with the highest estimates seen so far.
+
+    Merging two HeavyHitters merges their sketches and re-estimates the union of
+    their candidates, so a frequent item is kept as long as it was a candidate
+    of one of the shards.
+
+    Attributes:
+        k: Number of items tracked
+        sketch: The CountMinSketch of every item seen
+        candidates: {item: estimated count} of the tracked items, by decreasing count
+    """
+
+    def __init__(self, k: int = TOP_K, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH, seed: int = SKETCH_SEED):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth, seed)
+        self.candidates = {}
+
+    def _select(self, items: list, estimates: np.ndarray) -> None:
+        """Keeps the k items with the highest estimates (ties in alphabetical order)."""
+        if len(items) > self.k:
+            threshold = np.partition(estimates, len(items) - self.k)[len(items) - self.k]
+            kept = np.flatnonzero(estimates >= threshold)
+        else:
+            kept = range(len(items))
+        order = sorted(kept, key=lambda i: (-estimates[i], items[i]))[:self.k]
+        self.candidates = {items[i]: int(estimates[i]) for i in order}
+
+    def update(self, counts: dict) -> None:
+        """
+        Adds a batch of item counts.
+
+        Args:
+            counts: Dictionary (or Counter) with items as keys and counts as values
+        """
+        if not counts:
+            return
+        items = list(counts)
+        columns = self.sketch.columns(items)
+        self.sketch.add_columns(columns, np.fromiter(counts.values(), dtype=np.int64, count=len(items)))
+        previous = [item for item in self.candidates if item not in counts]
+        self._select(items + previous, np.concatenate([self.sketch.estimate_columns(columns),
+                                                       self.sketch.query_many(previous)]))
+
+    def merge(self, other: 'HeavyHitters') -> None:
+        """Adds the counts and candidates of another HeavyHitters with the same parameters."""
+        if self.k != other.k:
+            raise ValueError("Cannot merge heavy hitters tracking a different number of items")
+        self.sketch.merge(other.sketch)
+        items = list(set(self.candidates) | set(other.candidates))
+        self._select(items, self.sketch.query_many(items))
+
+    def top(self, n: int = None) -> list:
+        """
+        The n items with the highest estimated counts.
+
+        Returns:
+            List of (item, estimated count), by decreasing count
+        """
+        return list(self.candidates.items())[:n]
+
+    @property
+    def total(self) -> int:
+        return self.sketch.total
+
+
+def iter_ngrams(tokens: list, n: int):
+    """
+    Yields the n-grams of a token list, as space-separated strings.
+
+    Args:
+        tokens: Filtered tokens of one phrase (n-grams never span two speeches)
+        n: Number of tokens per n-gram
+    """
+    for i in range(len(tokens) - n + 1):
+        yield ' '.join(tokens[i:i + n])
+
+
+def _speaker_groups(corpus, communities: list) -> list:
+    """Groups of the sketches each actor code of the corpus contributes to."""
+    community_of = {}
+    for c, community in enumerate(communities or []):
+        for acteur_id in community:
+            community_of.setdefault(acteur_id, []).append(c)
+    return [[LEGISLATURE_GROUP] + community_of.get(acteur_id, []) for acteur_id in corpus.actors]
+
+
+def _sketch_shard(task: tuple) -> tuple:
+    """
+    Worker: heavy hitters of the n-grams of a range of speeches, per group.
+
+    N-grams are counted exactly in a Counter per group, flushed to the sketches
+    every FLUSH_ITEMS distinct n-grams so that memory stays bounded.
+    """
+    key, store_path, start, end, communities, n, tokenizer, params = task
+    corpus = load_speech_corpus(store_path)
+    speaker_groups = _speaker_groups(corpus, communities)
+    groups = [LEGISLATURE_GROUP] + list(range(len(communities or [])))
+    sketches = {group: HeavyHitters(**params) for group in groups}
+    pending = {group: Counter() for group in groups}
+
+    actor_codes = corpus.index['actor']
+    for batch_start in range(start, end, BATCH_SIZE):
+        batch = range(batch_start, min(batch_start + BATCH_SIZE, end))
+        for i, tokens in zip(batch, tokenize_each([corpus.speech(i) for i in batch], tokenizer)):
+            ngrams = list(iter_ngrams(tokens, n))
+            if not ngrams:
+                continue
+            for group in speaker_groups[actor_codes[i]]:
+                pending[group].update(ngrams)
+                if len(pending[group]) >= FLUSH_ITEMS:
+                    sketches[group].update(pending[group])
+                    pending[group] = Counter()
+
+    for group, counts in pending.items():
+        sketches[group].update(counts)
+    return key, sketches
+
+
+def legislature_ngram_sketches(legislature_corpora: dict, legislature_communities: dict = None, n: int = 2,
+                               tokenizer: str = 'nltk', workers: int = 1, k: int = TOP_K,
+                               width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH, seed: int = SKETCH_SEED) -> dict:
+    """
+    Streams the speeches of several legislatures and builds the n-gram heavy
+    hitters of each legislature and of each of its communities.
+
+    Every corpus is cut into contiguous shards of speeches, sketched in parallel
+    over a process pool, and the partial sketches are merged as they come back.
+    Memory only depends on the sketch parameters and the number of groups, not
+    on the number of distinct n-grams.
+
+    Args:
+        legislature_corpora: {legislature: speech corpus folder}
+        legislature_communities: {legislature: list of communities (lists of deputy ids)},
+                                 legislatures without communities only get LEGISLATURE_GROUP
+        n: Number of tokens per n-gram (2 for bigrams, 3 for trigrams)
+        tokenizer: Name of the tokenizer (see nlp_tokens.TOKENIZERS)
+        workers: Number of worker processes, 1 runs in the current process
+        k: Number of n-grams tracked per group
+        width: Number of counters per row of the count-min sketches
+        depth: Number of rows of the count-min sketches
+        seed: Key of the hash functions, shared by all the sketches so they can be merged
+
+    Returns:
+        {legislature: {group: HeavyHitters}}, groups being LEGISLATURE_GROUP and the community numbers
+    """
+    legislature_communities = legislature_communities or {}
+    params = {'k': k, 'width': width, 'depth': depth, 'seed': seed}
+
+    tasks = []
+    for legislature, store_path in legislature_corpora.items():
+        n_speeches = len(load_speech_corpus(store_path))
+        bounds = np.linspace(0, n_speeches, max(1, min(workers, n_speeches)) + 1).astype(int)
+        tasks.extend((legislature, store_path, int(start), int(end), legislature_communities.get(legislature),
+                      n, tokenizer, params)
+                     for start, end in zip(bounds[:-1], bounds[1:]))
+    print(f"Sketching {n}-grams of {len(legislature_corpora)} legislatures in {len(tasks)} shards")
+
+    result = {}
+
+    def merge(legislature, sketches):
+        if legislature not in result:
+            result[legislature] = sketches
+            return
+        for group, sketch in sketches.items():
+            result[legislature][group].merge(sketch)
+
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            merge(*_sketch_shard(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_sketch_shard, task) for task in tasks]
+            for future in as_completed(futures):
+                merge(*future.result())
+    return result
+
+
+def _count_deputy_ngrams(task: tuple) -> dict:
+    """Worker: n-gram Counters of some deputies, restricted to a vocabulary."""
+    store_path, deputy_ids, vocabulary, n, tokenizer = task
+    corpus = load_speech_corpus(store_path)
+    counters = {}
+    for acteur_id in deputy_ids:
+        counter = Counter()
+        for tokens in tokenize_each(list(corpus.deputy_speeches(acteur_id)), tokenizer):
+            counter.update(ngram for ngram in iter_ngrams(tokens, n) if ngram in vocabulary)
+        counters[acteur_id] = counter
+    return counters
+
+
+def deputy_ngram_counts(store_path: str, deputy_ids, vocabulary, n: int = 2, tokenizer: str = 'nltk',
+                        workers: int = 1) -> dict:
+    """
+    Counts exactly, for each deputy, the n-grams of a bounded vocabulary (the
+    heavy hitters of the sketches), as input to ctf_idf.TermMatrix.
+
+    Args:
+        store_path: Speech corpus folder of the legislature
+        deputy_ids: The deputies to process
+        vocabulary: The n-grams to count, the others are ignored
+        n: Number of tokens per n-gram
+        tokenizer: Name of the tokenizer (see nlp_tokens.TOKENIZERS)
+        workers: Number of worker processes, 1 runs in the current process
+
+    Returns:
+        Dictionary with deputy ids as keys and n-gram Counters as values
+    """
+    deputy_ids = list(dict.fromkeys(deputy_ids))
+    vocabulary = frozenset(vocabulary)
+    n_chunks = max(1, min(workers * 4, len(deputy_ids)))
+    tasks = [(store_path, deputy_ids[i::n_chunks], vocabulary, n, tokenizer) for i in range(n_chunks)]
+
+    counters = {}
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            counters.update(_count_deputy_ngrams(task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for chunk in executor.map(_count_deputy_ngrams, tasks):
+                counters.update(chunk)
+    return {acteur_id: counters[acteur_id] for acteur_id in deputy_ids}
+
+
+def community_ngram_top_terms(store_path: str, communities: list, sketches: dict, n: int = 2,
+                              top: int = 100, method: str = 'ctf-idf', tokenizer: str = 'nltk',
+                              workers: int = 1) -> list:
+    """
+    Scores the n-grams of each community with the CTF-IDF of ctf_idf.TermMatrix.
+
+    The candidates are the heavy hitters of the community sketches: only they
+    are counted per deputy, so the term matrix stays bounded whatever n is.
+
+    Args:
+        store_path: Speech corpus folder of the legislature
+        communities: List of communities, each a list of deputy ids
+        sketches: {group: HeavyHitters} of the legislature (see legislature_ngram_sketches)
+        n: Number of tokens per n-gram
+        top: Number of n-grams kept per community
+        method: 'tf-idf' or 'ctf-idf' (see ctf_idf.TermMatrix.scores)
+        tokenizer: Name of the tokenizer (see nlp_tokens.TOKENIZERS)
+        workers: Number of worker processes
+
+    Returns:
+        One {n-gram: score} dictionary per community, by decreasing score, as the word clouds expect
+    """
+    vocabulary = {ngram for c in range(len(communities)) for ngram in sketches[c].candidates}
+    counters = deputy_ngram_counts(store_path, [acteur_id for community in communities for acteur_id in community],
+                                   vocabulary, n, tokenizer, workers)
+    return TermMatrix.from_counters(counters).top_terms(communities, top, method)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the n-grams of the speeches of each legislature into "
+                                                 "bounded-memory sketches, and score them per community.")
+    parser.add_argument('--n', type=int, default=2, help="number of tokens per n-gram (default: 2)")
+    parser.add_argument('--k', type=int, default=TOP_K, help=f"n-grams tracked per group (default: {TOP_K})")
+    parser.add_argument('--width', type=int, default=SKETCH_WIDTH,
+                        help=f"counters per row of the count-min sketches (default: {SKETCH_WIDTH})")
+    parser.add_argument('--depth', type=int, default=SKETCH_DEPTH,
+                        help=f"rows of the count-min sketches (default: {SKETCH_DEPTH})")
+    parser.add_argument('--top', type=int, default=100, help="n-grams written per group (default: 100)")
+    parser.add_argument('--tokenizer', default='nltk', help="tokenizer of nlp_tokens (default: nltk)")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1, serial)")
+    parser.add_argument('--legislatures', nargs='+', default=list(LEGISLATURE_CONFIGS), metavar='NUM',
+                        help="legislatures to process (default: all with compte rendus)")
+    args = parser.parse_args()
+
+    corpora = {}
+    communities = {}
+    for legislature_num in args.legislatures:
+        config = LEGISLATURE_CONFIGS[legislature_num]
+        store_path = corpus_path(config['deputees_output'])
+        if not config['cr_path'] or not os.path.exists(os.path.join(store_path, 'meta.json')):
+            print(f"⚠️ No speech corpus for legislature {legislature_num}, skipping")
+            continue
+        corpora[legislature_num] = store_path
+        communities_path = f"data/processed/communautes_{legislature_num}.json"
+        if os.path.exists(communities_path):
+            with open(communities_path, 'r', encoding='utf-8') as f:
+                communities[legislature_num] = json.load(f)
+
+    sketches = legislature_ngram_sketches(corpora, communities, n=args.n, tokenizer=args.tokenizer,
+                                          workers=args.workers, k=args.k, width=args.width, depth=args.depth)
+
+    for legislature_num, groups in sketches.items():
+        output = {
+            'n': args.n,
+            'tokenizer': args.tokenizer,
+            'sketch': {'width': args.width, 'depth': args.depth, 'k': args.k},
+            'groups': {
+                str(group): {
+                    'total': hitters.total,
+                    'error_bound': hitters.sketch.error_bound(),
+                    'top': hitters.top(args.top),
+                }
+                for group, hitters in groups.items()
+            },
+        }
+        if legislature_num in communities:
+            output['ctf_idf'] = community_ngram_top_terms(corpora[legislature_num], communities[legislature_num],
+                                                          groups, n=args.n, top=args.top,
+                                                          tokenizer=args.tokenizer, workers=args.workers)
+
+        output_path = f"data/processed/ngrams_{args.n}_{legislature_num}.json"
+        with open(output_path, 'w', encoding='utf-8') as f:
+            json.dump(output, f, ensure_ascii=False, indent=2)
+        print(f"✅ Legislature {legislature_num}: {groups[LEGISLATURE_GROUP].total} {args.n}-grams, "
+              f"saved to {output_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,461 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import sqlite3
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+from speech_corpus import load_speech_corpus
+
+DEFAULT_TOKEN_CACHE = 'data/processed/token_counts.sqlite'
+
+# Tokenizers available to count_tokens, with their version. Both are part of the
+# cache key: bump the version when a tokenizer changes its output.
+TOKENIZERS = {
+    'nltk': 1,
+    'fast': 1,
+    'fast-elisions': 1,
+}
+
+# Phrases tokenized together by the fast tokenizer
+BATCH_SIZE = 1000
+
+# French stopwords of NLTK (stopwords.words('french')), embedded so that the fast
+# tokenizer does not need the NLTK data
+FRENCH_STOPWORDS = frozenset("""
+au aux avec ce ces dans de des du elle en et eux il ils je la le les leur lui ma mais me même mes moi mon ne
+nos notre nous on ou par pas pour qu que qui sa se ses son sur ta te tes toi ton tu un une vos votre vous c d j l
+à m n s t y été étée étées étés étant étante étants étantes suis es est sommes êtes sont serai seras sera serons
+serez seront serais serait serions seriez seraient étais était étions étiez étaient fus fut fûmes fûtes furent
+sois soit soyons soyez soient fusse fusses fût fussions fussiez fussent ayant ayante ayantes ayants eu eue eues
+eus ai as avons avez ont aurai auras aura aurons aurez auront aurais aurait aurions auriez auraient avais avait
+avions aviez avaient eut eûmes eûtes eurent aie aies ait ayons ayez aient eusse eusses eût eussions eussiez
+eussent
+""".split())
+
+# Words after which a period does not end a sentence, approximating the
+# abbreviations of the NLTK French sentence tokenizer
+FRENCH_ABBREVIATIONS = frozenset([
+    'm', 'mm', 'mme', 'mmes', 'mlle', 'mlles', 'dr', 'pr', 'st', 'ste', 'art', 'al', 'cf', 'etc', 'ex',
+    'p', 'pp', 'n', 'no', 'vol', 'chap', 'av', 'fig', 'éd', 'env',
+])
+
+# Elided words removed by the fast-elisions tokenizer (l'État, qu'il, jusqu'à...)
+FRENCH_ELISIONS = ['c', 'd', 'j', 'l', 'm', 'n', 's', 't', 'qu', 'jusqu', 'lorsqu', 'puisqu', 'quoiqu']
+
+
+@lru_cache(maxsize=None)
+def _nltk_french():
+    """NLTK French word tokenizer and stopword set, loaded once per process. Missing NLTK data is downloaded."""
+    import nltk
+    from nltk.corpus import stopwords
+    from nltk.tokenize import word_tokenize
+    for package, resource in (('punkt_tab', 'tokenizers/punkt_tab'), ('stopwords', 'corpora/stopwords')):
+        try:
+            nltk.data.find(resource)
+        except LookupError:
+            nltk.download(package, quiet=True)
+    return word_tokenize, set(stopwords.words('french'))
+
+
+def tokenize_nltk(phrase: str) -> list:
+    """
+    Tokenizes a phrase with NLTK, keeping the lowercased alphabetic tokens that are not stopwords.
+
+    Args:
+        phrase: One speech paragraph
+
+    Returns:
+        The list of tokens, in order
+    """
+    word_tokenize, stop_words = _nltk_french()
+    token = word_tokenize(phrase, language='french')
+    return [word.lower() for word in token if word.isalpha() and word.lower() not in stop_words]
+
+
+# Phrases of a batch are joined by a separator that ends a sentence and never yields a token
+_PHRASE_SEPARATOR = '\n\x00\n'
+
+# The period ending a phrase (possibly followed by closing quotes or brackets) is split from its word
+_END_PERIOD_RE = re.compile(r"([^.])\.(?=[\]\)}>\"'»”’\s]*(?:\x00|$))")
+# A period followed by a space or by punctuation, where a sentence may end, with
+# its word and the first character of the next word
+_PERIOD_RE = re.compile(r"(?<!\S)(\S*?[^.\s])\.(?=[?!)\";}\]*:@'({\[‘’“”«»]|\s)(?=\s*(\S?))")
+# Punctuation stripped from the start of a word before looking it up in FRENCH_ABBREVIATIONS
+_LEADING_PUNCTUATION = '("`{[:;&#*@)}]-,\'«“‘„'
+_ELISION_RE = re.compile(r"(?i)\b(?:" + '|'.join(FRENCH_ELISIONS) + r")['’](?=\w)")
+
+# Characters that the NLTK word tokenizer always splits into their own (non alphabetic) token
+_SEPARATORS = str.maketrans(dict.fromkeys('«“‘„`»”’;@#$%&\u2012\u2013\u2014\u2015?!*()[]{}<>"', ' '))
+# The \x00 of _PHRASE_SEPARATOR stays as its own (non alphabetic) chunk to mark phrase boundaries
+_SEPARATORS[ord('\x00')] = ' \x00 '
+
+# Rules of the NLTK word tokenizer that can still split an alphabetic word out of
+# a whitespace-delimited chunk once the separators are gone, in NLTK order.
+# They only look at a chunk and the spaces around it.
+_CHUNK_RULES = [
+    (re.compile(r"([ \(\[{<])(\'{2})"), r"\1 `` "),
+    (re.compile(r"(?i)(?<!\w)(\')(?!(?:re|ve|ll|m|t|s|d|n)\b)(?=\w)"), r"\1 "),
+    (re.compile(r"([:,])([^\d])"), r" \1 \2"),
+    (re.compile(r"\.{2,}"), r" \g<0> "),
+    (re.compile(r"([^'])' "), r"\1 ' "),
+    (re.compile(r"--"), r" -- "),
+    (re.compile(r"''"), " '' "),
+    (re.compile(r"([^' ])('[sS]|'[mM]|'[dD]|') "), r"\1 \2 "),
+    (re.compile(r"([^' ])('ll|'LL|'re|'RE|'ve|'VE|n't|N'T) "), r"\1 \2 "),
+]
+
+# English contractions split by NLTK
+_CONTRACTIONS = {
+    'cannot': ('can', 'not'),
+    'gimme': ('gim', 'me'),
+    'gonna': ('gon', 'na'),
+    'gotta': ('got', 'ta'),
+    'lemme': ('lem', 'me'),
+    'wanna': ('wan', 'na'),
+}
+
+
+def _split_sentence_period(match) -> str:
+    """
+    Splits the period from its word when it ends a sentence, approximating the
+    decisions of the Punkt sentence tokenizer from the case of the next word:
+    - an abbreviation ends a sentence when the next word is capitalized (etc. Nous);
+    - a single letter does not when the next word is lowercase, nor when it is an
+      uppercase initial followed by a capitalized word (J. Dupont);
+    - any other word ends a sentence.
+    """
+    word, next_char = match.group(1), match.group(2)
+    typ = word.lstrip(_LEADING_PUNCTUATION).lower()
+    if typ in FRENCH_ABBREVIATIONS or typ.rsplit('-', 1)[-1] in FRENCH_ABBREVIATIONS:
+        ends_sentence = next_char.isupper()
+    elif len(typ) == 1 and typ.isalpha():
+        ends_sentence = not next_char.islower() and not (word[-1].isupper() and next_char.isupper())
+    else:
+        ends_sentence = True
+    return word + ' ' if ends_sentence else match.group(0)
+
+
+def _split_words(phrases, split_elisions: bool) -> list:
+    """Words of a batch of phrases as the NLTK word tokenizer splits them, phrases separated by '\\x00'."""
+    text = _PHRASE_SEPARATOR.join(phrases)
+    if split_elisions:
+        text = _ELISION_RE.sub(' ', text)
+    text = _END_PERIOD_RE.sub(r'\1 ', text)
+    text = _PERIOD_RE.sub(_split_sentence_period, text)
+    text = ' ' + ' '.join(text.translate(_SEPARATORS).split()) + ' '
+    for regexp, substitution in _CHUNK_RULES:
+        text = regexp.sub(substitution, text)
+    return text.split()
+
+
+def _filter_words(words: list) -> list:
+    """Lowercased alphabetic words that are not stopwords, with English contractions split."""
+    tokens = []
+    for word in words:
+        if not word.isalpha():
+            continue
+        word = word.lower()
+        if word in _CONTRACTIONS:
+            tokens.extend(part for part in _CONTRACTIONS[word] if part not in FRENCH_STOPWORDS)
+        elif word not in FRENCH_STOPWORDS:
+            tokens.append(word)
+    return tokens
+
+
+def tokenize_batch(phrases, split_elisions: bool = False) -> list:
+    """
+    Fast equivalent of tokenize_nltk over a batch of phrases.
+
+    The phrases are joined and go through a few precompiled regexes and a
+    translate table instead of the sentence and word tokenizers of NLTK:
+    - the periods that end a sentence are split from their word, approximating
+      the French sentence tokenizer with FRENCH_ABBREVIATIONS;
+    - the characters NLTK always isolates are turned into spaces;
+    - the NLTK rules that can still isolate an alphabetic word from the
+      remaining chunks run once on the whole text (apostrophes, ':' and ',', '--'...).
+    As with NLTK, words glued to an ASCII apostrophe (l'État) or a hyphen are
+    not alphabetic and are dropped, while the typographic apostrophe (l’État)
+    is split.
+
+    Args:
+        phrases: Iterable of speech paragraphs
+        split_elisions: If True, also remove elided words written with an ASCII
+                        apostrophe (l'État gives état) instead of dropping the word
+
+    Returns:
+        The lowercased alphabetic tokens that are not stopwords, in order
+    """
+    return _filter_words(_split_words(phrases, split_elisions))
+
+
+def tokenize_phrases(phrases, split_elisions: bool = False) -> list:
+    """
+    Fast tokenizer over a batch of phrases, keeping the tokens of each phrase
+    apart (see tokenize_batch).
+
+    Args:
+        phrases: Sequence of speech paragraphs
+        split_elisions: If True, also remove elided words written with an ASCII apostrophe
+
+    Returns:
+        One list of tokens per phrase
+    """
+    words = _split_words(phrases, split_elisions)
+    tokens = []
+    start = 0
+    for end, word in enumerate(words):
+        if word == '\x00':
+            tokens.append(_filter_words(words[start:end]))
+            start = end + 1
+    tokens.append(_filter_words(words[start:]))
+    return tokens
+
+
+def tokenize_fast(phrase: str, split_elisions: bool = False) -> list:
+    """Fast equivalent of tokenize_nltk for one phrase (see tokenize_batch)."""
+    return tokenize_batch([phrase], split_elisions)
+
+
+def tokenize_each(phrases, tokenizer: str = 'nltk') -> list:
+    """
+    Filtered tokens of each phrase, batched for the fast tokenizers.
+
+    Args:
+        phrases: Sequence of speech paragraphs
+        tokenizer: Name of the tokenizer (see TOKENIZERS)
+
+    Returns:
+        One list of tokens per phrase
+    """
+    if tokenizer not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {list(TOKENIZERS)}")
+    if tokenizer == 'nltk':
+        return [tokenize_nltk(phrase) for phrase in phrases]
+    return tokenize_phrases(phrases, split_elisions=tokenizer == 'fast-elisions')
+
+
+def count_tokens(speeches, tokenizer: str = 'nltk') -> Counter:
+    """
+    Counts the filtered tokens of some speeches.
+
+    Args:
+        speeches: Iterable of speech texts
+        tokenizer: Name of the tokenizer (see TOKENIZERS)
+
+    Returns:
+        A Counter of tokens
+    """
+    if tokenizer not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer {tokenizer!r}, expected one of {list(TOKENIZERS)}")
+
+    counter = Counter()
+    if tokenizer == 'nltk':
+        for phrase in speeches:
+            counter.update(tokenize_nltk(phrase))
+        return counter
+
+    split_elisions = tokenizer == 'fast-elisions'
+    batch = []
+    for phrase in speeches:
+        batch.append(phrase)
+        if len(batch) == BATCH_SIZE:
+            counter.update(tokenize_batch(batch, split_elisions))
+            batch = []
+    counter.update(tokenize_batch(batch, split_elisions))
+    return counter
+
+
+def speeches_digest(speeches, tokenizer: str = 'nltk') -> str:
+    """
+    Hash identifying the token counts of some speeches.
+
+    Args:
+        speeches: Iterable of speech texts, in order
+        tokenizer: Name of the tokenizer producing the counts
+
+    Returns:
+        The hexadecimal SHA-256 of the tokenizer name and version and of the speeches
+    """
+    digest = hashlib.sha256(f"{tokenizer}:{TOKENIZERS[tokenizer]}".encode('utf-8') + b'\0')
+    for phrase in speeches:
+        data = phrase.encode('utf-8')
+        digest.update(len(data).to_bytes(8, 'little'))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class TokenCountCache:
+    """
+    SQLite file mapping a speeches_digest to the token Counter it produced.
+
+    Entries are keyed by content only, so they are shared by every legislature
+    and community assignment.
+    """
+
+    def __init__(self, cache_path: str):
+        cache_dir = os.path.dirname(cache_path)
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+        self.path = cache_path
+        self.conn = sqlite3.connect(cache_path)
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS token_counts (digest TEXT PRIMARY KEY, counts TEXT)")
+
+    def get_many(self, digests) -> dict:
+        """Returns the cached Counters of the digests that are present."""
+        digests = list(digests)
+        found = {}
+        # Stay below the SQLite limit on query parameters
+        for start in range(0, len(digests), 500):
+            batch = digests[start:start + 500]
+            query = f"SELECT digest, counts FROM token_counts WHERE digest IN ({','.join('?' * len(batch))})"
+            for digest, counts in self.conn.execute(query, batch):
+                found[digest] = Counter(json.loads(counts))
+        return found
+
+    def put_many(self, counters: dict) -> None:
+        """Stores Counters keyed by digest."""
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO token_counts VALUES (?, ?)",
+                                  ((digest, json.dumps(counter, ensure_ascii=False))
+                                   for digest, counter in counters.items()))
+
+    def close(self) -> None:
+        self.conn.close()
+
+
+@lru_cache(maxsize=None)
+def _open_corpus(store_path: str):
+    """Speech corpus opened once per worker process."""
+    return load_speech_corpus(store_path)
+
+
+def _count_deputy_tokens(task: tuple) -> Counter:
+    """Worker: token Counter of one deputy, read from the corpus folder."""
+    store_path, acteur_id, tokenizer = task
+    return count_tokens(_open_corpus(store_path).deputy_speeches(acteur_id), tokenizer)
+
+
+def deputy_token_counts(corpus, deputy_ids, tokenizer: str = 'nltk', workers: int = 1,
+                        cache_path: str = DEFAULT_TOKEN_CACHE) -> dict:
+    """
+    Computes the filtered token Counter of each deputy.
+
+    Tokenization does not depend on the communities: the Counter of a deputy is
+    cached under the hash of their speeches, and only deputies whose speeches are
+    new or changed are tokenized, over a process pool.
+
+    Args:
+        corpus: The SpeechCorpus of the legislature
+        deputy_ids: The deputies to process
+        tokenizer: Name of the tokenizer (see TOKENIZERS)
+        workers: Number of worker processes, 1 runs in the current process
+        cache_path: SQLite cache file, None disables the cache
+
+    Returns:
+        Dictionary with deputy ids as keys and token Counters as values
+    """
+    digests = {acteur_id: speeches_digest(corpus.deputy_speeches(acteur_id), tokenizer)
+               for acteur_id in dict.fromkeys(deputy_ids)}
+
+    cache = TokenCountCache(cache_path) if cache_path else None
+    counters = cache.get_many(set(digests.values())) if cache else {}
+
+    # One deputy per distinct missing digest
+    todo = {}
+    for acteur_id, digest in digests.items():
+        if digest not in counters:
+            todo.setdefault(digest, acteur_id)
+    cached = sum(1 for digest in digests.values() if digest in counters)
+    print(f"Tokenizing {len(todo)} deputees ({cached} from cache)")
+
+    tasks = [(corpus.path, acteur_id, tokenizer) for acteur_id in todo.values()]
+    if workers <= 1 or len(tasks) <= 1:
+        results = [_count_deputy_tokens(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_count_deputy_tokens, tasks,
+                                        chunksize=max(1, len(tasks) // (workers * 8))))
+
+    computed = dict(zip(todo, results))
+    counters.update(computed)
+    if cache:
+        cache.put_many(computed)
+        cache.close()
+
+    return {acteur_id: Counter(counters[digest]) for acteur_id, digest in digests.items()}
+
+
+def compare_tokenizers(phrases: list, split_elisions: bool = False) -> dict:
+    """
+    Checks the fast tokenizer against the NLTK one on the same phrases, and times both.
+
+    Args:
+        phrases: Speech paragraphs
+        split_elisions: Compare the fast-elisions tokenizer instead of the compatible one
+
+    Returns:
+        A dictionary with the number of phrases tokenized identically, the total
+        number of tokens of each tokenizer, the most common tokens found by only
+        one of them and the time taken by each
+    """
+    start = time.perf_counter()
+    nltk_tokens = [tokenize_nltk(phrase) for phrase in phrases]
+    nltk_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    tokenize_batch(phrases, split_elisions)
+    fast_seconds = time.perf_counter() - start
+
+    fast_tokens = [tokenize_fast(phrase, split_elisions) for phrase in phrases]
+    nltk_counts = Counter(token for tokens in nltk_tokens for token in tokens)
+    fast_counts = Counter(token for tokens in fast_tokens for token in tokens)
+
+    return {
+        'phrases': len(phrases),
+        'identical_phrases': sum(a == b for a, b in zip(nltk_tokens, fast_tokens)),
+        'nltk_tokens': sum(nltk_counts.values()),
+        'fast_tokens': sum(fast_counts.values()),
+        'only_nltk': (nltk_counts - fast_counts).most_common(10),
+        'only_fast': (fast_counts - nltk_counts).most_common(10),
+        'nltk_seconds': nltk_seconds,
+        'fast_seconds': fast_seconds,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the fast tokenizer with NLTK on a sample of speeches "
+                                                 "and time both.")
+    parser.add_argument('corpus', help="speech corpus folder (e.g. data/processed/deputees_17_speeches)")
+    parser.add_argument('--sample', type=int, default=5000, help="number of speeches compared (default: 5000)")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the sample (default: 0)")
+    parser.add_argument('--split-elisions', action='store_true', help="compare the fast-elisions tokenizer")
+    args = parser.parse_args()
+
+    _, nltk_stopwords = _nltk_french()
+    if nltk_stopwords != FRENCH_STOPWORDS:
+        print(f"⚠️ The embedded stopwords differ from NLTK: missing {sorted(nltk_stopwords - FRENCH_STOPWORDS)}, "
+              f"extra {sorted(FRENCH_STOPWORDS - nltk_stopwords)}")
+
+    corpus = load_speech_corpus(args.corpus)
+    indices = sorted(random.Random(args.seed).sample(range(len(corpus)), min(args.sample, len(corpus))))
+    phrases = [corpus.speech(i) for i in indices]
+
+    stats = compare_tokenizers(phrases, args.split_elisions)
+    print(f"Phrases tokenized identically: {stats['identical_phrases']}/{stats['phrases']} "
+          f"({100 * stats['identical_phrases'] / max(stats['phrases'], 1):.2f}%)")
+    print(f"Tokens: NLTK {stats['nltk_tokens']}, fast {stats['fast_tokens']}")
+    print(f"Only NLTK: {stats['only_nltk']}")
+    print(f"Only fast: {stats['only_fast']}")
+    print(f"NLTK: {stats['nltk_seconds']:.2f}s, fast: {stats['fast_seconds']:.2f}s "
+          f"({stats['nltk_seconds'] / max(stats['fast_seconds'], 1e-9):.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,447 @@
+import os
+import ast
+import json
+import time
+import hashlib
+import argparse
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import communities
+import covote
+import ctf_idf
+import extract_cr
+import extract_deputees
+import extract_vote
+import instrumentation
+import nlp_tokens
+from actor_index import ACTORS_ROOT, DEFAULT_CACHE_PATH
+from graph_cache import DEFAULT_GRAPH_CACHE
+from legislatures import LEGISLATURE_CONFIGS
+from manifest import file_digest
+from speech_corpus import corpus_path, load_speech_corpus
+
+PIPELINE_STATE_VERSION = 1
+
+# A stage of the pipeline. inputs and outputs map a legislature config to the paths it reads
+# and writes, params maps the options to those its outputs depend on, run does the work. The source
+# files of its modules, and of the modules of this repository they import, are inputs too, so a
+# stage also runs again when its code changes.
+Stage = namedtuple('Stage', ['name', 'depends', 'applies', 'modules', 'inputs', 'outputs', 'params', 'run'])
+
+
+class PipelineState:
+    """
+    Records, for each stage of a legislature, the hash of the inputs and
+    parameters it last ran with and the hash of the outputs it wrote, so that a
+    stage is skipped while neither changed.
+
+    File hashes are cached under their size and mtime: an unchanged file is
+    not read again. The state is a single JSON file per legislature.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.stages = {}
+        self.digests = {}
+        self.changed = False
+
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == PIPELINE_STATE_VERSION:
+                    self.stages = data.get('stages', {})
+                    self.digests = data.get('digests', {})
+                else:
+                    print(f"Ignoring pipeline state {path} written by another version")
+            except json.JSONDecodeError as e:
+                print(f"Ignoring unreadable pipeline state {path}: {e}")
+
+    def _file_digest(self, path: str) -> str:
+        """SHA-256 of a file, only recomputed when its size or mtime changed."""
+        stat = os.stat(path)
+        entry = self.digests.get(path)
+        if entry is not None and entry[0] == stat.st_size and entry[1] == stat.st_mtime_ns:
+            return entry[2]
+        digest = file_digest(path)
+        self.digests[path] = [stat.st_size, stat.st_mtime_ns, digest]
+        self.changed = True
+        return digest
+
+    def fingerprint(self, path: str) -> str or None:
+        """
+        Content hash of a file, or of the files of a folder (hidden files such as
+        download caches and subfolders are left out).
+
+        Returns:
+            The hexadecimal digest, or None if the path does not exist
+        """
+        path = os.path.normpath(path)
+        if os.path.isfile(path):
+            return self._file_digest(path)
+        if not os.path.isdir(path):
+            return None
+        digest = hashlib.sha256()
+        for entry in sorted(os.scandir(path), key=lambda entry: entry.name):
+            if entry.is_file() and not entry.name.startswith('.'):
+                digest.update(f"{entry.name}\0{self._file_digest(entry.path)}\n".encode('utf-8'))
+        return digest.hexdigest()
+
+    def stage_key(self, stage: str, inputs: list, params: dict) -> str:
+        """Hash of the name, the input fingerprints and the parameters of a stage run."""
+        record = {
+            'stage': stage,
+            'inputs': {os.path.normpath(path): self.fingerprint(path) for path in inputs},
+            'params': params,
+        }
+        return hashlib.sha256(json.dumps(record, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def is_fresh(self, stage: str, key: str, outputs: list) -> bool:
+        """True if the stage last ran with this key and its outputs were not changed since."""
+        entry = self.stages.get(stage)
+        if entry is None or entry['key'] != key:
+            return False
+        for path in outputs:
+            fingerprint = self.fingerprint(path)
+            if fingerprint is None or entry['outputs'].get(os.path.normpath(path)) != fingerprint:
+                return False
+        return True
+
+    def record(self, stage: str, key: str, outputs: list) -> None:
+        """Records a successful run of a stage and the fingerprints of its outputs."""
+        self.stages[stage] = {
+            'key': key,
+            'outputs': {os.path.normpath(path): self.fingerprint(path) for path in outputs},
+            'time': time.time(),
+        }
+        self.changed = True
+
+    def save(self) -> None:
+        """Writes the state if it changed, replacing the previous file atomically."""
+        if not self.changed:
+            return
+        state_dir = os.path.dirname(self.path)
+        if state_dir:
+            os.makedirs(state_dir, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': PIPELINE_STATE_VERSION, 'stages': self.stages, 'digests': self.digests}, f)
+        os.replace(tmp_path, self.path)
+        self.changed = False
+
+
+def module_sources(modules: list) -> list:
+    """
+    Source files of some modules and of every module of this repository they
+    import, directly or through other modules.
+
+    Args:
+        modules: The modules a stage runs
+
+    Returns:
+        The sorted paths of the .py files
+    """
+    sources = set()
+    pending = [module.__file__ for module in modules]
+    while pending:
+        path = os.path.normpath(pending.pop())
+        if path in sources:
+            continue
+        sources.add(path)
+        with open(path, 'r', encoding='utf-8') as f:
+            tree = ast.parse(f.read(), filename=path)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and not node.level and node.module:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                # Only the modules next to this one, third-party packages are not followed
+                candidate = os.path.join(os.path.dirname(path), name.split('.')[0] + '.py')
+                if os.path.isfile(candidate):
+                    pending.append(candidate)
+    return sorted(sources)
+
+
+def _download_cr(config: dict, options: dict) -> None:
+    extract_cr.download_all_compte_rendus(config['vote_path'], config['cr_path'], delay=options['delay'],
+                                          workers=options['http_workers'])
+
+
+def _extract_votes(config: dict, options: dict) -> None:
+    extract_vote.process_legislature(config, streaming=options['streaming'], workers=options['stage_workers'])
+
+
+def _extract_deputees(config: dict, options: dict) -> None:
+    extract_deputees.actor_index_cache = options['actor_cache']
+    extract_deputees.process_legislature(config, streaming=options['streaming'], workers=options['stage_workers'])
+
+
+def _build_graph(config: dict, options: dict) -> None:
+    with open(config['deputees_output'], 'r', encoding='utf-8') as f:
+        deputies = json.load(f)
+    votes = covote.load_votes(config['vote_output'])
+    deputy_index, weights = covote.covote_matrix(votes, deputy_ids=deputies.keys())
+    edges = covote.covote_edges(deputy_index, weights, options['k'])
+    covote.save_covote_graph(config['graph_output'], deputy_index, edges, options['k'])
+    print(f"✅ Saved the co-vote graph of k = {options['k']} ({len(deputy_index)} deputees, {len(edges)} edges) "
+          f"to {config['graph_output']}")
+
+
+def _detect_communities(config: dict, options: dict) -> None:
+    communities.detect_communities(config['graph_output'], config['communities_output'],
+                                   resolutions=options['resolutions'], n_seeds=options['seeds'],
+                                   seed=options['seed'], resolution=options['resolution'],
+                                   threshold=options['consensus_threshold'], workers=options['stage_workers'],
+                                   cache_path=options['graph_cache'] or None)
+
+
+def _score_terms(config: dict, options: dict) -> None:
+    with open(config['communities_output'], 'r', encoding='utf-8') as f:
+        communities = json.load(f)
+    corpus = load_speech_corpus(corpus_path(config['deputees_output']))
+    deputy_words = nlp_tokens.deputy_token_counts(corpus, [deputy_id for community in communities
+                                                           for deputy_id in community],
+                                                  tokenizer=options['tokenizer'], workers=options['stage_workers'])
+    top_terms = []
+    if communities:
+        term_matrix = ctf_idf.TermMatrix.from_counters(deputy_words)
+        top_terms = term_matrix.top_terms(communities, n=options['top'], method=options['method'])
+    else:
+        print(f"⚠️ No communities in {config['communities_output']}")
+    with open(config['terms_output'], 'w', encoding='utf-8') as f:
+        json.dump(top_terms, f, indent=1, ensure_ascii=False)
+    print(f"✅ Saved the {options['top']} best terms of {len(communities)} communities to {config['terms_output']}")
+
+
+def _actor_folders() -> list:
+    return [os.path.join(ACTORS_ROOT, 'acteur'), os.path.join(ACTORS_ROOT, 'organe')]
+
+
+# Stages in dependency order: every stage comes after the stages it depends on
+STAGES = [
+    Stage('download_cr', [], lambda config: bool(config['cr_path']), [extract_cr],
+          lambda config: [config['vote_path']],
+          lambda config: [config['cr_path']],
+          lambda options: {},
+          _download_cr),
+    Stage('extract_votes', [], lambda config: True, [extract_vote],
+          lambda config: [config['vote_path']],
+          lambda config: [config['vote_output']],
+          lambda options: {},
+          _extract_votes),
+    Stage('extract_deputees', ['download_cr'], lambda config: True, [extract_deputees],
+          lambda config: [config['vote_path']] + ([config['cr_path']] if config['cr_path'] else []) + _actor_folders(),
+          lambda config: [config['deputees_output']] + ([corpus_path(config['deputees_output'])]
+                                                         if config['cr_path'] else []),
+          lambda options: {},
+          _extract_deputees),
+    Stage('graph', ['extract_votes', 'extract_deputees'], lambda config: True, [covote],
+          lambda config: [config['vote_output'], config['deputees_output']],
+          lambda config: [config['graph_output']],
+          lambda options: {'k': options['k']},
+          _build_graph),
+    Stage('communities', ['graph'], lambda config: True, [covote, communities],
+          lambda config: [config['graph_output']],
+          lambda config: [config['communities_output'], communities.stability_path(config['communities_output'])],
+          lambda options: {'resolution': options['resolution'], 'seed': options['seed'],
+                           'resolutions': sorted(options['resolutions']), 'seeds': options['seeds'],
+                           'consensus_threshold': options['consensus_threshold']},
+          _detect_communities),
+    Stage('nlp', ['communities', 'extract_deputees'], lambda config: bool(config['terms_output']),
+          [nlp_tokens, ctf_idf],
+          lambda config: [config['communities_output'], corpus_path(config['deputees_output'])],
+          lambda config: [config['terms_output']],
+          lambda options: {'top': options['top'], 'method': options['method'], 'tokenizer': options['tokenizer']},
+          _score_terms),
+]
+STAGE_NAMES = [stage.name for stage in STAGES]
+
+
+def run_legislature(legislature_num: str, stages: list = None, options: dict = None, force: list = ()) -> dict:
+    """
+    Runs the stages of a legislature in dependency order, skipping the stages
+    whose inputs, parameters and code did not change since their last run.
+
+    A stage whose dependency failed is not run. Stages that are not selected
+    are not run either: the stages after them use the artifacts already on disk.
+
+    Args:
+        legislature_num: A LEGISLATURE_CONFIGS key
+        stages: Names of the stages to run (default: all)
+        options: Stage options, see main() (default: the command line defaults)
+        force: Names of the stages to run even when they are up to date
+
+    Returns:
+        Dictionary with stage names as keys and (status, seconds) tuples as values,
+        status being 'ran', 'skipped', 'failed', 'blocked' or 'n/a'
+    """
+    config = LEGISLATURE_CONFIGS[legislature_num]
+    options = options or default_options()
+    stages = STAGE_NAMES if stages is None else stages
+    state = PipelineState(config['pipeline_state'])
+    # Worker processes do not inherit the settings of the parent under the spawn start method
+    instrumentation.configure(options.get('metrics'), options.get('profile'), options.get('tracemalloc'))
+
+    status = {}
+    for stage in STAGES:
+        if stage.name not in stages:
+            continue
+        if not stage.applies(config):
+            status[stage.name] = ('n/a', 0.0)
+            continue
+        if any(status.get(dependency, ('',))[0] in ('failed', 'blocked') for dependency in stage.depends):
+            print(f"⚠️ [{legislature_num}] {stage.name} not run, a stage it depends on failed")
+            status[stage.name] = ('blocked', 0.0)
+            continue
+
+        inputs = stage.inputs(config)
+        missing = [path for path in inputs if not os.path.exists(path)]
+        if missing:
+            print(f"❌ [{legislature_num}] {stage.name}: missing input {', '.join(missing)}")
+            status[stage.name] = ('failed', 0.0)
+            continue
+
+        outputs = stage.outputs(config)
+        key = state.stage_key(stage.name, inputs + module_sources(stage.modules),
+                              stage.params(options))
+        if stage.name not in force and state.is_fresh(stage.name, key, outputs):
+            print(f"[{legislature_num}] {stage.name} is up to date")
+            status[stage.name] = ('skipped', 0.0)
+            continue
+
+        print(f"\n[{legislature_num}] Running {stage.name}...")
+        start = time.perf_counter()
+        try:
+            with instrumentation.stage(stage.name, legislature=legislature_num):
+                stage.run(config, options)
+        except Exception as e:
+            print(f"❌ [{legislature_num}] Error in {stage.name}: {e}")
+            traceback.print_exc()
+            status[stage.name] = ('failed', time.perf_counter() - start)
+            continue
+        elapsed = time.perf_counter() - start
+
+        missing = [path for path in outputs if not os.path.exists(path)]
+        if missing:
+            print(f"❌ [{legislature_num}] {stage.name} did not write {', '.join(missing)}")
+            status[stage.name] = ('failed', elapsed)
+            continue
+
+        state.record(stage.name, key, outputs)
+        state.save()
+        status[stage.name] = ('ran', elapsed)
+
+    state.save()
+    return status
+
+
+def run_pipeline(legislatures: list, stages: list = None, options: dict = None, force: list = (),
+                 workers: int = 1) -> dict:
+    """
+    Runs the pipeline of several legislatures. They do not depend on each
+    other: each one runs its stages in its own worker process.
+
+    Args:
+        legislatures: LEGISLATURE_CONFIGS keys
+        stages: Names of the stages to run (default: all)
+        options: Stage options, see main()
+        force: Names of the stages to run even when they are up to date
+        workers: Number of legislatures processed at the same time, 1 runs them in the current process
+
+    Returns:
+        Dictionary with legislatures as keys and run_legislature results as values
+    """
+    if workers <= 1 or len(legislatures) <= 1:
+        return {num: run_legislature(num, stages, options, force) for num in legislatures}
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=min(workers, len(legislatures))) as executor:
+        futures = {executor.submit(run_legislature, num, stages, options, force): num for num in legislatures}
+        for future in as_completed(futures):
+            num = futures[future]
+            try:
+                results[num] = future.result()
+            except Exception as e:
+                print(f"❌ Error processing legislature {num}: {e}")
+                results[num] = {}
+    return {num: results[num] for num in legislatures}
+
+
+def default_options() -> dict:
+    """Stage options of a command line run without arguments."""
+    return vars(build_parser().parse_args([]))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Run the extraction, graph, community and NLP stages of "
+                                                 "several legislatures, skipping the stages that are up to date.")
+    parser.add_argument('--legislatures', nargs='+', default=list(LEGISLATURE_CONFIGS), metavar='NUM',
+                        help="legislatures to process (default: all)")
+    parser.add_argument('--stages', nargs='+', default=STAGE_NAMES, choices=STAGE_NAMES, metavar='STAGE',
+                        help=f"stages to run, among {', '.join(STAGE_NAMES)} (default: all)")
+    parser.add_argument('--force', nargs='*', choices=STAGE_NAMES, default=None, metavar='STAGE',
+                        help="run these stages even if they are up to date (every selected stage if none is given)")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="number of legislatures processed at the same time (default: 1)")
+    parser.add_argument('--stage-workers', type=int, default=1,
+                        help="number of processes of the extraction and tokenization stages (default: 1)")
+    parser.add_argument('--http-workers', type=int, default=8,
+                        help="maximum number of concurrent compte rendu requests (default: 8)")
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help="minimum delay between two compte rendu requests in seconds (default: 0)")
+    parser.add_argument('--streaming', action='store_true',
+                        help="read single-file dumps (legislature 14) one scrutin at a time")
+    parser.add_argument('--actor-cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"persist the actor/organe index to a SQLite file (default: {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--k', type=float, default=0.3, help="co-vote percentage threshold (default: 0.3)")
+    parser.add_argument('--resolution', type=float, default=1.0,
+                        help="Louvain resolution of the consensus communities (default: 1.0)")
+    parser.add_argument('--resolutions', nargs='+', type=float, default=list(communities.RESOLUTIONS), metavar='R',
+                        help="resolutions of the community stability sweep "
+                             f"(default: {' '.join(map(str, communities.RESOLUTIONS))})")
+    parser.add_argument('--seeds', type=int, default=communities.N_SEEDS,
+                        help=f"Louvain seeds per resolution (default: {communities.N_SEEDS})")
+    parser.add_argument('--seed', type=int, default=0, help="first Louvain seed (default: 0)")
+    parser.add_argument('--consensus-threshold', type=float, default=communities.CONSENSUS_THRESHOLD,
+                        help="minimum fraction of the Louvain runs grouping two deputees for them to be linked "
+                             f"in the consensus graph (default: {communities.CONSENSUS_THRESHOLD})")
+    parser.add_argument('--graph-cache', default=DEFAULT_GRAPH_CACHE,
+                        help=f"SQLite cache of the Louvain runs, '' to disable it (default: {DEFAULT_GRAPH_CACHE})")
+    parser.add_argument('--top', type=int, default=100, help="terms kept per community (default: 100)")
+    parser.add_argument('--method', choices=['tf-idf', 'ctf-idf'], default='ctf-idf',
+                        help="term scoring (default: ctf-idf)")
+    parser.add_argument('--tokenizer', choices=list(nlp_tokens.TOKENIZERS), default='nltk',
+                        help="tokenizer of the speeches (default: nltk; 'fast' is 6-8x faster but "
+                             "splits ~5%% of phrases differently, see python nlp_tokens.py)")
+    instrumentation.add_arguments(parser)
+    return parser
+
+
+def main():
+    args = build_parser().parse_args()
+    # --force without stage names forces every selected stage
+    force = args.stages if args.force == [] else args.force or []
+    options = vars(args)
+
+    results = run_pipeline(args.legislatures, args.stages, options, force, args.workers)
+
+    summary = pd.DataFrame({num: {stage: f"{state} ({seconds:.1f}s)" if state == 'ran' else state
+                                  for stage, (state, seconds) in status.items()}
+                            for num, status in results.items()}).T.reindex(columns=args.stages)
+    print(f"\n\n{'='*60}")
+    print(summary.fillna('-').to_string())
+    print(f"{'='*60}")
+
+    if any(state == 'failed' for status in results.values() for state, _ in status.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
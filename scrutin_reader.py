@@ -0,0 +1,237 @@
+import os
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+
+# Size of the blocks read from disk by the streaming reader
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = ' \t\n\r'
+
+# Characters that may follow a number, true, false or null
+_SCALAR_END = re.compile(r'[\s,\]}]')
+
+
+class _JsonStream:
+    """
+    Minimal pull reader over a JSON text file.
+
+    Only the part of the document currently being decoded is kept in memory,
+    values are decoded one at a time with json.JSONDecoder.raw_decode.
+    """
+
+    def __init__(self, f, chunk_size: int):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self) -> bool:
+        """Reads the next block, dropping what has already been consumed."""
+        if self.eof:
+            return False
+        # Read at least as much as we already hold so large values are decoded in few retries
+        chunk = self.f.read(max(self.chunk_size, len(self.buffer) - self.pos))
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Returns the next non-whitespace character without consuming it ('' at end of file)."""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        """Consumes the next non-whitespace character, which must be char."""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buffer, self.pos)
+        self.pos += 1
+
+    def decode_value(self):
+        """Decodes and consumes the next complete JSON value."""
+        if self.peek() not in '{["':
+            # Scalars have no closing character, make sure the whole token is buffered
+            while not _SCALAR_END.search(self.buffer, self.pos) and self._fill():
+                pass
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # The value may simply be cut by the end of the buffer
+                if self._fill():
+                    continue
+                raise
+            self.pos = end
+            return value
+
+    def enter_key(self, key: str) -> bool:
+        """
+        Moves inside the object starting at the current position, right before
+        the value of key. Other members are decoded and discarded.
+
+        Returns:
+            True if key was found, False if the object does not contain it
+        """
+        self.expect('{')
+        if self.peek() == '}':
+            return False
+        while True:
+            name = self.decode_value()
+            self.expect(':')
+            if name == key:
+                return True
+            self.decode_value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == '}':
+                return False
+            if separator != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", self.buffer, self.pos - 1)
+
+
+def iter_scrutins_eager(file_path: str):
+    """
+    Yields the scrutins of a single-file dump (legislature 14) after loading
+    the whole document with json.load.
+
+    Args:
+        file_path: The path to the JSON file
+
+    Yields:
+        One scrutin dictionary at a time
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        json_data = json.load(f)
+
+    scrutins_list = json_data.get("scrutins", {}).get("scrutin", [])
+
+    if not isinstance(scrutins_list, list):
+        print(f"Warning: 'scrutin' is not a list in {file_path}")
+        return
+
+    print(f"Found {len(scrutins_list)} votes in file")
+    yield from scrutins_list
+
+
+def iter_scrutins_streaming(file_path: str, chunk_size: int = CHUNK_SIZE):
+    """
+    Yields the scrutins of a single-file dump (legislature 14) incrementally.
+
+    The file is read block by block and only the scrutin being decoded is held
+    in memory, so peak memory is bounded by the size of a single vote instead
+    of the size of the whole dump.
+
+    Args:
+        file_path: The path to the JSON file
+        chunk_size: Number of characters read from disk at a time
+
+    Yields:
+        One scrutin dictionary at a time
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        stream = _JsonStream(f, chunk_size)
+
+        if not stream.enter_key("scrutins") or not stream.enter_key("scrutin"):
+            return
+
+        if stream.peek() != '[':
+            print(f"Warning: 'scrutin' is not a list in {file_path}")
+            return
+
+        stream.expect('[')
+        if stream.peek() == ']':
+            return
+
+        while True:
+            yield stream.decode_value()
+            separator = stream.peek()
+            stream.pos += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise json.JSONDecodeError("Expecting ',' delimiter", stream.buffer, stream.pos - 1)
+
+
+def iter_scrutins(file_path: str, streaming: bool = False):
+    """
+    Yields the scrutins of a single-file dump with the eager or the streaming reader.
+
+    Args:
+        file_path: The path to the JSON file
+        streaming: If True, decode the file incrementally instead of loading it at once
+
+    Yields:
+        One scrutin dictionary at a time
+    """
+    if streaming:
+        yield from iter_scrutins_streaming(file_path)
+    else:
+        yield from iter_scrutins_eager(file_path)
+
+
+def vote_sort_key(uid: str) -> tuple:
+    """
+    Sort key ordering vote uids naturally (VTANR5L17V9 before VTANR5L17V10).
+
+    Args:
+        uid: A vote uid or vote file name
+
+    Returns:
+        A tuple (prefix, number) usable with sorted()
+    """
+    match = re.match(r'^(.*?)(\d+)(\.json)?$', uid)
+    if not match:
+        return (uid, -1)
+    return (match.group(1), int(match.group(2)))
+
+
+def list_vote_files(folder: str) -> list:
+    """
+    Lists the per-vote JSON files of a legislature folder (legislatures 15, 16, 17).
+
+    Args:
+        folder: The path to the folder containing the JSON files
+
+    Returns:
+        Paths of the JSON files, in natural vote order
+    """
+    names = [entry.name for entry in os.scandir(folder) if entry.is_file() and entry.name.endswith('.json')]
+    return [os.path.join(folder, name) for name in sorted(names, key=vote_sort_key)]
+
+
+def map_files(paths: list, func, workers: int = 1, chunksize: int = None) -> list:
+    """
+    Applies func to every file (vote or compte rendu), serially or over a process pool.
+
+    Args:
+        paths: Paths of the files
+        func: Top-level (picklable) function taking a path
+        workers: Number of worker processes, 1 runs in the current process
+        chunksize: Number of files sent to a worker at a time (default: about
+                   8 chunks per worker)
+
+    Returns:
+        The results of func, in the order of paths
+    """
+    if workers <= 1 or len(paths) <= 1:
+        return [func(path) for path in paths]
+
+    if chunksize is None:
+        chunksize = max(1, len(paths) // (workers * 8))
+
+    # The events the workers record are sent back with their results
+    task = instrumentation.recorded(func)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return instrumentation.merge_results(executor.map(task, paths, chunksize=chunksize), task)
@@ -0,0 +1,367 @@
+import json
+import math
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import networkx as nx
+import scipy.sparse as sp
+from scipy.stats import norm
+
+from covote import load_covote_graph
+
+# Default ensemble: replicates per null model, and successful double edge swaps per edge
+# of a degree-preserving replicate
+N_REPLICATES = 20
+SWAPS_PER_EDGE = 10
+NULL_MODELS = ('erdos_renyi', 'configuration')
+
+# Sources explored together by the BFS: each one holds a column of the n × chunk frontier
+BFS_CHUNK = 256
+
+# Edges of the graph of the worker processes, sent once per worker by the pool initializer
+_worker_edges = None
+
+
+def _init_worker(n: int, rows: np.ndarray, cols: np.ndarray) -> None:
+    global _worker_edges
+    _worker_edges = (n, rows, cols)
+
+
+def edge_arrays(G) -> tuple:
+    """
+    Nodes and edges of an undirected graph as integer arrays, self-loops left out.
+
+    Args:
+        G: A networkx graph
+
+    Returns:
+        A tuple (nodes, rows, cols): the nodes in the order of G and the node
+        positions of each edge, rows < cols
+    """
+    nodes = list(G)
+    index = {node: i for i, node in enumerate(nodes)}
+    pairs = np.array([(index[u], index[v]) for u, v in G.edges() if u != v], dtype=np.int64).reshape(-1, 2)
+    return nodes, pairs.min(axis=1), pairs.max(axis=1)
+
+
+def csr_adjacency(n: int, rows: np.ndarray, cols: np.ndarray) -> sp.csr_matrix:
+    """Symmetric 0/1 adjacency matrix of an edge list, as float32 CSR."""
+    data = np.ones(2 * len(rows), dtype=np.float32)
+    A = sp.csr_matrix((data, (np.concatenate([rows, cols]), np.concatenate([cols, rows]))), shape=(n, n))
+    A.sum_duplicates()
+    A.data[:] = 1
+    return A
+
+
+def _bfs_distance_sums(A: sp.csr_matrix, sources: np.ndarray) -> tuple:
+    """
+    Level-synchronous BFS from several sources at once: the frontier of every
+    source is a column of a dense matrix, expanded by one product with the
+    CSR adjacency per level.
+
+    Returns:
+        A tuple (sums, reached): for each source, the sum of the distances to
+        the nodes it reaches and the number of these nodes (itself excluded)
+    """
+    n, k = A.shape[0], len(sources)
+    visited = np.zeros((n, k), dtype=bool)
+    visited[sources, np.arange(k)] = True
+    frontier = visited.astype(np.float32)
+    sums = np.zeros(k)
+    reached = np.zeros(k, dtype=np.int64)
+    depth = 0
+    while True:
+        depth += 1
+        found = (A @ frontier > 0) & ~visited
+        new = found.sum(axis=0)
+        if not new.any():
+            return sums, reached
+        sums += depth * new
+        reached += new
+        visited |= found
+        frontier = found.astype(np.float32)
+
+
+def average_path_length(A: sp.csr_matrix, n_sources: int = None, seed: int = 0, confidence: float = 0.95) -> dict:
+    """
+    Average shortest path length of an unweighted graph by BFS over its CSR
+    adjacency, from every node (same value as nx.average_shortest_path_length
+    on a connected graph) or from a uniform sample of source nodes.
+
+    A sampled estimate comes with a normal confidence interval built from the
+    mean distance of each source, with the finite population correction. On a
+    disconnected graph, the distances are averaged over the pairs of nodes
+    connected by a path.
+
+    Args:
+        A: Symmetric adjacency matrix
+        n_sources: Number of sampled sources, None (or n or more) for the exact value
+        seed: Seed of the source sample
+        confidence: Level of the confidence interval
+
+    Returns:
+        Dictionary with the value, its standard error and confidence interval
+        (zero width when exact) and the number of sources
+    """
+    n = A.shape[0]
+    exact = n_sources is None or n_sources >= n
+    sources = np.arange(n) if exact else np.sort(np.random.default_rng(seed).choice(n, n_sources, replace=False))
+    if n < 2 or not len(sources):
+        return {'value': 0.0, 'stderr': 0.0, 'ci': [0.0, 0.0], 'sources': int(len(sources))}
+
+    sums, reached = np.zeros(len(sources)), np.zeros(len(sources), dtype=np.int64)
+    for start in range(0, len(sources), BFS_CHUNK):
+        chunk = slice(start, start + BFS_CHUNK)
+        sums[chunk], reached[chunk] = _bfs_distance_sums(A, sources[chunk])
+
+    value = sums.sum() / reached.sum() if reached.sum() else 0.0
+    stderr = 0.0
+    if not exact:
+        connected = reached > 0
+        means = sums[connected] / reached[connected]
+        k = len(means)
+        if k > 1:
+            stderr = float(means.std(ddof=1) / math.sqrt(k) * math.sqrt((n - k) / (n - 1)))
+    half_width = norm.ppf(0.5 + confidence / 2) * stderr
+    return {'value': float(value), 'stderr': stderr, 'ci': [float(value - half_width), float(value + half_width)],
+            'sources': int(len(sources))}
+
+
+def average_clustering(A: sp.csr_matrix) -> float:
+    """
+    Average clustering coefficient, same value as nx.average_clustering: the
+    triangles of each node are counted by one sparse product, as the diagonal
+    of A @ A @ A restricted to the edges of A.
+
+    Args:
+        A: Symmetric 0/1 adjacency matrix without self-loops
+
+    Returns:
+        The mean over the nodes of their local clustering (0 below degree 2)
+    """
+    n = A.shape[0]
+    if n == 0:
+        return 0.0
+    # Twice the number of triangles through each node
+    closed = np.asarray((A @ A).multiply(A).sum(axis=1)).ravel()
+    degrees = np.diff(A.indptr).astype(np.float64)
+    possible = degrees * (degrees - 1)
+    local = np.divide(closed, possible, out=np.zeros(n), where=possible > 0)
+    return float(local.mean())
+
+
+def lattice_clustering(average_degree: float) -> float:
+    """
+    Clustering coefficient of a ring lattice of the same average degree,
+    3(k - 2) / 4(k - 1) (Watts & Strogatz), the reference of omega.
+    """
+    if average_degree < 2:
+        return float('nan')
+    return 3 * (average_degree - 2) / (4 * (average_degree - 1))
+
+
+def erdos_renyi_edges(n: int, m: int, rng: np.random.Generator) -> tuple:
+    """
+    Edges of a G(n, m) random graph: m distinct pairs drawn uniformly among the
+    n(n - 1)/2 pairs, each pair number being decoded to its (row, col) position
+    in the upper triangle.
+    """
+    if n < 2 or m == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    pairs = n * (n - 1) // 2
+    k = rng.choice(pairs, size=min(m, pairs), replace=False).astype(np.int64)
+    rows = (n - 2 - np.floor(np.sqrt(-8 * k + 4 * n * (n - 1) - 7) / 2 - 0.5)).astype(np.int64)
+    cols = k + rows + 1 - pairs + (n - rows) * (n - rows - 1) // 2
+    return rows, cols
+
+
+def configuration_edges(n: int, rows: np.ndarray, cols: np.ndarray, rng: np.random.Generator,
+                        swaps_per_edge: int = SWAPS_PER_EDGE) -> tuple:
+    """
+    Degree-preserving random graph: the edges are rewired by double edge swaps
+    (a-b, c-d becomes a-d, c-b) that create neither self-loops nor multi-edges,
+    which samples simple graphs of the configuration model of the degree sequence.
+
+    Args:
+        n: Number of nodes
+        rows, cols: Edges of the graph, rows < cols
+        rng: Random generator
+        swaps_per_edge: Successful swaps per edge
+
+    Returns:
+        A tuple (rows, cols, swaps), swaps being the number of swaps done (fewer
+        than asked when the graph is too dense to rewire)
+    """
+    m = len(rows)
+    if m < 2:
+        return rows.copy(), cols.copy(), 0
+    src, trg = rows.tolist(), cols.tolist()
+    edges = set(zip(src, trg))
+    target, tries, done = swaps_per_edge * m, 0, 0
+    max_tries = 100 * target
+    while done < target and tries < max_tries:
+        batch = min(max(target - done, 1024), max_tries - tries)
+        tries += batch
+        for e1, e2, flip in zip(rng.integers(m, size=batch).tolist(), rng.integers(m, size=batch).tolist(),
+                                (rng.random(batch) < 0.5).tolist()):
+            a, b = src[e1], trg[e1]
+            c, d = (trg[e2], src[e2]) if flip else (src[e2], trg[e2])
+            if a == d or c == b or a == c or b == d:
+                continue
+            new1 = (a, d) if a < d else (d, a)
+            new2 = (c, b) if c < b else (b, c)
+            if new1 in edges or new2 in edges:
+                continue
+            edges.discard((src[e1], trg[e1]))
+            edges.discard((src[e2], trg[e2]))
+            edges.add(new1)
+            edges.add(new2)
+            src[e1], trg[e1] = new1
+            src[e2], trg[e2] = new2
+            done += 1
+            if done == target:
+                break
+    return np.array(src, dtype=np.int64), np.array(trg, dtype=np.int64), done
+
+
+def _replicate(n: int, rows: np.ndarray, cols: np.ndarray, task: tuple) -> dict:
+    """Path length and clustering of one null-model replicate of the graph."""
+    model, replicate, seed, n_sources, swaps_per_edge = task
+    rng = np.random.default_rng([seed, NULL_MODELS.index(model), replicate])
+    record = {'model': model, 'replicate': replicate}
+    if model == 'erdos_renyi':
+        null_rows, null_cols = erdos_renyi_edges(n, len(rows), rng)
+    else:
+        null_rows, null_cols, record['swaps'] = configuration_edges(n, rows, cols, rng, swaps_per_edge)
+    A = csr_adjacency(n, null_rows, null_cols)
+    record['path_length'] = average_path_length(A, n_sources, seed=int(rng.integers(2 ** 31)))['value']
+    record['clustering'] = average_clustering(A)
+    return record
+
+
+def _worker_replicate(task: tuple) -> dict:
+    return _replicate(*_worker_edges, task)
+
+
+def _spread(values: np.ndarray, confidence: float) -> dict:
+    """Mean, standard deviation and central interval of replicate values."""
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return {'mean': None, 'std': None, 'interval': [None, None]}
+    tail = 100 * (1 - confidence) / 2
+    return {'mean': float(values.mean()), 'std': float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+            'interval': [float(np.percentile(values, tail)), float(np.percentile(values, 100 - tail))]}
+
+
+def small_world(G, n_replicates: int = N_REPLICATES, models=NULL_MODELS, n_sources: int = None, seed: int = 0,
+                swaps_per_edge: int = SWAPS_PER_EDGE, confidence: float = 0.95, workers: int = 1) -> dict:
+    """
+    Small-world statistics of a graph against ensembles of null-model replicates.
+
+    sigma = (C / Cr) / (L / Lr) compares the clustering C and path length L of
+    the graph with those of a random replicate, omega = Lr / L - C / Cl also
+    uses the clustering Cl of a ring lattice of the same average degree. Both
+    are computed for each replicate, so their spread over the ensemble is reported.
+
+    The replicates are G(n, m) graphs with the same number of nodes and edges
+    ('erdos_renyi') and degree-preserving rewirings ('configuration'), built
+    and measured over a process pool.
+
+    Args:
+        G: An undirected networkx graph, usually its giant component
+        n_replicates: Replicates per null model
+        models: Null models among NULL_MODELS
+        n_sources: Sampled BFS sources per path length, None for exact path lengths
+        seed: Seed of the replicates and of the source samples
+        swaps_per_edge: Double edge swaps per edge of a configuration replicate
+        confidence: Level of the path length confidence interval and of the replicate intervals
+        workers: Number of worker processes, 1 runs in the current process
+
+    Returns:
+        JSON-serializable dictionary: nodes, edges, path_length (with its
+        confidence interval), clustering, lattice_clustering, and for each
+        model the spread of its path_length, clustering, sigma and omega
+        over the replicates
+    """
+    unknown = set(models) - set(NULL_MODELS)
+    if unknown:
+        raise ValueError(f"Unknown null models {', '.join(sorted(unknown))}, expected {', '.join(NULL_MODELS)}")
+    if not nx.is_connected(G):
+        print("⚠️ The graph is not connected, path lengths are averaged over the connected pairs")
+
+    nodes, rows, cols = edge_arrays(G)
+    n, m = len(nodes), len(rows)
+    A = csr_adjacency(n, rows, cols)
+    path_length = average_path_length(A, n_sources, seed, confidence)
+    clustering = average_clustering(A)
+    lattice = lattice_clustering(2 * m / n if n else 0.0)
+
+    tasks = [(model, i, seed, n_sources, swaps_per_edge) for model in models for i in range(n_replicates)]
+    if workers <= 1 or len(tasks) <= 1:
+        records = [_replicate(n, rows, cols, task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks)), initializer=_init_worker,
+                                 initargs=(n, rows, cols)) as executor:
+            records = list(executor.map(_worker_replicate, tasks))
+
+    replicates = pd.DataFrame(records)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        replicates['sigma'] = (clustering / replicates['clustering']) / (path_length['value'] /
+                                                                          replicates['path_length'])
+        replicates['omega'] = replicates['path_length'] / path_length['value'] - clustering / lattice
+
+    result = {'nodes': n, 'edges': m, 'path_length': path_length, 'clustering': clustering,
+              'lattice_clustering': lattice, 'replicates': n_replicates, 'models': {}}
+    for model, group in replicates.groupby('model', sort=False):
+        summary = {column: _spread(group[column].to_numpy(dtype=np.float64), confidence)
+                   for column in ('path_length', 'clustering', 'sigma', 'omega')}
+        if 'swaps' in group:
+            short = int((group['swaps'] < swaps_per_edge * m).sum())
+            if short:
+                print(f"⚠️ {short} {model} replicates could not do {swaps_per_edge} swaps per edge")
+        result['models'][model] = summary
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Small-world statistics of the giant component of a co-vote graph "
+                                                 "against ensembles of random replicates.")
+    parser.add_argument('graph', help="graph_XX.json written by the pipeline graph stage")
+    parser.add_argument('--replicates', type=int, default=N_REPLICATES,
+                        help=f"replicates per null model (default: {N_REPLICATES})")
+    parser.add_argument('--models', nargs='+', choices=NULL_MODELS, default=list(NULL_MODELS),
+                        help="null models (default: all)")
+    parser.add_argument('--sources', type=int, default=None,
+                        help="sampled BFS sources per path length (default: exact path lengths)")
+    parser.add_argument('--swaps', type=int, default=SWAPS_PER_EDGE,
+                        help=f"double edge swaps per edge of a configuration replicate (default: {SWAPS_PER_EDGE})")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    parser.add_argument('--workers', type=int, default=1, help="number of worker processes (default: 1)")
+    parser.add_argument('--output', help="JSON file for the statistics (default: print them)")
+    args = parser.parse_args()
+
+    G = load_covote_graph(args.graph)
+    GCC = G.subgraph(max(nx.connected_components(G), key=len)).copy()
+    print(f"{GCC.number_of_nodes()} nodes and {GCC.number_of_edges()} edges in the giant connected component")
+    result = small_world(GCC, args.replicates, args.models, args.sources, args.seed, args.swaps,
+                         workers=args.workers)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=1)
+        print(f"✅ Small-world statistics saved to {args.output}")
+
+    path_length = result['path_length']
+    print(f"Average shortest path length: {path_length['value']:.3f} "
+          f"[{path_length['ci'][0]:.3f}, {path_length['ci'][1]:.3f}] ({path_length['sources']} sources)")
+    print(f"Average clustering coefficient: {result['clustering']:.3f}")
+    summary = pd.DataFrame({model: {f"{column} {stat}": values[stat]
+                                    for column, values in statistics.items() for stat in ('mean', 'std')}
+                            for model, statistics in result['models'].items()})
+    print(summary.to_string(float_format=lambda value: f"{value:.3f}"))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+CORPUS_VERSION = 1
+CORPUS_FILES = ['text.bin', 'index.bin', 'meta.json']
+
+# One record per speech: position of its UTF-8 text in text.bin, speaker and compte rendu codes
+INDEX_DTYPE = np.dtype([('offset', '<i8'), ('length', '<i4'), ('actor', '<i4'), ('seance', '<i4')])
+
+# Number of index records buffered before being written
+FLUSH_EVERY = 10000
+
+
+def corpus_path(deputees_output: str) -> str:
+    """
+    Returns the folder of the speech corpus matching a deputees_XX.json path.
+
+    Args:
+        deputees_output: The path of the deputees_XX.json file
+
+    Returns:
+        The path of the corpus folder (e.g. data/processed/deputees_17_speeches)
+    """
+    return os.path.splitext(deputees_output)[0] + '_speeches'
+
+
+class SpeechCorpusWriter:
+    """
+    Append-only writer of a speech corpus.
+
+    The corpus folder holds:
+    - text.bin: the UTF-8 texts of the speeches, concatenated
+    - index.bin: one INDEX_DTYPE record per speech, in the order they were appended
+    - meta.json: the actor and seance ids the index codes refer to, and the number
+      of speeches and bytes written. It is written last and acts as the commit point:
+      bytes beyond the recorded sizes (an interrupted run) are dropped on the next open.
+
+    Without append, the corpus is built in a temporary folder that replaces the
+    previous one when the writer is closed. Use as a context manager.
+    """
+
+    def __init__(self, store_path: str, append: bool = False):
+        self.store_path = store_path
+        self.append_mode = append and os.path.exists(os.path.join(store_path, 'meta.json'))
+        self.path = store_path if self.append_mode else store_path + '.tmp'
+        self.actors = {}
+        self.seances = {}
+        self.n_speeches = 0
+        self.n_bytes = 0
+        self._rows = []
+
+        if self.append_mode:
+            with open(os.path.join(store_path, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            self.actors = {actor: code for code, actor in enumerate(meta['actors'])}
+            self.seances = {seance: code for code, seance in enumerate(meta['seances'])}
+            self.n_speeches = meta['n_speeches']
+            self.n_bytes = meta['n_bytes']
+            self._text = open(os.path.join(store_path, 'text.bin'), 'r+b')
+            self._index = open(os.path.join(store_path, 'index.bin'), 'r+b')
+            self._text.truncate(self.n_bytes)
+            self._index.truncate(self.n_speeches * INDEX_DTYPE.itemsize)
+            self._text.seek(0, os.SEEK_END)
+            self._index.seek(0, os.SEEK_END)
+        else:
+            if os.path.exists(self.path):
+                shutil.rmtree(self.path)
+            os.makedirs(self.path)
+            self._text = open(os.path.join(self.path, 'text.bin'), 'wb')
+            self._index = open(os.path.join(self.path, 'index.bin'), 'wb')
+
+    def append(self, acteur_id: str, seance_id: str, text: str) -> None:
+        """
+        Appends one speech.
+
+        Args:
+            acteur_id: The speaker (PAxxxx)
+            seance_id: The compte rendu the speech comes from
+            text: The text of the speech
+        """
+        data = text.encode('utf-8')
+        self._text.write(data)
+        self._rows.append((self.n_bytes, len(data),
+                           self.actors.setdefault(acteur_id, len(self.actors)),
+                           self.seances.setdefault(seance_id, len(self.seances))))
+        self.n_bytes += len(data)
+        self.n_speeches += 1
+        if len(self._rows) >= FLUSH_EVERY:
+            self._flush_index()
+
+    def _flush_index(self) -> None:
+        if self._rows:
+            np.asarray(self._rows, dtype=INDEX_DTYPE).tofile(self._index)
+            self._rows = []
+
+    def close(self) -> None:
+        """Writes the pending records and meta.json, then publishes the corpus."""
+        self._flush_index()
+        self._text.close()
+        self._index.close()
+
+        meta = {
+            'version': CORPUS_VERSION,
+            'n_speeches': self.n_speeches,
+            'n_bytes': self.n_bytes,
+            'actors': list(self.actors),
+            'seances': list(self.seances),
+        }
+        meta_path = os.path.join(self.path, 'meta.json')
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(meta_path + '.tmp', meta_path)
+
+        if not self.append_mode:
+            if os.path.exists(self.store_path):
+                shutil.rmtree(self.store_path)
+            os.replace(self.path, self.store_path)
+
+    def discard(self) -> None:
+        """Abandons a new corpus (the previous one is left untouched)."""
+        self._text.close()
+        self._index.close()
+        if not self.append_mode:
+            shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self) -> 'SpeechCorpusWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            self.close()
+        elif self.append_mode:
+            # What was appended is not recorded in meta.json and will be dropped
+            self._text.close()
+            self._index.close()
+        else:
+            self.discard()
+
+
+class SpeechCorpus:
+    """
+    Read access to a speech corpus written by SpeechCorpusWriter.
+
+    Only the index is scanned to select speeches, texts are decoded one at a
+    time when iterated.
+
+    Attributes:
+        actors: Speaker ids, indexed by the actor codes of the index
+        seances: Compte rendu ids, indexed by the seance codes of the index
+        index: INDEX_DTYPE records, one per speech in corpus order
+    """
+
+    def __init__(self, store_path: str, mmap: bool = True):
+        with open(os.path.join(store_path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+
+        self.path = store_path
+        self.actors = meta['actors']
+        self.seances = meta['seances']
+        self._actor_codes = {actor: code for code, actor in enumerate(self.actors)}
+        self.index = _load_array(os.path.join(store_path, 'index.bin'), INDEX_DTYPE, meta['n_speeches'], mmap)
+        self.text = _load_array(os.path.join(store_path, 'text.bin'), np.uint8, meta['n_bytes'], mmap)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def speech(self, i: int) -> str:
+        """Text of speech i."""
+        offset, length = int(self.index['offset'][i]), int(self.index['length'][i])
+        return self.text[offset:offset + length].tobytes().decode('utf-8')
+
+    def speech_indices(self, acteur_ids) -> np.ndarray:
+        """Positions of the speeches of some speakers, in corpus order."""
+        codes = [self._actor_codes[acteur_id] for acteur_id in acteur_ids if acteur_id in self._actor_codes]
+        return np.flatnonzero(np.isin(self.index['actor'], codes))
+
+    def deputy_speeches(self, acteur_id: str):
+        """
+        Yields the speeches of one deputy, in the order they were appended.
+
+        Args:
+            acteur_id: The deputy (PAxxxx)
+        """
+        for i in self.speech_indices([acteur_id]):
+            yield self.speech(i)
+
+    def community_speeches(self, acteur_ids):
+        """
+        Yields the (acteur_id, text) speeches of a group of deputies, in corpus order.
+
+        Args:
+            acteur_ids: The deputies of the community
+        """
+        actor_codes = self.index['actor']
+        for i in self.speech_indices(acteur_ids):
+            yield self.actors[actor_codes[i]], self.speech(i)
+
+    def speech_counts(self) -> dict:
+        """Number of speeches of each speaker."""
+        counts = np.bincount(self.index['actor'], minlength=len(self.actors))
+        return dict(zip(self.actors, counts.tolist()))
+
+
+def _load_array(path: str, dtype, count: int, mmap: bool) -> np.ndarray:
+    """First count items of a raw binary file, memory-mapped or read."""
+    if count == 0:
+        return np.zeros(0, dtype=dtype)
+    if mmap:
+        return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+    return np.fromfile(path, dtype=dtype, count=count)
+
+
+def load_speech_corpus(store_path: str, mmap: bool = True) -> SpeechCorpus:
+    """
+    Opens a speech corpus.
+
+    Args:
+        store_path: Folder written by SpeechCorpusWriter (see corpus_path)
+        mmap: If True, memory-map text.bin and index.bin instead of reading them
+
+    Returns:
+        The SpeechCorpus
+    """
+    return SpeechCorpus(store_path, mmap=mmap)
@@ -0,0 +1,356 @@
+import os
+import json
+import math
+import argparse
+from datetime import date, timedelta
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+from legislatures import LEGISLATURE_CONFIGS
+
+# First day of each legislature, the votes and seances follow it
+LEGISLATURE_START = {
+    '14': date(2012, 6, 26),
+    '15': date(2017, 6, 27),
+    '16': date(2022, 6, 28),
+    '17': date(2024, 7, 18),
+}
+
+NAMESPACE = 'http://schemas.assemblee-nationale.fr/referentiel'
+
+# Positions of decompteNominatif, plural as in most files and singular as in some
+PLURAL_POSITIONS = ['pours', 'contres', 'abstentions', 'nonVotants']
+SINGULAR_POSITIONS = ['pour', 'contre', 'abstention', 'nonVotant']
+
+# Words of the speeches: frequent French words (mostly stopwords, dropped by the
+# tokenizers) followed by parliamentary vocabulary, then generated words
+COMMON_WORDS = """
+de la le les et des à en du un une que qui est pour dans nous vous il pas ce sur au par plus
+avec ne se sont cette mais ou son ont comme leur tout aussi être fait bien ces elle très
+""".split()
+DOMAIN_WORDS = """
+loi projet amendement article gouvernement ministre assemblée président commission budget
+réforme travail retraites santé hôpital école éducation sécurité police justice écologie climat
+énergie agriculture agriculteurs entreprises emploi chômage salaires impôts fiscalité dette
+logement transports territoires communes régions europe immigration frontières défense armée
+culture recherche université jeunesse familles enfants femmes égalité solidarité pauvreté
+services publics démocratie république liberté laïcité citoyens salariés syndicats industrie
+""".split()
+SYLLABLES = ['ba', 'co', 'di', 'fe', 'ga', 'li', 'mo', 'na', 'pu', 're', 'si', 'to', 'va', 'ri', 'lo', 'ne']
+
+
+def _vocabulary(size: int, rng: np.random.Generator) -> list:
+    """Common words, domain words, then made-up words up to size words."""
+    words = list(dict.fromkeys(COMMON_WORDS + DOMAIN_WORDS))
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES, size=int(rng.integers(3, 6))))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words[:size]
+
+
+def _write_json(path: str, data, indent: int = None) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+
+
+def generate_actors(root: str, n_actors: int, n_groups: int, missing: float = 0.01, seed: int = 0) -> tuple:
+    """
+    Writes the acteur and organe files of data/all_actors.
+
+    Args:
+        root: Folder holding the data folder
+        n_actors: Number of actors (PA ids), deputies and members of the government
+        n_groups: Number of political groups (PO ids)
+        missing: Share of the actors without acteur file, as deputies missing from a real dump
+        seed: Random seed
+
+    Returns:
+        A tuple (actor ids, group ids)
+    """
+    rng = np.random.default_rng(seed)
+    acteur_folder = os.path.join(root, 'data', 'all_actors', 'acteur')
+    organe_folder = os.path.join(root, 'data', 'all_actors', 'organe')
+    os.makedirs(acteur_folder, exist_ok=True)
+    os.makedirs(organe_folder, exist_ok=True)
+
+    actor_ids = [f"PA{100000 + i}" for i in range(n_actors)]
+    for acteur_id in actor_ids:
+        if rng.random() < missing:
+            continue
+        _write_json(os.path.join(acteur_folder, f"{acteur_id}.json"), {'acteur': {
+            'uid': {'@xmlns:xsi': 'http://www.w3.org/2001/XMLSchema-instance', '#text': acteur_id},
+            'etatCivil': {'ident': {'civ': str(rng.choice(['M.', 'Mme'])), 'prenom': f"Prenom{acteur_id[2:]}",
+                                    'nom': f"Nom{acteur_id[2:]}", 'alpha': f"Nom{acteur_id[2:]}"}},
+        }})
+
+    group_ids = [f"PO{800000 + i}" for i in range(n_groups)]
+    for i, organe_id in enumerate(group_ids):
+        _write_json(os.path.join(organe_folder, f"{organe_id}.json"), {'organe': {
+            'uid': organe_id,
+            'codeType': 'GP',
+            'libelle': f"Groupe synthétique {i}",
+            'libelleEdition': f"du groupe synthétique {i}",
+            'libelleAbrege': f"GS{i}",
+            # Some real groups have no color
+            'couleurAssociee': None if i % 5 == 4 else f"#{int(rng.integers(0, 2 ** 24)):06x}",
+        }})
+    return actor_ids, group_ids
+
+
+def _decompte(voters: list, positions: list, plural: bool) -> dict:
+    """decompteNominatif of a group: votant is a dict for a single voter, a position without voter is null."""
+    names = PLURAL_POSITIONS if plural else SINGULAR_POSITIONS
+    by_position = {name: [] for name in names}
+    for (acteur_id, chair), position in zip(voters, positions):
+        by_position[names[position]].append({'acteurRef': acteur_id, 'mandatRef': f"PM{acteur_id[2:]}",
+                                             'numPlace': chair})
+    decompte = {}
+    for name, votants in by_position.items():
+        if not votants:
+            decompte[name] = None
+        elif len(votants) == 1:
+            decompte[name] = {'votant': votants[0]}
+        else:
+            decompte[name] = {'votant': votants}
+    return decompte
+
+
+def _scrutin(legislature_num: str, number: int, vote_date: date, seance_id: str, groups: list,
+             group_positions: np.ndarray, members: list, cohesion: float, turnout: float, plural: bool,
+             rng: np.random.Generator) -> dict:
+    """One scrutin in the format of the open data dumps."""
+    groupes = []
+    totals = np.zeros(4, dtype=np.int64)
+    for group_id, group_position, group_members in zip(groups, group_positions, members):
+        present = [member for member in group_members if rng.random() < turnout]
+        # Each present member follows the position of their group, or picks one at random
+        positions = np.where(rng.random(len(present)) < cohesion, group_position,
+                             rng.integers(0, 4, size=len(present)))
+        counts = np.bincount(positions, minlength=4) if len(present) else np.zeros(4, dtype=np.int64)
+        totals += counts
+        groupes.append({
+            'organeRef': group_id,
+            'nombreMembresGroupe': str(len(group_members)),
+            'vote': {
+                'positionMajoritaire': ['pour', 'contre', 'abstention', 'nonVotant'][int(group_position)],
+                'decompteVoix': {'nonVotants': str(counts[3]), 'pour': str(counts[0]), 'contre': str(counts[1]),
+                                 'abstentions': str(counts[2])},
+                'decompteNominatif': _decompte(present, positions.tolist(), plural),
+            },
+        })
+
+    return {
+        'uid': f"VTANR5L{legislature_num}V{number}",
+        'numero': str(number),
+        'organeRef': 'PO717460',
+        'legislature': legislature_num,
+        'dateScrutin': vote_date.isoformat(),
+        'seanceRef': seance_id,
+        'typeVote': {'codeTypeVote': str(rng.choice(['SPO', 'SPS', 'MOC'], p=[0.85, 0.1, 0.05])),
+                     'libelleTypeVote': 'scrutin public ordinaire',
+                     'typeMajorite': 'majorité absolue des suffrages exprimés'},
+        'sort': {'code': 'adopté' if totals[0] > totals[1] else 'rejeté'},
+        'titre': f"l'amendement n° {number}",
+        'syntheseVote': {'nombreVotants': str(totals[:3].sum()),
+                         'decompte': {'pour': str(totals[0]), 'contre': str(totals[1]),
+                                      'abstentions': str(totals[2]), 'nonVotants': str(totals[3])}},
+        'ventilationVotes': {'organe': {'organeRef': 'PO717460', 'groupes': {'groupe': groupes}}},
+    }
+
+
+def _compte_rendu(cr_id: str, seance_id: str, seance_date: date, speeches: list) -> str:
+    """Compte rendu XML of a seance, one paragraphe per (acteur_id or None, text) speech."""
+    paragraphes = []
+    for i, (acteur_id, text) in enumerate(speeches):
+        acteur = f' id_acteur="{acteur_id}"' if acteur_id else ''
+        paragraphes.append(
+            f'<paragraphe id_syceron="{i}"{acteur} code_grammaire="PAROLE_GENERIQUE">'
+            f'<orateurs><orateur><nom>{escape(acteur_id or "Mme la présidente")}</nom></orateur></orateurs>'
+            f'<texte>{escape(text)}</texte></paragraphe>'
+        )
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n'
+            f'<compteRendu xmlns="{NAMESPACE}"><uid>{cr_id}</uid><seanceRef>{seance_id}</seanceRef>'
+            f'<metadonnees><dateSeance>{seance_date.strftime("%Y%m%d")}150000000</dateSeance></metadonnees>'
+            f'<contenu><point nivpoint="1" valeur_ptsodj="1">{"".join(paragraphes)}</point></contenu>'
+            f'</compteRendu>\n')
+
+
+def generate_legislature(root: str, legislature_num: str, actor_ids: list, group_ids: list, n_deputies: int = 577,
+                         n_votes: int = 1000, n_speeches: int = 10000, vocabulary_size: int = 5000,
+                         votes_per_seance: int = 5, speeches_per_seance: int = 40, words_per_speech: int = 60,
+                         cohesion: float = 0.9, turnout: float = 0.5, plural: float = 0.8, switchers: float = 0.05,
+                         seed: int = 0) -> dict:
+    """
+    Writes the vote files and the comptes rendus of a legislature, at the paths
+    of its LEGISLATURE_CONFIGS entry under root.
+
+    Deputies belong to groups that take a position on each scrutin, and follow
+    it with probability cohesion. A share of them changes group during the
+    legislature. The files have the quirks of the real dumps: singular or plural
+    position keys, votant as a dict for a single voter, null positions. Speeches
+    draw Zipf-distributed words with a vocabulary specific to each group, and
+    some are made by members of the government or the presidency.
+
+    Args:
+        root: Folder holding the data folder
+        legislature_num: A LEGISLATURE_CONFIGS key
+        actor_ids: Actors to draw the deputies and the government from (see generate_actors)
+        group_ids: The political groups
+        n_deputies: Number of deputies
+        n_votes: Number of scrutins
+        n_speeches: Number of speeches, 0 for none (always none without cr_path)
+        vocabulary_size: Number of distinct words of the speeches
+        votes_per_seance: Scrutins of a seance
+        speeches_per_seance: Speeches of a compte rendu
+        words_per_speech: Mean number of words of a speech
+        cohesion: Probability that a deputy votes as their group
+        turnout: Probability that a deputy takes part in a scrutin
+        plural: Share of the vote files with plural position keys
+        switchers: Share of the deputies changing group during the legislature
+        seed: Random seed
+
+    Returns:
+        Dictionary with the number of deputies, votes, speeches and files written
+    """
+    config = LEGISLATURE_CONFIGS[legislature_num]
+    rng = np.random.default_rng([seed, int(legislature_num)])
+    n_deputies = min(n_deputies, len(actor_ids))
+
+    deputies = rng.choice(actor_ids, size=n_deputies, replace=False).tolist()
+    chairs = {acteur_id: str(i + 1) for i, acteur_id in enumerate(deputies)}
+    # Uneven group sizes, as in the Assemblée
+    group_of = rng.choice(len(group_ids), size=n_deputies, p=rng.dirichlet(np.full(len(group_ids), 2.0)))
+    switch_vote = np.where(rng.random(n_deputies) < switchers, rng.integers(1, max(n_votes, 2), size=n_deputies),
+                           n_votes + 1)
+    new_group = rng.integers(0, len(group_ids), size=n_deputies)
+    # Groups sit on a left-right axis and a scrutin splits it at a random point
+    group_axis = np.sort(rng.uniform(-1, 1, size=len(group_ids)))
+
+    start = LEGISLATURE_START[legislature_num]
+    n_seances = math.ceil(n_votes / votes_per_seance) if n_votes else 0
+    seance_dates = [start + timedelta(days=int(day))
+                    for day in np.sort(rng.integers(0, 365 * 2, size=max(n_seances, 1)))]
+    seance_ids = [f"RUANR5L{legislature_num}S{seance_date.year}O1N{i + 1:03d}"
+                  for i, seance_date in enumerate(seance_dates)]
+
+    scrutins = []
+    for v in range(n_votes):
+        members = [[] for _ in group_ids]
+        for i, acteur_id in enumerate(deputies):
+            group = new_group[i] if v + 1 >= switch_vote[i] else group_of[i]
+            members[group].append((acteur_id, chairs[acteur_id]))
+        split, side = rng.uniform(-1, 1), rng.random() < 0.5
+        group_positions = np.where((group_axis > split) == side, 0, 1)
+        # A few groups abstain
+        group_positions = np.where(rng.random(len(group_ids)) < 0.1, 2, group_positions)
+        seance = v // votes_per_seance
+        scrutins.append(_scrutin(legislature_num, v + 1, seance_dates[seance], seance_ids[seance], group_ids,
+                                 group_positions, members, cohesion, turnout, rng.random() < plural, rng))
+
+    vote_path = os.path.join(root, config['vote_path'])
+    if config['is_single_file']:
+        os.makedirs(os.path.dirname(vote_path), exist_ok=True)
+        _write_json(vote_path, {'scrutins': {'scrutin': scrutins}}, indent=1)
+        n_files = 1
+    else:
+        os.makedirs(vote_path, exist_ok=True)
+        for scrutin in scrutins:
+            _write_json(os.path.join(vote_path, f"{scrutin['uid']}.json"), {'scrutin': scrutin}, indent=2)
+        n_files = len(scrutins)
+
+    n_cr = 0
+    if config['cr_path'] and n_speeches:
+        cr_path = os.path.join(root, config['cr_path'])
+        os.makedirs(cr_path, exist_ok=True)
+        vocabulary = np.array(_vocabulary(vocabulary_size, rng))
+        # Zipf law, words are drawn by inverting its cumulative distribution
+        cumulative = np.cumsum(1.0 / np.arange(1, len(vocabulary) + 1) ** 1.1)
+        cumulative /= cumulative[-1]
+        # Words each group uses more than the others, among the non-common ones
+        topical_words = np.arange(min(len(COMMON_WORDS), len(vocabulary) - 1), len(vocabulary))
+        group_words = [rng.choice(topical_words, size=min(30, len(topical_words)), replace=False)
+                       for _ in group_ids]
+        government = [acteur_id for acteur_id in actor_ids if acteur_id not in chairs][:20]
+
+        n_cr = math.ceil(n_speeches / speeches_per_seance)
+        for c in range(n_cr):
+            seance = c % max(n_seances, 1)
+            speeches = []
+            for _ in range(min(speeches_per_seance, n_speeches - c * speeches_per_seance)):
+                speaker = rng.random()
+                if speaker < 0.05:
+                    acteur_id, group = None, None
+                elif speaker < 0.1 and government:
+                    acteur_id, group = str(rng.choice(government)), None
+                else:
+                    i = int(rng.integers(0, n_deputies))
+                    acteur_id, group = deputies[i], group_of[i]
+                n_words = max(1, int(rng.poisson(words_per_speech)))
+                words = np.minimum(np.searchsorted(cumulative, rng.random(n_words)), len(vocabulary) - 1)
+                if group is not None:
+                    topical = rng.random(n_words) < 0.15
+                    words[topical] = rng.choice(group_words[group], size=int(topical.sum()))
+                sentences = np.array_split(vocabulary[words], max(1, n_words // 12))
+                text = ' '.join(' '.join(sentence).capitalize() + '.' for sentence in sentences if len(sentence))
+                speeches.append((acteur_id, text))
+            cr_id = f"CRSANR5L{legislature_num}S{seance_dates[seance].year}O1N{c + 1:03d}"
+            with open(os.path.join(cr_path, f"{cr_id}.xml"), 'w', encoding='utf-8') as f:
+                f.write(_compte_rendu(cr_id, seance_ids[seance], seance_dates[seance], speeches))
+
+    return {'deputies': n_deputies, 'votes': n_votes, 'vote_files': n_files,
+            'speeches': n_speeches if n_cr else 0, 'cr_files': n_cr}
+
+
+def generate_dataset(root: str, legislatures: list = None, n_deputies: int = 577, n_votes: int = 1000,
+                     n_speeches: int = 10000, n_groups: int = 10, seed: int = 0, **options) -> dict:
+    """
+    Writes a synthetic data folder in the formats of the Assemblée nationale open
+    data: actors and organes, per-vote files or a single-file dump, and comptes rendus.
+
+    Args:
+        root: Folder to create the data folder in
+        legislatures: LEGISLATURE_CONFIGS keys (default: all)
+        n_deputies: Number of deputies of each legislature
+        n_votes: Number of scrutins of each legislature
+        n_speeches: Number of speeches of each legislature with comptes rendus
+        n_groups: Number of political groups
+        seed: Random seed
+        **options: Other generate_legislature arguments
+
+    Returns:
+        Dictionary with legislatures as keys and generate_legislature results as values
+    """
+    legislatures = list(LEGISLATURE_CONFIGS) if legislatures is None else legislatures
+    # Deputies are drawn from a pool shared by the legislatures, which also holds the government
+    actor_ids, group_ids = generate_actors(root, int(n_deputies * 1.3) + 20, n_groups, seed=seed)
+    return {legislature_num: generate_legislature(root, legislature_num, actor_ids, group_ids, n_deputies, n_votes,
+                                                  n_speeches, seed=seed, **options)
+            for legislature_num in legislatures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic vote, actor and compte rendu files in the "
+                                                 "formats of the Assemblée nationale open data.")
+    parser.add_argument('root', help="folder to create the data folder in")
+    parser.add_argument('--legislatures', nargs='+', default=list(LEGISLATURE_CONFIGS), metavar='NUM',
+                        help="legislatures to generate (default: all)")
+    parser.add_argument('--deputies', type=int, default=577, help="deputies per legislature (default: 577)")
+    parser.add_argument('--votes', type=int, default=1000, help="scrutins per legislature (default: 1000)")
+    parser.add_argument('--speeches', type=int, default=10000, help="speeches per legislature (default: 10000)")
+    parser.add_argument('--groups', type=int, default=10, help="political groups (default: 10)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args()
+
+    summary = generate_dataset(args.root, args.legislatures, args.deputies, args.votes, args.speeches,
+                               args.groups, args.seed)
+    for legislature_num, counts in summary.items():
+        print(f"✅ Legislature {legislature_num}: {counts['deputies']} deputies, {counts['votes']} votes "
+              f"({counts['vote_files']} files), {counts['speeches']} speeches ({counts['cr_files']} comptes rendus)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from covote import POUR_WEIGHT, build_incidence, build_incidence_from_store, load_votes
+from vote_store import VoteStore
+
+# Default sliding window: 90 days, moved one week at a time
+WINDOW_DAYS = 90
+STEP_DAYS = 7
+
+
+def vote_dates(votes, vote_ids: list) -> np.ndarray:
+    """
+    Dates of some votes.
+
+    Args:
+        votes: Dictionary of votes as produced by extract_vote.py, or a VoteStore
+        vote_ids: The votes, in the order of the incidence matrix columns
+
+    Returns:
+        datetime64[D] array, NaT for the votes without a valid dateScrutin
+    """
+    if isinstance(votes, VoteStore):
+        raw = dict(zip(votes.vote_ids.tolist(), votes.dates.tolist()))
+    else:
+        raw = {vote_id: vote_data.get('date') for vote_id, vote_data in votes.items()}
+    # dateScrutin is an ISO date, sometimes followed by a time or a timezone
+    return pd.to_datetime(pd.Series([(raw.get(vote_id) or '')[:10] for vote_id in vote_ids]),
+                          format='%Y-%m-%d', errors='coerce').to_numpy().astype('datetime64[D]')
+
+
+def iter_covote_windows(votes, deputy_ids=None, width_days: int = WINDOW_DAYS, step_days: int = STEP_DAYS):
+    """
+    Yields the co-vote counts of sliding date windows.
+
+    The votes are sorted by date once. When the window moves, the products of
+    the incidence columns of the votes entering it are added to the counts and
+    those of the votes leaving it are subtracted, instead of recounting every vote.
+
+    Args:
+        votes: Dictionary of votes as produced by extract_vote.py, or a VoteStore
+        deputy_ids: Optional iterable of deputy ids to keep (e.g. the keys of deputees_XX.json)
+        width_days: Length of a window, in days
+        step_days: Days between the starts of two consecutive windows
+
+    Yields:
+        Tuples (deputy_index, start, end, n_votes, shared, common) for the window
+        [start, end): shared and common are the dense deputy × deputy counts of
+        POUR votes and of votes taken part in together. They are updated in
+        place by the next window, copy them to keep them.
+    """
+    if isinstance(votes, VoteStore):
+        deputy_index, vote_ids, pour, participation = build_incidence_from_store(votes, deputy_ids)
+    else:
+        deputy_index, vote_ids, pour, participation = build_incidence(votes, deputy_ids)
+
+    dates = vote_dates(votes, vote_ids)
+    dated = np.flatnonzero(~np.isnat(dates))
+    if len(dated) < len(dates):
+        print(f"⚠️ {len(dates) - len(dated)} votes without date are left out of the windows")
+    order = dated[np.argsort(dates[dated], kind='stable')]
+    dates = dates[order]
+    pour = pour.tocsc()[:, order]
+    participation = participation.tocsc()[:, order]
+
+    n = len(deputy_index)
+    # Counts are held as float64, exact for integers below 2 ** 53
+    shared = np.zeros((n, n))
+    common = np.zeros((n, n))
+    if not len(dates):
+        return
+
+    width = np.timedelta64(width_days, 'D')
+    step = np.timedelta64(step_days, 'D')
+    last_start = max(dates[0], dates[-1] - width + np.timedelta64(1, 'D'))
+
+    def update(first, last, sign):
+        # A few votes enter or leave at each step and most deputies take part in each vote:
+        # their outer products are dense, computed with BLAS
+        if last > first:
+            for counts, incidence in ((shared, pour), (common, participation)):
+                columns = incidence[:, first:last].toarray().astype(np.float64)
+                if sign > 0:
+                    counts += columns @ columns.T
+                else:
+                    counts -= columns @ columns.T
+
+    lo = hi = 0
+    start = dates[0]
+    while start <= last_start:
+        end = start + width
+        new_lo = int(np.searchsorted(dates, start, side='left'))
+        new_hi = int(np.searchsorted(dates, end, side='left'))
+        update(lo, min(new_lo, hi), -1)
+        update(max(hi, new_lo), new_hi, 1)
+        lo, hi = new_lo, new_hi
+        yield deputy_index, start, end, hi - lo, shared, common
+        start = start + step
+
+
+def window_metrics(shared: np.ndarray, common: np.ndarray, party_codes: np.ndarray, k: float) -> dict:
+    """
+    Metrics of the co-vote graph of one window: the deputies who voted in the
+    window, linked when their co-vote percentage (see covote.covote_matrix) reaches k.
+
+    Args:
+        shared: Dense counts of shared POUR votes
+        common: Dense counts of votes taken part in together
+        party_codes: Integer party of each deputy
+        k: Threshold (percentage between 0 and 1)
+
+    Returns:
+        Dictionary with the number of active deputies and of edges, the density,
+        the modularity of the party partition and the size of the giant component
+    """
+    active = np.flatnonzero(np.diag(common) > 0)
+    n = len(active)
+    shared = shared[np.ix_(active, active)]
+    common = common[np.ix_(active, active)]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percentages = np.where(shared > 0, POUR_WEIGHT * shared / common, 0.0)
+    adjacency = np.triu(percentages >= k, k=1) & np.triu(shared > 0, k=1)
+    adjacency = adjacency | adjacency.T
+    n_edges = int(adjacency.sum()) // 2
+
+    gcc_size = 0
+    if n:
+        _, labels = connected_components(sparse.csr_matrix(adjacency), directed=False)
+        gcc_size = int(np.bincount(labels).max())
+
+    # Modularity of the party partition: sum over parties of L_c / m - (d_c / 2m)^2
+    modularity = float('nan')
+    if n_edges:
+        parties = np.unique(party_codes[active], return_inverse=True)[1]
+        degrees = adjacency.sum(axis=1)
+        membership = np.zeros((n, parties.max() + 1))
+        membership[np.arange(n), parties] = 1
+        internal = ((adjacency.astype(np.float64) @ membership) * membership).sum(axis=0) / 2
+        party_degrees = membership.T @ degrees
+        modularity = float((internal / n_edges - (party_degrees / (2 * n_edges)) ** 2).sum())
+
+    return {
+        'deputies': n,
+        'edges': n_edges,
+        'density': 2 * n_edges / (n * (n - 1)) if n > 1 else 0.0,
+        'modularity': modularity,
+        'gcc_size': gcc_size,
+    }
+
+
+def temporal_metrics(votes, deputies: dict, k: float = 0.3, width_days: int = WINDOW_DAYS,
+                     step_days: int = STEP_DAYS) -> pd.DataFrame:
+    """
+    Timeline of the co-vote graph of a legislature over sliding date windows.
+
+    Args:
+        votes: Dictionary of votes as produced by extract_vote.py, or a VoteStore
+        deputies: deputees_XX.json content, the parties are their organ ids
+        k: Threshold (percentage between 0 and 1)
+        width_days: Length of a window, in days
+        step_days: Days between the starts of two consecutive windows
+
+    Returns:
+        DataFrame with one row per window: start, end, votes, deputies, edges,
+        density, modularity (of the party partition) and gcc_size
+    """
+    party_of = {deputy_id: (deputy_info.get('organ') or {}).get('id') for deputy_id, deputy_info in deputies.items()}
+    party_codes = None
+    records = []
+    for deputy_index, start, end, n_votes, shared, common in iter_covote_windows(votes, deputies.keys(),
+                                                                                  width_days, step_days):
+        if party_codes is None:
+            party_codes = pd.factorize(pd.Series([party_of.get(deputy_id) for deputy_id in deputy_index]),
+                                       use_na_sentinel=False)[0]
+        record = {'start': start, 'end': end, 'votes': n_votes}
+        record.update(window_metrics(shared, common, party_codes, k))
+        records.append(record)
+    return pd.DataFrame(records, columns=['start', 'end', 'votes', 'deputies', 'edges', 'density', 'modularity',
+                                          'gcc_size'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Co-vote graph metrics of a legislature over sliding date windows.")
+    parser.add_argument('votes', help="vote_XX.json or columnar vote store")
+    parser.add_argument('deputees', help="deputees_XX.json")
+    parser.add_argument('--k', type=float, default=0.3, help="co-vote percentage threshold (default: 0.3)")
+    parser.add_argument('--window', type=int, default=WINDOW_DAYS,
+                        help=f"window length in days (default: {WINDOW_DAYS})")
+    parser.add_argument('--step', type=int, default=STEP_DAYS,
+                        help=f"days between two windows (default: {STEP_DAYS})")
+    parser.add_argument('--output', help="CSV file for the timeline (default: print it)")
+    args = parser.parse_args()
+
+    with open(args.deputees, 'r', encoding='utf-8') as f:
+        deputies = json.load(f)
+    timeline = temporal_metrics(load_votes(args.votes), deputies, args.k, args.window, args.step)
+
+    if args.output:
+        timeline.to_csv(args.output, index=False)
+        print(f"✅ {len(timeline)} windows saved to {args.output}")
+    else:
+        print(timeline.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import networkx as nx
+import scipy.sparse as sp
+
+
+class ThresholdSweep:
+    """
+    Co-vote graphs of every threshold k at once.
+
+    The candidate edges (covote_matrix pairs) are sorted once by decreasing
+    percentage, then added in that order to a union-find structure: the graph
+    of threshold k is the prefix of the edges whose percentage is >= k, so one
+    pass gives its number of components, giant component size, edge count and
+    average degree for every k. Any of these graphs can then be materialized
+    from its prefix without recomputing the co-vote matrix.
+
+    Attributes:
+        deputy_index: Deputy ids, the nodes of every graph
+        rows, cols: Deputy indices of the candidate edges, by decreasing percentage
+        percentages: Percentage of each candidate edge, decreasing
+        metrics: DataFrame with one row per distinct percentage k (decreasing):
+                 k, edges, components, gcc_size and average_degree of the graph
+                 keeping the edges with percentage >= k
+    """
+
+    def __init__(self, deputy_index: list, weights: sp.spmatrix):
+        weights = weights.tocoo()
+        # Stable sort: edges of equal percentage keep the order of covote_edges
+        order = np.argsort(-weights.data, kind='stable')
+        self.deputy_index = list(deputy_index)
+        self.rows = weights.row[order].astype(np.int64)
+        self.cols = weights.col[order].astype(np.int64)
+        self.percentages = weights.data[order]
+        self._order = order
+        self.metrics = self._sweep()
+
+    def _sweep(self) -> pd.DataFrame:
+        """Adds the edges by decreasing percentage and records the metrics after each distinct percentage."""
+        n = len(self.deputy_index)
+        parent = list(range(n))
+        size = [1] * n
+
+        def find(x):
+            root = x
+            while parent[root] != root:
+                root = parent[root]
+            while parent[x] != root:
+                parent[x], x = root, parent[x]
+            return root
+
+        # Last edge of each run of equal percentages
+        n_edges = len(self.percentages)
+        group_ends = np.flatnonzero(np.append(self.percentages[1:] != self.percentages[:-1], True)) if n_edges else []
+
+        components = n
+        gcc_size = 1 if n else 0
+        records = []
+        start = 0
+        for end in group_ends:
+            for row, col in zip(self.rows[start:end + 1].tolist(), self.cols[start:end + 1].tolist()):
+                root_row, root_col = find(row), find(col)
+                if root_row == root_col:
+                    continue
+                if size[root_row] < size[root_col]:
+                    root_row, root_col = root_col, root_row
+                parent[root_col] = root_row
+                size[root_row] += size[root_col]
+                gcc_size = max(gcc_size, size[root_row])
+                components -= 1
+            start = end + 1
+            records.append((float(self.percentages[end]), end + 1, components, gcc_size,
+                            2 * (end + 1) / n if n else 0.0))
+
+        return pd.DataFrame(records, columns=['k', 'edges', 'components', 'gcc_size', 'average_degree'])
+
+    def n_edges(self, k: float) -> int:
+        """Number of candidate edges whose percentage reaches the threshold k."""
+        # percentages are decreasing: count the values >= k
+        return int(np.searchsorted(-self.percentages, -k, side='right'))
+
+    def at(self, k: float) -> dict:
+        """
+        Metrics of the graph of threshold k.
+
+        Args:
+            k: Threshold (percentage between 0 and 1)
+
+        Returns:
+            Dictionary with the k, edges, components, gcc_size and average_degree of the graph
+        """
+        m = self.n_edges(k)
+        if m == 0:
+            n = len(self.deputy_index)
+            return {'k': k, 'edges': 0, 'components': n, 'gcc_size': 1 if n else 0, 'average_degree': 0.0}
+        record = self.metrics.iloc[int(np.searchsorted(self.metrics['edges'].to_numpy(), m))].to_dict()
+        record['k'] = k
+        return record
+
+    def edges(self, k: float) -> list:
+        """
+        The co-vote edges of threshold k, same list as covote.covote_edges.
+
+        Args:
+            k: Threshold (percentage between 0 and 1)
+
+        Returns:
+            A list of (deputy1, deputy2, percentage) tuples with deputy1 < deputy2
+        """
+        # Back to the order of the co-vote matrix
+        prefix = np.argsort(self._order[:self.n_edges(k)], kind='stable')
+        edges = []
+        for i in prefix.tolist():
+            deputy1, deputy2 = sorted((self.deputy_index[self.rows[i]], self.deputy_index[self.cols[i]]))
+            edges.append((deputy1, deputy2, float(self.percentages[i])))
+        return edges
+
+    def graph(self, k: float, weight: str = None) -> nx.Graph:
+        """
+        Materializes the co-vote graph of threshold k: every deputy is a node,
+        edges are added in the order of covote_edges.
+
+        Args:
+            k: Threshold (percentage between 0 and 1)
+            weight: If set, name of the edge attribute holding the percentage
+
+        Returns:
+            The networkx Graph
+        """
+        G = nx.Graph()
+        G.add_nodes_from(self.deputy_index)
+        if weight is None:
+            G.add_edges_from((deputy1, deputy2) for deputy1, deputy2, _ in self.edges(k))
+        else:
+            G.add_weighted_edges_from(self.edges(k), weight=weight)
+        return G
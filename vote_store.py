@@ -0,0 +1,155 @@
+import os
+import json
+import shutil
+
+import numpy as np
+
+# Vote positions stored by extract_vote.py, with their prefix in the store
+POSITIONS = {
+    'votes_for': 'for',
+    'votes_against': 'against',
+    'votes_abs': 'abs',
+}
+
+
+def columnar_path(output_file: str) -> str:
+    """
+    Returns the folder of the columnar store matching a vote_XX.json path.
+
+    Args:
+        output_file: The path of the vote_XX.json file
+
+    Returns:
+        The path of the store folder (e.g. data/processed/vote_17_columnar)
+    """
+    return os.path.splitext(output_file)[0] + '_columnar'
+
+
+def write_vote_store(legislature_vote: dict, store_path: str) -> None:
+    """
+    Writes processed votes in a compact columnar format.
+
+    Deputy ids are interned to int32 indices (in order of first appearance) and
+    each position is stored as a flat array of voters plus per-vote offsets,
+    so that the voters of vote i are voters[offsets[i]:offsets[i + 1]].
+    Every array is a separate .npy file that can be memory-mapped.
+
+    Args:
+        legislature_vote: Dictionary with vote_id as keys and vote data as values
+        store_path: Destination folder, replaced atomically
+    """
+    deputy_index = {}
+    columns = {prefix: ([0], []) for prefix in POSITIONS.values()}
+
+    for vote_data in legislature_vote.values():
+        for position, prefix in POSITIONS.items():
+            offsets, voters = columns[prefix]
+            for deputy in vote_data.get(position, []):
+                voters.append(deputy_index.setdefault(deputy, len(deputy_index)))
+            offsets.append(len(voters))
+
+    arrays = {
+        'vote_ids': _string_array(legislature_vote.keys()),
+        'dates': _string_array(vote_data.get('date') for vote_data in legislature_vote.values()),
+        'types': _string_array(vote_data.get('type') for vote_data in legislature_vote.values()),
+        'deputies': _string_array(deputy_index.keys()),
+    }
+    for prefix, (offsets, voters) in columns.items():
+        arrays[f'{prefix}_offsets'] = np.asarray(offsets, dtype=np.int64)
+        arrays[f'{prefix}_voters'] = np.asarray(voters, dtype=np.int32)
+
+    parent = os.path.dirname(store_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    tmp_path = store_path + '.tmp'
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, name + '.npy'), array, allow_pickle=False)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'n_votes': len(legislature_vote), 'n_deputies': len(deputy_index)}, f)
+
+    if os.path.exists(store_path):
+        shutil.rmtree(store_path)
+    os.replace(tmp_path, store_path)
+
+
+def _string_array(values) -> np.ndarray:
+    """Fixed-width unicode array, missing values (None) being stored as ''."""
+    values = ['' if value is None else value for value in values]
+    return np.asarray(values, dtype=str) if values else np.zeros(0, dtype='<U1')
+
+
+class VoteStore:
+    """
+    Read access to a columnar vote store written by write_vote_store.
+
+    Attributes:
+        deputies: Deputy ids, indexed by the int32 voter codes
+        vote_ids: Vote ids, in the order of vote_XX.json
+        dates: dateScrutin of each vote ('' when missing)
+        types: codeTypeVote of each vote ('' when missing)
+        offsets / voters: Dictionaries keyed by 'for', 'against' and 'abs'
+    """
+
+    def __init__(self, store_path: str, mmap: bool = True):
+        mmap_mode = 'r' if mmap else None
+
+        def load(name):
+            return np.load(os.path.join(store_path, name + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+
+        self.path = store_path
+        self.vote_ids = load('vote_ids')
+        self.dates = load('dates')
+        self.types = load('types')
+        self.deputies = load('deputies')
+        self.offsets = {prefix: load(f'{prefix}_offsets') for prefix in POSITIONS.values()}
+        self.voters = {prefix: load(f'{prefix}_voters') for prefix in POSITIONS.values()}
+
+    def __len__(self) -> int:
+        return len(self.vote_ids)
+
+    def vote_voters(self, i: int, prefix: str = 'for') -> np.ndarray:
+        """Deputy codes of vote i for one position ('for', 'against' or 'abs'), without copy."""
+        offsets = self.offsets[prefix]
+        return self.voters[prefix][offsets[i]:offsets[i + 1]]
+
+    def to_dict(self) -> dict:
+        """
+        Rebuilds the dict-of-dicts view of vote_XX.json.
+
+        Returns:
+            Dictionary with vote_id as keys and vote data as values
+        """
+        deputies = self.deputies.tolist()
+        columns = {
+            position: (self.offsets[prefix].tolist(), self.voters[prefix].tolist())
+            for position, prefix in POSITIONS.items()
+        }
+
+        legislature_vote = {}
+        for i, (vote_id, date, code_type_vote) in enumerate(zip(self.vote_ids.tolist(), self.dates.tolist(),
+                                                               self.types.tolist())):
+            vote_data = {"date": date or None, "type": code_type_vote or None}
+            for position, (offsets, voters) in columns.items():
+                vote_data[position] = [deputies[code] for code in voters[offsets[i]:offsets[i + 1]]]
+            legislature_vote[vote_id] = vote_data
+        return legislature_vote
+
+
+def load_vote_store(store_path: str, as_dict: bool = False, mmap: bool = True):
+    """
+    Loads a columnar vote store.
+
+    Args:
+        store_path: Folder written by write_vote_store
+        as_dict: If True, return the same dictionary as json.load on vote_XX.json
+        mmap: If True, memory-map the arrays instead of reading them
+
+    Returns:
+        A VoteStore (zero-copy arrays) or a dictionary of votes
+    """
+    store = VoteStore(store_path, mmap=mmap)
+    return store.to_dict() if as_dict else store